@@ -0,0 +1,198 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from time import sleep, time
+
+import json
+import re
+import threading
+
+__author__ = "Emin AKTAS <eminaktas34@gmail.com>"
+
+# /<cluster>/apis/apps/v1/namespaces/<namespace>/deployments/<name>[/scale]
+DEPLOYMENT_PATH = re.compile(r'^/(?P<cluster>[^/]+)/apis/apps/v1/namespaces/(?P<namespace>[^/]+)/deployments/'
+                             r'(?P<name>[^/]+)(?P<scale>/scale)?$')
+
+
+class FakeServer(ThreadingHTTPServer):
+    """
+    FakeServer serves the stand-in API from a daemon thread on a free local port
+    Every request is delayed by latency seconds and counted in requests
+    """
+
+    daemon_threads = True
+    # Many concurrent connections are opened by the pooled clients
+    request_queue_size = 128
+
+    def __init__(self, handler, latency: float = 0.0):
+        ThreadingHTTPServer.__init__(self, ('127.0.0.1', 0), handler)
+        self.latency = latency
+        self.requests = 0
+        self.lock = threading.Lock()
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+
+    @property
+    def port(self) -> int:
+        return self.server_address[1]
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def count(self):
+        with self.lock:
+            self.requests += 1
+
+
+class FakeHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Headers and body are written separately, Nagle's algorithm would delay the body of every response
+    disable_nagle_algorithm = True
+
+    def send_json(self, status: int, body: dict):
+        payload = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def delay(self):
+        self.server.count()
+        if self.server.latency:
+            sleep(self.server.latency)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class PrometheusHandler(FakeHandler):
+    def do_GET(self):
+        self.delay()
+        path = self.path.split('?')[0]
+        if path == '/api/v1/alerts':
+            self.send_json(200, {'status': 'success', 'data': {'alerts': self.server.alerts}})
+        elif path == '/api/v1/query':
+            now = time()
+            # Counters grow by one per second, their rate is 1
+            result = [{'metric': labels, 'value': [now, str(now)]} for labels in self.server.series]
+            self.send_json(200, {'status': 'success', 'data': {'resultType': 'vector', 'result': result}})
+        else:
+            self.send_json(404, {'status': 'error', 'error': f"{path} not found"})
+
+
+class FakePrometheus(FakeServer):
+    """
+    FakePrometheus emulates /api/v1/alerts and /api/v1/query
+
+    For every target and cluster there is a firing scaling out alert and series_per_target series
+    of metric_name; extra_series alerts and series of other workloads are added to the responses.
+    The query endpoint returns all series for any query, the pollers split them by their labels.
+    """
+
+    def __init__(
+            self,
+            targets: int,
+            clusters: list,
+            metric_name: str = 'http_requests_total',
+            series_per_target: int = 1,
+            extra_series: int = 0,
+            latency: float = 0.0,
+    ):
+        FakeServer.__init__(self, PrometheusHandler, latency)
+        self.alerts = []
+        self.series = []
+        for index in range(targets):
+            for cluster in clusters:
+                self.alerts.append({
+                    'labels': {'alertname': f"app-{index}-scaling-out", 'cluster_name': cluster, 'scaling': 'out'},
+                    'state': 'firing',
+                    'value': '1',
+                })
+                for pod in range(series_per_target):
+                    self.series.append({'__name__': metric_name, 'app': f"app-{index}", 'cluster_name': cluster,
+                                        'pod': f"app-{index}-{pod}"})
+        for index in range(extra_series):
+            self.alerts.append({
+                'labels': {'alertname': f"other-{index}", 'scaling': 'out'},
+                'state': 'inactive',
+                'value': '0',
+            })
+            self.series.append({'__name__': metric_name, 'app': f"other-{index}", 'pod': f"other-{index}"})
+
+
+class KubernetesHandler(FakeHandler):
+    def deployment(self):
+        match = DEPLOYMENT_PATH.match(self.path.split('?')[0])
+        if match is None:
+            self.send_json(404, {'kind': 'Status', 'status': 'Failure', 'reason': 'NotFound', 'code': 404})
+        return match
+
+    def do_GET(self):
+        self.delay()
+        match = self.deployment()
+        if match is None:
+            return
+        replicas = self.server.replicas
+        self.send_json(200, {
+            'apiVersion': 'apps/v1',
+            'kind': 'Deployment',
+            'metadata': {'name': match['name'], 'namespace': match['namespace']},
+            'spec': {'replicas': replicas, 'selector': {'matchLabels': {'app': match['name']}}, 'template': {}},
+            'status': {'replicas': replicas},
+        })
+
+    def do_PATCH(self):
+        self.delay()
+        body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        match = self.deployment()
+        if match is None or not match['scale']:
+            return
+        self.server.record(match['cluster'])
+        replicas = body.get('spec', {}).get('replicas', self.server.replicas)
+        self.send_json(200, {
+            'apiVersion': 'autoscaling/v1',
+            'kind': 'Scale',
+            'metadata': {'name': match['name'], 'namespace': match['namespace']},
+            'spec': {'replicas': replicas},
+            'status': {'replicas': self.server.replicas},
+        })
+
+
+class FakeKubernetes(FakeServer):
+    """
+    FakeKubernetes emulates reading Deployments and patching their scale subresource
+
+    Every cluster is served under its own path prefix (http://127.0.0.1:port/<cluster>), so one server
+    stands in for many clusters. The Deployments always have replicas replicas, patches are counted
+    per cluster but not applied, so every round of a benchmark scales again.
+    """
+
+    def __init__(self, replicas: int = 2, latency: float = 0.0):
+        FakeServer.__init__(self, KubernetesHandler, latency)
+        self.replicas = replicas
+        # {cluster: number of patches}
+        self.patches = {}
+
+    def record(self, cluster: str):
+        with self.lock:
+            self.patches[cluster] = self.patches.get(cluster, 0) + 1
+
+    def write_kube_config(self, path: str, clusters: list):
+        """
+        Writes a kube-config file with one context per cluster
+        """
+        config = {
+            'apiVersion': 'v1',
+            'kind': 'Config',
+            'current-context': clusters[0],
+            'clusters': [{'name': cluster, 'cluster': {'server': f"http://127.0.0.1:{self.port}/{cluster}"}}
+                         for cluster in clusters],
+            'users': [{'name': 'benchmark', 'user': {'token': 'benchmark'}}],
+            'contexts': [{'name': cluster, 'context': {'cluster': cluster, 'user': 'benchmark'}}
+                         for cluster in clusters],
+        }
+        with open(path, 'w') as f:
+            json.dump(config, f)
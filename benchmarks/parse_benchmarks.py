@@ -0,0 +1,147 @@
+"""
+Offline benchmarks of the parsing of large Prometheus responses
+
+python3 -m benchmarks.parse_benchmarks --alerts 20000 --series 100000 --rounds 5
+"""
+from k8s_workload_scaler.json_stream import STREAM_CHUNK_SIZE, JsonArrayStream
+from k8s_workload_scaler.metric_aggregator import MetricAggregator
+from k8s_workload_scaler.prometheus_alert_api import ALERTS_PATH, alert_filter, alerts_from_result
+from time import process_time
+
+import argparse
+import json
+import tracemalloc
+
+__author__ = "Emin AKTAS <eminaktas34@gmail.com>"
+
+CASES = ['alerts', 'vector']
+ALERT_NAMES = ['app-0-scaling-out', 'app-0-scaling-in']
+
+
+def build_alerts_body(alerts: int) -> bytes:
+    """
+    Returns an /api/v1/alerts body of the alerts of other workloads and one alert of ALERT_NAMES
+    The alerts have the labels and annotations of the usual alerting rules, about 450 bytes each
+    """
+    result = [{
+        'labels': {'alertname': ALERT_NAMES[0], 'scaling': 'out', 'cluster_name': 'cluster-0'},
+        'state': 'firing',
+        'value': '1',
+    }]
+    for index in range(alerts):
+        result.append({
+            'labels': {'alertname': f"other-{index}", 'severity': 'warning', 'namespace': 'default',
+                       'pod': f"other-{index}-5d9f7c6b8-x2k4z", 'instance': f"10.0.{index % 256}.{index % 200}:9090",
+                       'job': 'kubernetes-pods', 'team': 'platform'},
+            'annotations': {'summary': f"other-{index} is not ready",
+                            'description': f"Pod default/other-{index} has been in a non-ready state for longer "
+                                           f"than 15 minutes, see the runbook of the platform team."},
+            'state': 'firing',
+            'activeAt': '2021-01-01T00:00:00.000000000Z',
+            'value': '1e+00',
+        })
+    return json.dumps({'status': 'success', 'data': {'alerts': result}}).encode('utf-8')
+
+
+def build_vector(series: int, clusters: int = 10) -> list:
+    """
+    Returns an instant vector of the series of a counter, the series have the labels of a pod
+    """
+    return [{
+        'metric': {'__name__': 'http_requests_total', 'cluster_name': f"cluster-{index % clusters}",
+                   'namespace': 'default', 'pod': f"app-{index}-5d9f7c6b8-x2k4z", 'job': 'kubernetes-pods'},
+        'value': [1600000000.0, str(index)],
+    } for index in range(series)]
+
+
+def parse_stream(body: bytes) -> list:
+    stream = JsonArrayStream(ALERTS_PATH, alert_filter(ALERT_NAMES))
+    items = []
+    for start in range(0, len(body), STREAM_CHUNK_SIZE):
+        items.extend(stream.feed(body[start:start + STREAM_CHUNK_SIZE]))
+    return items + stream.close()
+
+
+def parse_loads(body: bytes) -> list:
+    names = set(ALERT_NAMES)
+    return [alert for alert in alerts_from_result(json.loads(body)) if alert['labels']['alertname'] in names]
+
+
+def measure(case: str, method: str, parse, body: bytes, rounds: int) -> dict:
+    """
+    Returns the CPU seconds of one parse and the memory allocated at peak while parsing
+    """
+    tracemalloc.start()
+    parse(body)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    started = process_time()
+    for _ in range(rounds):
+        kept = parse(body)
+    return {
+        'case': case,
+        'method': method,
+        'body_mib': len(body) / 2 ** 20,
+        'kept': len(kept),
+        'cpu_seconds': (process_time() - started) / rounds,
+        'peak_mib': peak / 2 ** 20,
+    }
+
+
+def measure_rates(case: str, series: int, rounds: int) -> list:
+    """
+    Returns the CPU seconds of the rate of the first vector, which builds the keys of the series,
+    and of the next vectors of the same series
+    """
+    # Every tick decodes a new response, so the vectors are equal but not the same objects
+    vectors = [build_vector(series), build_vector(series)]
+    aggregator = MetricAggregator(0)
+    started = process_time()
+    aggregator.rate(vectors[0], 0)
+    first = process_time() - started
+    started = process_time()
+    for tick in range(1, rounds + 1):
+        kept = aggregator.rate(vectors[tick % 2], tick)
+    next_ticks = (process_time() - started) / rounds
+    body_mib = len(json.dumps(vectors[0])) / 2 ** 20
+    return [{'case': case, 'method': method, 'body_mib': body_mib, 'kept': len(kept), 'cpu_seconds': seconds,
+             'peak_mib': float('nan')} for method, seconds in (('first_tick', first), ('next_tick', next_ticks))]
+
+
+def run_case(case: str, args) -> list:
+    if case == 'vector':
+        return measure_rates(case, args.series, args.rounds)
+    body = build_alerts_body(args.alerts)
+    return [measure(case, 'json_stream', parse_stream, body, args.rounds),
+            measure(case, 'json.loads', parse_loads, body, args.rounds)]
+
+
+def print_result(result: dict):
+    print(f"{result['case']:<10} {result['method']:<12} {result['body_mib']:>9.2f} {result['kept']:>5} "
+          f"{result['cpu_seconds']:>11.3f} {result['peak_mib']:>9.2f}", flush=True)
+
+
+def parse_args():
+    argument_parser = argparse.ArgumentParser(description="Benchmarks the parsing of large Prometheus responses")
+    argument_parser.add_argument('-ca', '--cases', nargs='+', choices=CASES, default=CASES,
+                                 help="Enter the cases to run. Default is all of them")
+    argument_parser.add_argument('-a', '--alerts', type=int, default=20000,
+                                 help="Enter the number of alerts of other workloads in the alerts body. "
+                                      "Default value is 20000")
+    argument_parser.add_argument('-s', '--series', type=int, default=100000,
+                                 help="Enter the number of series in the vector. Default value is 100000")
+    argument_parser.add_argument('-r', '--rounds', type=int, default=5,
+                                 help="Enter the number of measured rounds of every case. Default value is 5")
+    return argument_parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    print(f"{'case':<10} {'method':<12} {'body MiB':>9} {'kept':>5} {'cpu s':>11} {'peak MiB':>9}")
+    for case in args.cases:
+        for result in run_case(case, args):
+            print_result(result)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,198 @@
+"""
+Offline benchmarks of the controller against local stand-ins of Prometheus and the Kubernetes API
+
+python3 -m benchmarks.run_benchmarks --targets 1 10 100 --clusters 1 4 --rounds 5 --latency 0.005
+"""
+from benchmarks.fake_servers import FakeKubernetes, FakePrometheus
+from concurrent.futures import ThreadPoolExecutor
+from k8s_workload_scaler.controller import PROMETHEUS_ALERT_API, PROMETHEUS_METRIC_API, Controller
+from k8s_workload_scaler.kubectl import cluster_client_registry
+from k8s_workload_scaler.logging_config import LOG_LEVELS, configure_logging
+from time import monotonic, perf_counter
+from unittest import mock
+
+import argparse
+import asyncio
+import os
+import tempfile
+import tracemalloc
+
+import numpy as np
+
+__author__ = "Emin AKTAS <eminaktas34@gmail.com>"
+
+SCENARIOS = [PROMETHEUS_ALERT_API, PROMETHEUS_METRIC_API, 'workload_scaler']
+METRIC_NAME = 'http_requests_total'
+
+
+def build_targets(scenario: str, targets: int, kube_config: str, prometheus: FakePrometheus) -> list:
+    base = {
+        'management_type': PROMETHEUS_METRIC_API if scenario == PROMETHEUS_METRIC_API else PROMETHEUS_ALERT_API,
+        'workload': 'Deployment',
+        'namespace': 'default',
+        'max_number': 10,
+        'min_number': 1,
+        'scaling_range': 1,
+        'time_interval': 60,
+        'kube_config': kube_config,
+        'host': '127.0.0.1',
+        'port': prometheus.port,
+    }
+    result = []
+    for index in range(targets):
+        target = dict(base, name=f"app-{index}")
+        if scenario == PROMETHEUS_METRIC_API:
+            target.update({
+                'metric_name': METRIC_NAME,
+                'label_list': {'app': f"app-{index}"},
+                # The counters of the fake Prometheus have a rate of 1
+                'scaling_out_threshold_value': 0.5,
+                'scaling_in_threshold_value': 0.1,
+                'rate_time': 1,
+            })
+        else:
+            target.update({
+                'scaling_out_name': f"app-{index}-scaling-out",
+                'scaling_in_name': f"app-{index}-scaling-in",
+            })
+        result.append(target)
+    return result
+
+
+def time_decisions(controller: Controller, latencies: list):
+    """
+    Records the latency of every scaling decision (resolve, read, decide and patch) of the managers
+    """
+    def timed(scale):
+        def wrapper(*args, **kwargs):
+            started = perf_counter()
+            try:
+                return scale(*args, **kwargs)
+            finally:
+                latencies.append(perf_counter() - started)
+        return wrapper
+
+    for manager in controller.managers:
+        manager.scale = timed(manager.scale)
+
+
+async def run_round(scenario: str, controller: Controller, clusters: list):
+    loop = asyncio.get_event_loop()
+    if scenario == 'workload_scaler':
+        # Scale every target in every cluster without asking Prometheus
+        await asyncio.gather(*[loop.run_in_executor(None, manager.scale, 'scaling_out', cluster)
+                               for manager in controller.managers for cluster in clusters])
+    else:
+        await asyncio.gather(*[controller.control(index) for index in range(len(controller.jobs))])
+
+
+async def run_rounds(scenario: str, controller: Controller, clusters: list, rounds: int, concurrency: int,
+                     latencies: list) -> float:
+    """
+    Runs a warm-up round and the measured rounds, returns the duration of the measured rounds
+    """
+    executor = ThreadPoolExecutor(max_workers=concurrency)
+    asyncio.get_event_loop().set_default_executor(executor)
+    try:
+        # The first round warms the clients up and retains the first samples of the rates
+        await run_round(scenario, controller, clusters)
+        latencies.clear()
+        started = monotonic()
+        for _ in range(rounds):
+            await run_round(scenario, controller, clusters)
+        return monotonic() - started
+    finally:
+        for session in controller.sessions.values():
+            await session.close_async()
+        executor.shutdown(wait=True)
+
+
+def run_scenario(scenario: str, targets: int, clusters: int, args) -> dict:
+    cluster_names = [f"cluster-{index}" for index in range(clusters)]
+    prometheus = FakePrometheus(targets, cluster_names, METRIC_NAME, args.series, args.extra_series,
+                                args.latency).start()
+    kubernetes = FakeKubernetes(latency=args.latency).start()
+    with tempfile.TemporaryDirectory() as directory:
+        kube_config = os.path.join(directory, 'config')
+        kubernetes.write_kube_config(kube_config, cluster_names)
+        cluster_client_registry.clear()
+        try:
+            tracemalloc.start()
+            controller = Controller(build_targets(scenario, targets, kube_config, prometheus), args.concurrency,
+                                    spread=False)
+            latencies = []
+            time_decisions(controller, latencies)
+            # One traced round gives the memory of the targets and of the allocations of a round
+            asyncio.run(run_rounds(scenario, controller, cluster_names, 1, args.concurrency, latencies))
+            retained, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            duration = asyncio.run(run_rounds(scenario, controller, cluster_names, args.rounds, args.concurrency,
+                                                  latencies))
+            controller.scaling_executor.shutdown(wait=True)
+        finally:
+            prometheus.stop()
+            kubernetes.stop()
+    latencies = np.array(latencies) * 1000
+    return {
+        'scenario': scenario,
+        'targets': targets,
+        'clusters': clusters,
+        'decisions': len(latencies),
+        'decisions_per_second': len(latencies) / duration if duration else 0.0,
+        'p50_ms': float(np.percentile(latencies, 50)) if len(latencies) else float('nan'),
+        'p99_ms': float(np.percentile(latencies, 99)) if len(latencies) else float('nan'),
+        'retained_mib': retained / 2 ** 20,
+        'peak_mib': peak / 2 ** 20,
+        'prometheus_requests': prometheus.requests,
+        'kubernetes_requests': kubernetes.requests,
+    }
+
+
+def print_result(result: dict):
+    print(f"{result['scenario']:<22} {result['targets']:>7} {result['clusters']:>8} {result['decisions']:>9} "
+          f"{result['decisions_per_second']:>12.1f} {result['p50_ms']:>8.2f} {result['p99_ms']:>8.2f} "
+          f"{result['retained_mib']:>12.2f} {result['peak_mib']:>9.2f}", flush=True)
+
+
+def parse_args():
+    argument_parser = argparse.ArgumentParser(description="Benchmarks the scaling decisions against local fake "
+                                                          "Prometheus and Kubernetes API servers")
+    argument_parser.add_argument('-sc', '--scenarios', nargs='+', choices=SCENARIOS, default=SCENARIOS,
+                                 help="Enter the scenarios to run. Default is all of them")
+    argument_parser.add_argument('-t', '--targets', nargs='+', type=int, default=[1, 10, 100],
+                                 help="Enter the numbers of targets. Default value is 1 10 100")
+    argument_parser.add_argument('-c', '--clusters', nargs='+', type=int, default=[1, 4],
+                                 help="Enter the numbers of clusters. Default value is 1 4")
+    argument_parser.add_argument('-r', '--rounds', type=int, default=5,
+                                 help="Enter the number of measured rounds of every benchmark. Default value is 5")
+    argument_parser.add_argument('-l', '--latency', type=float, default=0.0,
+                                 help="Enter the latency in seconds of every fake API request. Default value is 0")
+    argument_parser.add_argument('-s', '--series', type=int, default=1,
+                                 help="Enter the number of series per target and cluster. Default value is 1")
+    argument_parser.add_argument('-es', '--extra-series', type=int, default=0,
+                                 help="Enter the number of alerts and series of other workloads in the responses. "
+                                      "Default value is 0")
+    argument_parser.add_argument('-cc', '--concurrency', type=int, default=16,
+                                 help="Enter the number of blocking calls run concurrently. Default value is 16")
+    argument_parser.add_argument('-ll', '--log-level', type=str.upper, choices=LOG_LEVELS, default='ERROR',
+                                 help="Enter the log level. Default value is ERROR")
+    return argument_parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    configure_logging(args.log_level)
+    print(f"{'scenario':<22} {'targets':>7} {'clusters':>8} {'decisions':>9} {'decisions/s':>12} {'p50 ms':>8} "
+          f"{'p99 ms':>8} {'retained MiB':>12} {'peak MiB':>9}")
+    # The kube-config contexts are served by the fake Kubernetes API, not by an in-cluster config
+    with mock.patch('kubernetes.config.load_incluster_config'):
+        # The modules and models loaded by the first run are not counted in the memory of a benchmark
+        run_scenario(args.scenarios[0], 1, 1, args)
+        for scenario in args.scenarios:
+            for targets in args.targets:
+                for clusters in args.clusters:
+                    print_result(run_scenario(scenario, targets, clusters, args))
+
+
+if __name__ == '__main__':
+    main()
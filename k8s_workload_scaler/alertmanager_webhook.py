@@ -0,0 +1,207 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from k8s_workload_scaler.exporter import DECISION_SECONDS, WEBHOOK_ALERTS_TOTAL
+from k8s_workload_scaler.prometheus_alert_api import PrometheusAlertAPI, index_alerts
+from time import monotonic
+
+import asyncio
+import json
+import logging
+import threading
+
+__author__ = "Emin AKTAS <eminaktas34@gmail.com>"
+
+WEBHOOK_PATH = '/webhook'
+HEALTH_PATH = '/-/healthy'
+DEFAULT_WEBHOOK_PORT = 9095
+DEFAULT_WEBHOOK_WORKERS = 4
+# Payloads of Alertmanager are small, bigger requests are rejected before they are read
+MAX_PAYLOAD_BYTES = 4 * 2 ** 20
+
+
+def alerts_from_payload(payload: dict) -> list:
+    """
+    Converts the alerts of an Alertmanager webhook payload to the alerts of the Prometheus alert api
+    The resolved alerts are not firing, the value is read from the value annotation if there is one, e.g.
+    annotations: {value: "{{ $value }}"}
+    """
+    alerts = []
+    for alert in payload.get('alerts') or []:
+        labels = alert.get('labels') or {}
+        if 'alertname' not in labels:
+            continue
+        alerts.append({
+            'labels': labels,
+            'state': 'firing' if alert.get('status') == 'firing' else 'inactive',
+            'value': (alert.get('annotations') or {}).get('value'),
+        })
+    return alerts
+
+
+class WebhookHandler(BaseHTTPRequestHandler):
+    def send_json(self, status: int, body: dict):
+        payload = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        if self.path.split('?')[0] != HEALTH_PATH:
+            self.send_error(404)
+            return
+        self.send_json(200, {'status': 'success'})
+
+    def do_POST(self):
+        if self.path.split('?')[0] != WEBHOOK_PATH:
+            self.send_error(404)
+            return
+        length = int(self.headers.get('Content-Length') or 0)
+        if length > MAX_PAYLOAD_BYTES:
+            self.send_error(413)
+            return
+        try:
+            payload = json.loads(self.rfile.read(length) or b'{}')
+            if not isinstance(payload, dict):
+                raise ValueError("The payload is not a JSON object")
+        except ValueError as e:
+            self.send_json(400, {'status': 'error', 'error': str(e)})
+            return
+        # Alertmanager only waits for the notification to be accepted, the scaling runs in the workers
+        queued = self.server.receiver.receive(payload)
+        self.send_json(200, {'status': 'success', 'queued': queued})
+
+    def log_message(self, format, *args):
+        logging.getLogger("WebhookHandler").debug(format, *args)
+
+
+class AlertmanagerWebhookReceiver:
+    """
+    AlertmanagerWebhookReceiver triggers the scaling from the notifications of Alertmanager
+
+    Alertmanager posts the alerts of its groups to http://address:port/webhook when they fire or resolve,
+    so the workloads are scaled as soon as the alerts fire without polling Prometheus. The alerts are
+    matched to the registered PrometheusAlertAPI targets by their alertname, the scaling and cluster_name
+    labels are used as in the alert api. The notifications are queued per workload: the alerts of a workload
+    which is waiting or being scaled are merged into its pending alerts, so a burst of notifications
+    scales a workload once with the latest alerts and a workload is never scaled twice at the same time.
+    The scalings run in the default executor of the event loop, workers workloads at a time.
+    """
+
+    def __init__(
+            self,
+            port: int = DEFAULT_WEBHOOK_PORT,
+            address: str = '',
+            workers: int = DEFAULT_WEBHOOK_WORKERS,
+    ):
+        self.port = port
+        self.address = address
+        self.workers = workers
+        self.managers = []
+        # {alertname: [index of the manager]}
+        self.alert_managers = {}
+        # {index of the manager: {alertname: {cluster_name: alert}}} of the workloads to scale
+        self.pending = {}
+        # Workloads which are queued or being scaled, each of them is in the queue at most once
+        self.scheduled = set()
+        self.lock = threading.Lock()
+        self.loop = None
+        self.queue = None
+        self.server = None
+
+        # Logging
+        self.logger = logging.getLogger("AlertmanagerWebhookReceiver")
+
+    def register(self, manager: PrometheusAlertAPI):
+        index = len(self.managers)
+        self.managers.append(manager)
+        for name in {manager.scaling_out_name, manager.scaling_in_name}:
+            self.alert_managers.setdefault(name, []).append(index)
+
+    def receive(self, payload: dict) -> int:
+        """
+        Queues the workloads of the alerts in the payload, returns the number of workloads queued by it
+        Called from the threads of the HTTP server
+        """
+        alert_index = index_alerts(alerts_from_payload(payload))
+        queued = 0
+        with self.lock:
+            for name, by_cluster in alert_index.items():
+                indexes = self.alert_managers.get(name)
+                if not indexes:
+                    WEBHOOK_ALERTS_TOTAL.inc(len(by_cluster), outcome='ignored')
+                    continue
+                for index in indexes:
+                    pending = self.pending.setdefault(index, {})
+                    # Newer notifications replace the alerts of the same name and cluster
+                    pending.setdefault(name, {}).update(by_cluster)
+                    if index in self.scheduled:
+                        WEBHOOK_ALERTS_TOTAL.inc(len(by_cluster), outcome='merged')
+                        continue
+                    WEBHOOK_ALERTS_TOTAL.inc(len(by_cluster), outcome='queued')
+                    self.scheduled.add(index)
+                    self.enqueue(index)
+                    queued += 1
+        self.logger.debug("Webhook of %s alerts queued %s workloads", len(payload.get('alerts') or []), queued)
+        return queued
+
+    def enqueue(self, index: int):
+        if self.loop is None:
+            self.logger.warning("Webhook receiver is not running, %s is not scaled", self.managers[index].name)
+            self.scheduled.discard(index)
+            self.pending.pop(index, None)
+            return
+        self.loop.call_soon_threadsafe(self.queue.put_nowait, index)
+
+    def trigger_scaling(self, index: int):
+        """
+        Scales the workload with its pending alerts, queues it again if alerts arrived meanwhile
+        """
+        manager = self.managers[index]
+        with self.lock:
+            alert_index = self.pending.pop(index, {})
+        started = monotonic()
+        try:
+            manager.trigger_scaling(alert_index)
+        except Exception as e:
+            self.logger.error("Exception at trigger_scaling for %s (namespace: %s, workload: %s): %s",
+                              manager.name, manager.namespace, manager.workload, e)
+        finally:
+            DECISION_SECONDS.observe(monotonic() - started, job=f"webhook {manager.name}")
+            with self.lock:
+                if index in self.pending:
+                    self.enqueue(index)
+                else:
+                    self.scheduled.discard(index)
+
+    async def worker(self):
+        loop = asyncio.get_event_loop()
+        while True:
+            index = await self.queue.get()
+            await loop.run_in_executor(None, self.trigger_scaling, index)
+
+    def start(self) -> ThreadingHTTPServer:
+        """
+        Serves the webhook from a daemon thread
+        """
+        server = self.server = ThreadingHTTPServer((self.address, self.port), WebhookHandler)
+        server.daemon_threads = True
+        server.receiver = self
+        threading.Thread(target=server.serve_forever, daemon=True, name='alertmanager-webhook').start()
+        self.logger.info("Alertmanager webhook is served on port %s at %s for %s workloads",
+                         server.server_address[1], WEBHOOK_PATH, len(self.managers))
+        return server
+
+    async def run_async(self):
+        """
+        Receives the notifications and scales the workloads until it is cancelled
+        """
+        self.loop = asyncio.get_event_loop()
+        self.queue = asyncio.Queue()
+        server = self.start()
+        try:
+            await asyncio.gather(*[self.worker() for _ in range(self.workers)])
+        finally:
+            server.shutdown()
+            server.server_close()
+            self.loop = None
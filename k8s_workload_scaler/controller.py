@@ -0,0 +1,350 @@
+from k8s_workload_scaler.alertmanager_webhook import DEFAULT_WEBHOOK_PORT, AlertmanagerWebhookReceiver
+from k8s_workload_scaler.exporter import DECISION_SECONDS, TICK_LAG_SECONDS, start_exporter
+from k8s_workload_scaler.forecaster import MetricForecaster
+from k8s_workload_scaler.prometheus_alert_api import PrometheusAlertAPI, PrometheusAlertPoller
+from k8s_workload_scaler.prometheus_metric_api import PrometheusMetricAPI, PrometheusMetricPoller
+from k8s_workload_scaler.prometheus_session import PrometheusSession
+from k8s_workload_scaler.scaling_behavior import ScalingBehavior
+from k8s_workload_scaler.scheduler import TickScheduler
+from concurrent.futures import ThreadPoolExecutor
+from time import monotonic
+
+import asyncio
+import logging
+import random
+import yaml
+
+__author__ = "Emin AKTAS <eminaktas34@gmail.com>"
+
+PROMETHEUS_ALERT_API = 'prometheus_alert_api'
+PROMETHEUS_METRIC_API = 'prometheus_metric_api'
+ALERTMANAGER_WEBHOOK = 'alertmanager_webhook'
+
+BASE_PARAMETERS = [
+    'workload',
+    'name',
+    'namespace',
+    'max_number',
+    'min_number',
+    'kube_config',
+]
+TARGET_PARAMETERS = {
+    PROMETHEUS_ALERT_API: BASE_PARAMETERS + [
+        'host',
+        'port',
+        'scaling_out_name',
+        'scaling_in_name',
+    ],
+    PROMETHEUS_METRIC_API: BASE_PARAMETERS + [
+        'host',
+        'port',
+        'metric_name',
+        'label_list',
+        'scaling_out_threshold_value',
+        'scaling_in_threshold_value',
+        'rate_time',
+    ],
+    ALERTMANAGER_WEBHOOK: BASE_PARAMETERS + [
+        'scaling_out_name',
+        'scaling_in_name',
+    ],
+}
+OPTIONAL_PARAMETERS = {
+    PROMETHEUS_ALERT_API: [
+        'watch_replicas',
+        'target_value',
+        'tolerance',
+        'behavior',
+    ],
+    PROMETHEUS_METRIC_API: [
+        'watch_replicas',
+        'scaling_workers',
+        'scaling_timeout',
+        'target_value',
+        'tolerance',
+        'behavior',
+        'forecaster',
+        'metrics',
+    ],
+    ALERTMANAGER_WEBHOOK: [
+        'watch_replicas',
+        'target_value',
+        'tolerance',
+        'behavior',
+    ],
+}
+# Parameters which are not needed when the metrics of the target are given in a metrics list
+MULTI_METRIC_PARAMETERS = {
+    PROMETHEUS_ALERT_API: [],
+    PROMETHEUS_METRIC_API: [
+        'metric_name',
+        'label_list',
+        'scaling_out_threshold_value',
+        'scaling_in_threshold_value',
+    ],
+    ALERTMANAGER_WEBHOOK: [],
+}
+# Parameters which are not needed when the target tracks a target_value
+TARGET_TRACKING_PARAMETERS = {
+    PROMETHEUS_ALERT_API: [],
+    PROMETHEUS_METRIC_API: [
+        'scaling_out_threshold_value',
+        'scaling_in_threshold_value',
+    ],
+    ALERTMANAGER_WEBHOOK: [],
+}
+# {target parameter: PrometheusSession parameter}
+SESSION_PARAMETERS = {
+    'prometheus_connect_timeout': 'connect_timeout',
+    'prometheus_read_timeout': 'read_timeout',
+    'prometheus_retries': 'retries',
+}
+DEFAULT_PARAMETERS = {
+    'scaling_range': 1,
+    'time_interval': 60,
+}
+DEFAULT_CONCURRENCY = 16
+
+
+def load_targets(targets_file: str, defaults: dict = None) -> list:
+    """
+    Loads the scaling targets from a YAML (or JSON) file
+
+    The file has an optional `defaults` mapping merged into every target and a `targets` list.
+    Each target uses the constructor parameter names of its management type, e.g.:
+
+    defaults:
+      kube_config: /etc/kube/config
+      host: prometheus-service
+      port: "8080"
+    targets:
+      - management_type: prometheus_alert_api
+        workload: Deployment
+        name: php-apache
+        namespace: default
+        max_number: 10
+        min_number: 2
+        scaling_out_name: php-apache-scaling-out
+        scaling_in_name: php-apache-scaling-in
+    """
+    with open(targets_file) as f:
+        content = yaml.safe_load(f) or {}
+
+    base = dict(DEFAULT_PARAMETERS)
+    base.update({key: value for key, value in (defaults or {}).items() if value is not None})
+    base.update(content.get('defaults') or {})
+
+    targets = []
+    for target in content.get('targets') or []:
+        merged = dict(base)
+        merged.update(target)
+        targets.append(merged)
+    return validate_targets(targets)
+
+
+def validate_targets(targets: list) -> list:
+    """
+    Validates the targets and rejects the ones which would scale the same workload twice
+    """
+    seen = set()
+    for index, target in enumerate(targets):
+        management_type = target.get('management_type')
+        if management_type not in TARGET_PARAMETERS:
+            raise Exception(f"Target {index} has not valid management_type: {management_type}")
+        optional = []
+        if target.get('target_value') is not None:
+            optional += TARGET_TRACKING_PARAMETERS[management_type]
+        if target.get('metrics'):
+            optional += MULTI_METRIC_PARAMETERS[management_type]
+        missing = [key for key in TARGET_PARAMETERS[management_type]
+                   if target.get(key) is None and key not in optional]
+        if missing:
+            raise Exception(f"Target {index} ({target.get('name')}) is missing parameters: {missing}")
+        # The forecaster forecasts the rate of metric_name only, the metrics of a multi-metric target are not forecast
+        if target.get('metrics') and target.get('forecaster') is not None:
+            raise Exception(f"Target {index} ({target.get('name')}) cannot have both metrics and forecaster")
+        key = (target['kube_config'], target['workload'], target['namespace'], target['name'])
+        if key in seen:
+            raise Exception(f"Target {index} ({target['name']}, namespace: {target['namespace']}, "
+                            f"workload: {target['workload']}) is defined more than once")
+        seen.add(key)
+    return targets
+
+
+def build_session(target: dict) -> PrometheusSession:
+    return PrometheusSession(**{
+        name: target[key] for key, name in SESSION_PARAMETERS.items() if target.get(key) is not None
+    })
+
+
+def build_manager(target: dict, session: PrometheusSession = None, scaling_executor: ThreadPoolExecutor = None):
+    """
+    Builds the scaler of the target regarding its management type
+    """
+    parameters = {key: target.get(key) for key in TARGET_PARAMETERS[target['management_type']]}
+    parameters['scaling_range'] = target['scaling_range']
+    parameters.update({key: target[key] for key in OPTIONAL_PARAMETERS[target['management_type']]
+                       if target.get(key) is not None})
+    if parameters.get('behavior') is not None:
+        # e.g. {'scale_down_stabilization': 300, 'max_scale_up_percent': 100}, see ScalingBehavior
+        parameters['behavior'] = ScalingBehavior(**parameters['behavior'])
+    if parameters.get('forecaster') is not None:
+        # e.g. {'horizon': 600, 'step': 60, 'season': 86400}, see MetricForecaster
+        parameters['forecaster'] = MetricForecaster(**parameters['forecaster'])
+    parameters['session'] = session or build_session(target)
+    if target['management_type'] == PROMETHEUS_METRIC_API:
+        parameters['scaling_executor'] = scaling_executor
+    if target['management_type'] in (PROMETHEUS_ALERT_API, ALERTMANAGER_WEBHOOK):
+        # Webhook targets are the alert targets whose alerts are pushed by Alertmanager
+        return PrometheusAlertAPI(**parameters)
+    return PrometheusMetricAPI(**parameters)
+
+
+class Controller:
+    """
+    Controller drives many scaling targets from one process
+
+    Every target is scheduled at fixed deadlines of its own interval in one asyncio event loop, so the
+    targets are evaluated concurrently and the period does not drift with the time spent in a tick.
+    The first deadlines are spread over the interval. Alert targets watching the same Prometheus on the
+    same interval share one alert poller which fetches the alerts with async HTTP, and metric targets
+    of the same metric and label names share one metric poller which merges their queries into one.
+    Metric targets with a forecaster or many metrics run their own queries.
+    Blocking calls (metric queries and Kubernetes API calls) run in a thread pool bounded by concurrency. The
+    per-cluster scalings of the metric targets run in a second pool of the same size shared by all targets.
+    Kubernetes API clients are shared between the targets through the per-context client registry of Kubectl, so the
+    number of connection pools depends on the number of clusters rather than the number of targets.
+    Alertmanager webhook targets are not polled, they are scaled by one AlertmanagerWebhookReceiver served on
+    webhook_port when Alertmanager notifies their alerts.
+    With metrics_port, the latencies of the hot path and the scaling decisions are served at /metrics.
+    """
+
+    def __init__(
+            self,
+            targets: list,
+            concurrency: int = DEFAULT_CONCURRENCY,
+            spread: bool = True,
+            metrics_port: int = None,
+            webhook_port: int = DEFAULT_WEBHOOK_PORT,
+    ):
+        self.targets = targets
+        self.concurrency = concurrency
+        # Port of the /metrics endpoint, not served when None
+        self.metrics_port = metrics_port
+        # Spread the first ticks of the jobs over their interval to avoid querying all at once
+        self.spread = spread
+        # Per-cluster scalings and metric queries of the metric targets run in one pool bounded by concurrency,
+        # apart from the default executor which runs the jobs waiting on them
+        self.scaling_executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='scaling')
+        # Targets of the same Prometheus share one pooled session
+        sessions = self.sessions = {}
+        self.managers = []
+        for target in targets:
+            key = (target.get('host'), str(target.get('port'))) + tuple(target.get(name) for name in SESSION_PARAMETERS)
+            if key not in sessions:
+                sessions[key] = build_session(target)
+            self.managers.append(build_manager(target, sessions[key], self.scaling_executor))
+        # Jobs are (interval, callable, description) tuples run by the scheduler, the callable
+        # is either a coroutine function or a blocking function run in the thread pool
+        self.jobs = []
+        pollers = {}
+        # Receiver of the Alertmanager notifications, None without webhook targets
+        self.receiver = None
+        for target, manager in zip(self.targets, self.managers):
+            if target['management_type'] == ALERTMANAGER_WEBHOOK:
+                if self.receiver is None:
+                    self.receiver = AlertmanagerWebhookReceiver(webhook_port, workers=concurrency)
+                self.receiver.register(manager)
+                continue
+            elif target['management_type'] == PROMETHEUS_ALERT_API:
+                # Targets with other timeouts or retries have their own session and poller
+                key = (id(manager.session), target['time_interval'])
+                if key not in pollers:
+                    pollers[key] = PrometheusAlertPoller(target['host'], target['port'], manager.session)
+                    self.jobs.append((target['time_interval'], pollers[key].poll_async,
+                                      f"alert poller {pollers[key].url}"))
+            elif manager.metric_specs:
+                # Multi-metric targets query all of their metrics concurrently
+                self.jobs.append((target['time_interval'], manager.control_and_trigger_scaling,
+                                  f"metrics of {target['name']}"))
+                continue
+            elif manager.forecaster is not None:
+                # Predictive targets query the history of their own rate
+                self.jobs.append((target['time_interval'], manager.control_and_trigger_scaling,
+                                  f"forecast of {target['metric_name']} for {target['name']}"))
+                continue
+            else:
+                # Targets of the same metric and label names are queried with one batched query
+                label_names = tuple(sorted(target['label_list'] or {}))
+                key = (id(manager.session), target['metric_name'], label_names, target['time_interval'])
+                if key not in pollers:
+                    pollers[key] = PrometheusMetricPoller(manager.url, manager.session,
+                                                          target['metric_name'], label_names)
+                    self.jobs.append((target['time_interval'], pollers[key].poll_async,
+                                      f"metric poller {target['metric_name']}{list(label_names)}"))
+            pollers[key].register(manager)
+        self.pollers = list(pollers.values())
+        self.schedulers = []
+
+        # Logging
+        self.logger = logging.getLogger('Controller')
+
+    async def control(self, index: int):
+        """
+        Runs one job, a failing job does not stop the others
+        """
+        _, job, description = self.jobs[index]
+        started = monotonic()
+        try:
+            if asyncio.iscoroutinefunction(job):
+                await job()
+            else:
+                await asyncio.get_event_loop().run_in_executor(None, job)
+        except Exception as e:
+            self.logger.error("Exception at control for %s: %s", description, e)
+        finally:
+            DECISION_SECONDS.observe(monotonic() - started, job=description)
+
+    async def run_job(self, index: int):
+        """
+        Runs the job at the fixed deadlines of its scheduler
+        """
+        scheduler = self.schedulers[index]
+        description = self.jobs[index][2]
+        while True:
+            delay = scheduler.next_deadline(monotonic()) - monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            lag = scheduler.started(monotonic())
+            TICK_LAG_SECONDS.observe(lag, job=description)
+            self.logger.debug("Tick of %s started %.3fs after its deadline, skipped ticks: %s",
+                              description, lag, scheduler.stats['skipped_ticks'])
+            await self.control(index)
+
+    async def run_async(self):
+        """
+        Runs the jobs of all targets concurrently on their intervals
+        """
+        self.logger.info("Controller is running for %s targets with %s jobs", len(self.targets), len(self.jobs))
+        loop = asyncio.get_event_loop()
+        executor = ThreadPoolExecutor(max_workers=self.concurrency)
+        loop.set_default_executor(executor)
+        start = monotonic()
+        spread = self.spread and len(self.jobs) > 1
+        self.schedulers = [TickScheduler(interval, random.uniform(0, interval) if spread else 0.0, start)
+                           for interval, _, _ in self.jobs]
+        tasks = [self.run_job(index) for index in range(len(self.jobs))]
+        if self.receiver is not None:
+            tasks.append(self.receiver.run_async())
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for session in self.sessions.values():
+                await session.close_async()
+            executor.shutdown(wait=False)
+            self.scaling_executor.shutdown(wait=False)
+
+    def run(self):
+        if self.metrics_port is not None:
+            start_exporter(self.metrics_port)
+        asyncio.run(self.run_async())
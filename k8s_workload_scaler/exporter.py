@@ -0,0 +1,190 @@
+from bisect import bisect_left
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from time import monotonic
+
+import logging
+import threading
+
+__author__ = "Emin AKTAS <eminaktas34@gmail.com>"
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def format_labels(label_names: tuple, label_values: tuple, extra: str = '') -> str:
+    pairs = [f'{name}="{escape(value)}"' for name, value in zip(label_names, label_values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value))
+
+
+class Metric:
+    """
+    Metric is a metric family whose samples are kept by label values
+    """
+
+    type = None
+
+    def __init__(self, name: str, documentation: str, label_names: tuple = ()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(label_names)
+        self.lock = threading.Lock()
+        # {label values: sample}
+        self.samples = {}
+
+    def key(self, labels: dict) -> tuple:
+        return tuple(labels.get(name, '') if labels.get(name) is not None else '' for name in self.label_names)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        with self.lock:
+            samples = list(self.samples.items())
+        for label_values, sample in samples:
+            lines.extend(self.render_sample(label_values, sample))
+        return lines
+
+    def render_sample(self, label_values: tuple, sample) -> list:
+        return [f"{self.name}{format_labels(self.label_names, label_values)} {format_value(sample)}"]
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, amount: float = 1, **labels):
+        key = self.key(labels)
+        with self.lock:
+            self.samples[key] = self.samples.get(key, 0.0) + amount
+
+
+class Gauge(Metric):
+    type = 'gauge'
+
+    def set(self, value: float, **labels):
+        key = self.key(labels)
+        with self.lock:
+            self.samples[key] = value
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, name: str, documentation: str, label_names: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        Metric.__init__(self, name, documentation, label_names)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+
+    def observe(self, value: float, **labels):
+        key = self.key(labels)
+        index = bisect_left(self.buckets, value)
+        with self.lock:
+            sample = self.samples.get(key)
+            if sample is None:
+                # [bucket counts (not cumulative), sum]
+                sample = self.samples[key] = [[0] * len(self.buckets), 0.0]
+            sample[0][index] += 1
+            sample[1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        """
+        Observes the time spent in the block
+        """
+        started = monotonic()
+        try:
+            yield
+        finally:
+            self.observe(monotonic() - started, **labels)
+
+    def render_sample(self, label_values: tuple, sample) -> list:
+        lines = []
+        count = 0
+        for bound, bucket_count in zip(self.buckets, sample[0]):
+            count += bucket_count
+            labels = format_labels(self.label_names, label_values, f'le="{format_value(bound)}"')
+            lines.append(f"{self.name}_bucket{labels} {count}")
+        labels = format_labels(self.label_names, label_values)
+        lines.append(f"{self.name}_sum{labels} {format_value(sample[1])}")
+        lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric: Metric) -> Metric:
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        return '\n'.join(line for metric in self.metrics for line in metric.render()) + '\n'
+
+
+registry = MetricsRegistry()
+
+PROMETHEUS_QUERY_SECONDS = registry.register(Histogram(
+    'workload_scaler_prometheus_query_seconds', "Latency of the Prometheus API requests", ('outcome',)))
+KUBERNETES_READ_SECONDS = registry.register(Histogram(
+    'workload_scaler_kubernetes_read_seconds', "Latency of reading the workloads from the Kubernetes API",
+    ('workload', 'cluster')))
+KUBERNETES_PATCH_SECONDS = registry.register(Histogram(
+    'workload_scaler_kubernetes_patch_seconds', "Latency of patching the scale of the workloads",
+    ('workload', 'cluster')))
+PICK_CLUSTER_SECONDS = registry.register(Histogram(
+    'workload_scaler_pick_cluster_seconds', "Time of resolving a cluster and getting its clients"))
+DECISION_SECONDS = registry.register(Histogram(
+    'workload_scaler_decision_seconds', "End-to-end time of a controller job, from the query to the last scaling",
+    ('job',)))
+TICK_LAG_SECONDS = registry.register(Histogram(
+    'workload_scaler_tick_lag_seconds', "Delay between the deadline of a controller tick and its start",
+    ('job',)))
+SCALE_ACTIONS_TOTAL = registry.register(Counter(
+    'workload_scaler_scale_actions_total', "Scalings of the workloads by direction and cluster",
+    ('name', 'namespace', 'direction', 'cluster')))
+CURRENT_REPLICAS = registry.register(Gauge(
+    'workload_scaler_current_replicas', "Replicas of the workloads at the last decision",
+    ('name', 'namespace', 'cluster')))
+DESIRED_REPLICAS = registry.register(Gauge(
+    'workload_scaler_desired_replicas', "Replicas the workloads are scaled to at the last decision",
+    ('name', 'namespace', 'cluster')))
+WEBHOOK_ALERTS_TOTAL = registry.register(Counter(
+    'workload_scaler_webhook_alerts_total', "Alerts received from Alertmanager by outcome (queued, merged, ignored)",
+    ('outcome',)))
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+        body = registry.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logging.getLogger("MetricsHandler").debug(format, *args)
+
+
+def start_exporter(port: int, address: str = '') -> ThreadingHTTPServer:
+    """
+    Serves the metrics of the registry on http://address:port/metrics from a daemon thread
+    """
+    server = ThreadingHTTPServer((address, port), MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True, name='metrics-exporter').start()
+    logging.getLogger("Exporter").info("Metrics are served on port %s at /metrics", server.server_address[1])
+    return server
@@ -0,0 +1,196 @@
+from math import ceil
+
+import logging
+import threading
+
+import numpy as np
+
+__author__ = "Emin AKTAS <eminaktas34@gmail.com>"
+
+DEFAULT_FORECAST_STEP = 60
+DEFAULT_HISTORY_POINTS = 60
+DEFAULT_ALPHA = 0.5
+DEFAULT_BETA = 0.1
+DEFAULT_GAMMA = 0.1
+
+
+class HoltWinters:
+    """
+    HoltWinters is an additive triple exponential smoothing model kept incrementally
+
+    Without a season length it is Holt's linear trend model. The model is initialized from the first
+    points (two seasons with a season length), after that every update only applies the smoothing
+    recurrence to the new points.
+    """
+
+    def __init__(
+            self,
+            alpha: float = DEFAULT_ALPHA,
+            beta: float = DEFAULT_BETA,
+            gamma: float = DEFAULT_GAMMA,
+            season_length: int = 0,
+    ):
+        self.alpha = alpha
+        self.beta = beta
+        self.gamma = gamma
+        self.season_length = season_length or 0
+        self.level = None
+        self.trend = 0.0
+        self.season = np.zeros(self.season_length)
+        # Number of points applied to the model
+        self.points = 0
+        # Points waiting for the initialization of the model
+        self.pending = np.zeros(0)
+
+    @property
+    def ready(self) -> bool:
+        return self.level is not None
+
+    def initialize(self, values: np.ndarray) -> np.ndarray:
+        """
+        Initializes the model from the first points, returns the points which are not applied yet
+        """
+        m = self.season_length
+        if m:
+            if len(values) < 2 * m:
+                self.pending = values
+                return np.zeros(0)
+            first, second = values[:m].mean(), values[m:2 * m].mean()
+            self.level = first
+            self.trend = (second - first) / m
+            self.season = values[:m] - first
+            self.points = m
+            return values[m:]
+        if len(values) < 2:
+            self.pending = values
+            return np.zeros(0)
+        self.level = values[0]
+        self.trend = values[1] - values[0]
+        self.points = 1
+        return values[1:]
+
+    def update(self, values: np.ndarray):
+        """
+        Applies the new points to the model
+        """
+        values = np.asarray(values, dtype=np.float64)
+        if not self.ready:
+            values = self.initialize(np.concatenate([self.pending, values]))
+        m = self.season_length
+        level, trend = self.level, self.trend
+        for value in values:
+            seasonal = self.season[self.points % m] if m else 0.0
+            last_level = level
+            level = self.alpha * (value - seasonal) + (1 - self.alpha) * (level + trend)
+            trend = self.beta * (level - last_level) + (1 - self.beta) * trend
+            if m:
+                self.season[self.points % m] = self.gamma * (value - level) + (1 - self.gamma) * seasonal
+            self.points += 1
+        if self.ready:
+            self.level, self.trend = level, trend
+
+    def forecast(self, steps: int) -> float:
+        """
+        Returns the forecast of the value steps points after the last point
+        """
+        seasonal = self.season[(self.points - 1 + steps) % self.season_length] if self.season_length else 0.0
+        return float(self.level + steps * self.trend + seasonal)
+
+
+class MetricForecaster:
+    """
+    MetricForecaster forecasts a metric by cluster from its history on a fixed step grid
+
+    Every cluster has its own HoltWinters model and the timestamp of its last point, so each tick
+    only applies the points after the last one. Gaps in the history are filled with
+    the previous value to keep the seasonal positions aligned.
+    """
+
+    def __init__(
+            self,
+            horizon: float = None,
+            step: float = DEFAULT_FORECAST_STEP,
+            history: float = None,
+            season: float = None,
+            alpha: float = DEFAULT_ALPHA,
+            beta: float = DEFAULT_BETA,
+            gamma: float = DEFAULT_GAMMA,
+    ):
+        self.horizon = horizon
+        self.step = step or DEFAULT_FORECAST_STEP
+        self.season_length = int(round(season / self.step)) if season else 0
+        # The history covers two seasons, or DEFAULT_HISTORY_POINTS steps without a season
+        self.history = history or self.step * max(2 * self.season_length + 1, DEFAULT_HISTORY_POINTS)
+        self.alpha = alpha
+        self.beta = beta
+        self.gamma = gamma
+        # {cluster name: HoltWinters}
+        self.models = {}
+        # {cluster name: (timestamp, value) of the last point}
+        self.last_points = {}
+        self.lock = threading.Lock()
+
+        # Logging
+        self.logger = logging.getLogger("MetricForecaster")
+
+    @property
+    def horizon_steps(self) -> int:
+        return max(int(ceil(self.horizon / self.step)), 1)
+
+    def update(self, cluster_name: str, values: list):
+        """
+        Applies the [[timestamp, value]] points of a range query result to the model of the cluster
+        """
+        points = np.array(values, dtype=np.float64).reshape(-1, 2)
+        with self.lock:
+            last_point = self.last_points.get(cluster_name)
+            if last_point is not None:
+                points = points[points[:, 0] > last_point[0]]
+            if not len(points):
+                return
+            origin, previous = points[0] if last_point is None else last_point
+            # Position of every point on the step grid, the gaps get the previous value
+            positions = np.rint((points[:, 0] - origin) / self.step).astype(np.int64)
+            filled = np.searchsorted(positions, np.arange(positions[-1] + 1), side='right') - 1
+            grid = np.where(filled >= 0, points[np.maximum(filled, 0), 1], previous)
+            if last_point is not None:
+                # The first grid position is the last point which is already applied
+                grid = grid[1:]
+            model = self.models.get(cluster_name)
+            if model is None:
+                model = self.models[cluster_name] = HoltWinters(self.alpha, self.beta, self.gamma,
+                                                                self.season_length)
+            model.update(grid)
+            self.last_points[cluster_name] = (origin + positions[-1] * self.step, points[-1, 1])
+
+    def forecast(self, cluster_name: str) -> float:
+        """
+        Returns the forecast of the metric of the cluster horizon seconds after its last point,
+        None until the model is initialized
+        """
+        with self.lock:
+            model = self.models.get(cluster_name)
+            if model is None or not model.ready:
+                return None
+            return model.forecast(self.horizon_steps)
+
+    def last_value(self, cluster_name: str) -> float:
+        with self.lock:
+            last_point = self.last_points.get(cluster_name)
+            return None if last_point is None else float(last_point[1])
+
+    def last_time(self, cluster_name: str) -> float:
+        with self.lock:
+            last_point = self.last_points.get(cluster_name)
+            return None if last_point is None else float(last_point[0])
+
+    def evict(self, before: float) -> list:
+        """
+        Drops the models of the clusters whose last point is older than before, returns their names
+        """
+        with self.lock:
+            evicted = [cluster_name for cluster_name, (timestamp, _) in self.last_points.items() if timestamp < before]
+            for cluster_name in evicted:
+                del self.last_points[cluster_name]
+                self.models.pop(cluster_name, None)
+            return evicted
@@ -0,0 +1,116 @@
+import codecs
+import json
+import re
+
+__author__ = "Emin AKTAS <eminaktas34@gmail.com>"
+
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# A complete string, a bracket, or the quote of a string which is not complete yet
+TOKEN = re.compile(r'"[^"\\]*(?:\\.[^"\\]*)*"|[{}\[\]"]', re.DOTALL)
+COLON = re.compile(r'\s*:')
+END = re.compile(r'\s*\Z')
+DECODER = json.JSONDecoder()
+
+
+class JsonArrayStream:
+    """
+    JsonArrayStream parses a JSON document fed in chunks and decodes the elements of one array in it
+
+    The array is given by the keys of the objects around it, e.g. ('data', 'alerts') for the
+    response of /api/v1/alerts. Only the envelope of the array is tokenized in Python, every element is
+    decoded at once by the C scanner of json, which is cheaper than finding its end, and keep gets the
+    decoded element. Only one element is buffered at a time. The string values of the top level keys
+    (e.g. status) are kept in values.
+    """
+
+    def __init__(self, path: tuple, keep=None):
+        self.path = tuple(path)
+        self.keep = keep
+        self.values = {}
+        self.decoder = codecs.getincrementaldecoder('utf-8')()
+        self.buffer = ''
+        # Scan position in the buffer
+        self.position = 0
+        # [bracket, last key, is the array of path] of the open objects and arrays
+        self.stack = []
+        self.stats = {
+            'bytes': 0,
+            'elements': 0,
+            'kept': 0,
+        }
+
+    def element(self, start: int, final: bool, items: list) -> int:
+        """
+        Decodes the element starting at start, returns its end or None if the rest of it is in the next chunk
+        """
+        try:
+            item, end = DECODER.raw_decode(self.buffer, start)
+        except ValueError as e:
+            if final:
+                raise Exception(f"Not valid JSON: {e}")
+            return None
+        self.stats['elements'] += 1
+        if self.keep is None or self.keep(item):
+            self.stats['kept'] += 1
+            items.append(item)
+        return end
+
+    def scan(self, final: bool) -> list:
+        items = []
+        buffer = self.buffer
+        while True:
+            match = TOKEN.search(buffer, self.position)
+            if match is None:
+                self.position = len(buffer)
+                break
+            token = match.group()
+            if token == '"':
+                # The rest of the string is in the next chunk
+                self.position = match.start()
+                break
+            if token[0] == '"':
+                if COLON.match(buffer, match.end()):
+                    if self.stack:
+                        self.stack[-1][1] = json.loads(token)
+                elif not final and END.match(buffer, match.end()):
+                    # A key is only known by the colon after it
+                    self.position = match.start()
+                    break
+                elif len(self.stack) == 1 and self.stack[0][1] is not None:
+                    self.values[self.stack[0][1]] = json.loads(token)
+            elif token in ('{', '['):
+                if self.stack and self.stack[-1][2]:
+                    end = self.element(match.start(), final, items)
+                    if end is None:
+                        self.position = match.start()
+                        break
+                    self.position = end
+                    continue
+                is_path = token == '[' and tuple(entry[1] for entry in self.stack) == self.path
+                self.stack.append([token, None, is_path])
+            else:
+                if not self.stack:
+                    raise Exception("Not valid JSON: unexpected closing bracket")
+                self.stack.pop()
+            self.position = match.end()
+        # Only the element being parsed and the unscanned text are kept
+        if self.position:
+            self.buffer = buffer[self.position:]
+            self.position = 0
+        return items
+
+    def feed(self, chunk: bytes) -> list:
+        """
+        Parses the chunk, returns the elements of the array completed by it
+        """
+        self.stats['bytes'] += len(chunk)
+        self.buffer += self.decoder.decode(chunk)
+        return self.scan(False)
+
+    def close(self) -> list:
+        self.buffer += self.decoder.decode(b'', True)
+        items = self.scan(True)
+        if self.stack:
+            raise Exception("Not valid JSON: the document is not complete")
+        return items
@@ -1,7 +1,12 @@
+import hashlib
 import logging
+import os
+import threading
 
 from kubernetes import client, config
 from kubernetes.client.rest import ApiException
+from k8s_workload_scaler.exporter import KUBERNETES_PATCH_SECONDS, KUBERNETES_READ_SECONDS, PICK_CLUSTER_SECONDS
+from k8s_workload_scaler.replica_cache import replica_cache
 
 __author__ = 'Emin AKTAS <eminaktas34@gmail.com>'
 
@@ -15,51 +20,145 @@ workload_list = {
 }
 
 
+class ClusterClientRegistry:
+    """
+    Keeps one long-lived API client per kube-config context
+
+    Clients (and their connection pools) are reused between calls and only rebuilt when
+    the kube-config file changes. A change is detected by the file's mtime and size, and
+    confirmed by its sha256 digest so touching the file does not drop warm connections.
+    The replaced clients are closed, so their pools and threads are released, and the
+    replica informers using them are stopped.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._kube_configs = {}
+        # Logging
+        self.logger = logging.getLogger('ClusterClientRegistry')
+
+    def _load(self, kube_config: str) -> dict:
+        stat = os.stat(kube_config)
+        signature = (stat.st_mtime_ns, stat.st_size)
+        entry = self._kube_configs.get(kube_config)
+        if entry is not None and entry['signature'] == signature:
+            return entry
+
+        with open(kube_config, 'rb') as f:
+            digest = hashlib.sha256(f.read()).hexdigest()
+        if entry is not None and entry['digest'] == digest:
+            entry['signature'] = signature
+            return entry
+
+        contexts, active_context = config.list_kube_config_contexts(config_file=kube_config)
+        config.load_incluster_config()
+        old_entry = entry
+        entry = {
+            'signature': signature,
+            'digest': digest,
+            'contexts': [context['name'] for context in contexts or []],
+            'active_context': active_context['name'] if active_context else None,
+            'clients': {},
+        }
+        self._kube_configs[kube_config] = entry
+        if old_entry is not None:
+            # The informers bind the replaced clients, they are started again with the new ones
+            replica_cache.drop(kube_config)
+            self._close(old_entry)
+        return entry
+
+    def _close(self, entry: dict):
+        """
+        Closes the API clients of the entry, called with the lock held
+        ApiClient.close only stops the thread pool in kubernetes 12, the connection pool is cleared here
+        """
+        for context, clients in entry['clients'].items():
+            api_client = clients[CORE_CLIENT].api_client
+            try:
+                api_client.close()
+                api_client.rest_client.pool_manager.clear()
+            except Exception as e:
+                self.logger.warning("Closing the client of %s failed: %s", context, e)
+
+    def contexts(self, kube_config: str) -> tuple:
+        """
+        Returns the context names and the active context name of the kube-config file
+        """
+        with self._lock:
+            entry = self._load(kube_config)
+            return entry['contexts'], entry['active_context']
+
+    def clients(self, kube_config: str, context: str) -> dict:
+        """
+        Returns the cached core_v1 and apps_v1 clients of the context
+        """
+        with self._lock:
+            entry = self._load(kube_config)
+            clients = entry['clients'].get(context)
+            if clients is None:
+                api_client = config.new_client_from_config(config_file=kube_config, context=context)
+                clients = {
+                    CORE_CLIENT: client.CoreV1Api(api_client=api_client),
+                    APP_CLIENT: client.AppsV1Api(api_client=api_client),
+                }
+                entry['clients'][context] = clients
+            return clients
+
+    def clear(self):
+        with self._lock:
+            for entry in self._kube_configs.values():
+                self._close(entry)
+            self._kube_configs.clear()
+
+
+cluster_client_registry = ClusterClientRegistry()
+
+
 class Kubectl:
-    def __init__(self, kube_config):
+    def __init__(self, kube_config, watch_replicas: bool = False):
         self.kube_config = kube_config
+        # Read the replica numbers from a watch fed cache instead of a GET per decision
+        self.watch_replicas = watch_replicas
         # Logging
         self.logger = logging.getLogger('Kubectl')
-        logging.basicConfig(
-            level=logging.NOTSET,
-            format='%(asctime)s.%(msecs)03d %(levelname)s %(module)s - %(funcName)s: %(message)s',
-            datefmt='%Y-%m-%d %H:%M:%S',
-        )
+
+    def resolve_cluster(self, cluster_name: str = None) -> str:
+        """
+        Resolves the cluster name to the context name in kube-config file
+        """
+        # Load the context in kube-config file, cached until the file changes
+        contexts, active_context = cluster_client_registry.contexts(self.kube_config)
+        if not contexts:
+            self.logger.error("Cannot locate any context in kube-config file")
+            return
+        self.logger.debug("%s contexts, active context: %s", len(contexts), active_context)
+        if cluster_name is None:
+            cluster_name = active_context
+        # An exact context name wins over the contexts which only contain the cluster name
+        if cluster_name in contexts:
+            target_cluster_index = contexts.index(cluster_name)
+        else:
+            target_cluster_index = next((i for i, j in enumerate(contexts) if cluster_name in j), None)
+        if target_cluster_index is None:
+            self.logger.error("Cannot find %s in %s", cluster_name, contexts)
+            return
+
+        picked_cluster = contexts[target_cluster_index]
+        self.logger.debug("Picked cluster: %s", picked_cluster)
+        return picked_cluster
 
     def pick_cluster(self, cluster_name: str = None):
         """
         Pick the cluster you will scale the workload
         """
         try:
-            # Load the context in kube-config file
-            contexts, active_context = config.list_kube_config_contexts(config_file=self.kube_config)
-            config.load_incluster_config()
-            self.logger.debug(f"contexts: {contexts}, active_context: {active_context}")
-            if not contexts:
-                self.logger.error("Cannot locate any context in kube-config file")
-                return
-            contexts = [context['name'] for context in contexts]
-            self.logger.debug(f"context list: {contexts}")
-            if cluster_name is None:
-                cluster_name = active_context['name']
-            target_cluster_index = next((i for i, j in enumerate(contexts) if cluster_name in j), None)
-            if target_cluster_index is None:
-                self.logger.error(f"Cannot find {cluster_name} in {contexts}")
-                return
-
-            picked_cluster = contexts[target_cluster_index]
-            self.logger.debug(f"Picked cluster: {picked_cluster}")
-
-            return {
-                'core_v1': client.CoreV1Api(
-                    api_client=config.new_client_from_config(config_file=self.kube_config, context=picked_cluster)
-                ),
-                'apps_v1': client.AppsV1Api(
-                    api_client=config.new_client_from_config(config_file=self.kube_config, context=picked_cluster)
-                ),
-            }
+            with PICK_CLUSTER_SECONDS.time():
+                picked_cluster = self.resolve_cluster(cluster_name)
+                if picked_cluster is None:
+                    return
+                return cluster_client_registry.clients(self.kube_config, picked_cluster)
         except Exception as e:
-            self.logger.error(f"Can't pick a cluster: {e}")
+            self.logger.error("Can't pick a cluster: %s", e)
             raise e
 
     def clients(self, cluster_name: str = None):
@@ -73,9 +172,12 @@ class Kubectl:
             namespace: str,
             replicas: int,
             cluster_name: str = None,
+            old_replicas: int = None,
     ) -> dict:
         """
         Scales namespaced workload
+        old_replicas is the spec.replicas read before the scaling, status.replicas of the result
+        is used without it, which lags behind during rollouts
         Workload List:
             Deployment
             Stateful Set
@@ -88,31 +190,31 @@ class Kubectl:
 
         body = {'spec': {'replicas': replicas}}
         try:
-            if workload == workload_list['deployment']:
-                result = self.clients(cluster_name)[APP_CLIENT].patch_namespaced_deployment_scale(
-                    name, namespace, body)
-            elif workload == workload_list['stateful_set']:
-                result = self.clients(cluster_name)[APP_CLIENT].patch_namespaced_stateful_set_scale(
-                    name, namespace, body)
-            elif workload == workload_list['replica_set']:
-                result = self.clients(cluster_name)[APP_CLIENT].patch_namespaced_replica_set_scale(
-                    name, namespace, body)
-            elif workload == workload_list['replication_controller']:
-                result = self.clients(cluster_name)[CORE_CLIENT].patch_namespaced_replication_controller_scale(
-                    name, namespace, body)
-            else:
-                self.logger.error(f"{workload} is not supported "
-                                  f"Supported workloads: {workload_list}")
-                raise Exception(f"{workload} is not supported")
-            self.logger.info(f"{name} {workload} scaled to {replicas}")
+            with KUBERNETES_PATCH_SECONDS.time(workload=workload, cluster=cluster_name):
+                if workload == workload_list['deployment']:
+                    result = self.clients(cluster_name)[APP_CLIENT].patch_namespaced_deployment_scale(
+                        name, namespace, body)
+                elif workload == workload_list['stateful_set']:
+                    result = self.clients(cluster_name)[APP_CLIENT].patch_namespaced_stateful_set_scale(
+                        name, namespace, body)
+                elif workload == workload_list['replica_set']:
+                    result = self.clients(cluster_name)[APP_CLIENT].patch_namespaced_replica_set_scale(
+                        name, namespace, body)
+                elif workload == workload_list['replication_controller']:
+                    result = self.clients(cluster_name)[CORE_CLIENT].patch_namespaced_replication_controller_scale(
+                        name, namespace, body)
+                else:
+                    self.logger.error("%s is not supported Supported workloads: %s", workload, workload_list)
+                    raise Exception(f"{workload} is not supported")
+            self.logger.info("%s %s scaled to %s", name, workload, replicas)
             # self.logger.info(result)
 
             scale_info = {
                 'new_replicas': result.spec.replicas,
-                'old_replicas': result.status.replicas,
+                'old_replicas': result.status.replicas if old_replicas is None else old_replicas,
             }
         except ApiException as e:
-            self.logger.error(f"Error scaling {name} {workload}: {e}")
+            self.logger.error("Error scaling %s %s: %s", name, workload, e)
             raise e
         finally:
             return scale_info
@@ -129,28 +231,55 @@ class Kubectl:
         replica_info = None
 
         try:
-            self.logger.info(f"Getting number of replicas information "
-                             f"from {name} (namespace: {namespace}, workload: {workload})")
-            if workload == workload_list['deployment']:
-                result = self.clients(cluster_name)[APP_CLIENT].read_namespaced_deployment(name, namespace)
-            elif workload == workload_list['stateful_set']:
-                result = self.clients(cluster_name)[APP_CLIENT].read_namespaced_stateful_set(name, namespace)
-            elif workload == workload_list['replica_set']:
-                result = self.clients(cluster_name)[APP_CLIENT].read_namespaced_replica_set(name, namespace)
-            elif workload == workload_list['replication_controller']:
-                result = self.clients(cluster_name)[CORE_CLIENT].read_namespaced_replication_controller(name, namespace)
-            else:
-                self.logger.error(f"{workload} is not supported "
-                                  f"Supported workloads: {workload_list}")
-                raise Exception(f"{workload} is not supported")
+            self.logger.info("Getting number of replicas information from %s (namespace: %s, workload: %s)",
+                             name, namespace, workload)
+            if self.watch_replicas:
+                cached = self.get_cached_replica_info(workload, name, namespace, cluster_name)
+                if cached is not None:
+                    replica_info = {
+                        'replicas': cached['replicas'],
+                        'spec_replicas': cached['spec_replicas'],
+                    }
+                    return replica_info
+            with KUBERNETES_READ_SECONDS.time(workload=workload, cluster=cluster_name):
+                if workload == workload_list['deployment']:
+                    result = self.clients(cluster_name)[APP_CLIENT].read_namespaced_deployment(name, namespace)
+                elif workload == workload_list['stateful_set']:
+                    result = self.clients(cluster_name)[APP_CLIENT].read_namespaced_stateful_set(name, namespace)
+                elif workload == workload_list['replica_set']:
+                    result = self.clients(cluster_name)[APP_CLIENT].read_namespaced_replica_set(name, namespace)
+                elif workload == workload_list['replication_controller']:
+                    result = self.clients(cluster_name)[CORE_CLIENT].read_namespaced_replication_controller(
+                        name, namespace)
+                else:
+                    self.logger.error("%s is not supported Supported workloads: %s", workload, workload_list)
+                    raise Exception(f"{workload} is not supported")
             # self.logger.info(result)
 
             replica_info = {
-                'replicas': result.status.replicas
+                'replicas': result.status.replicas,
+                'spec_replicas': result.spec.replicas,
             }
 
         except ApiException as e:
-            self.logger.error(f"Error reading {name} {workload}: {e}")
+            self.logger.error("Error reading %s %s: %s", name, workload, e)
             raise e
         finally:
             return replica_info
+
+    def get_cached_replica_info(
+            self,
+            workload: str,
+            name: str,
+            namespace: str,
+            cluster_name: str = None,
+    ) -> dict:
+        """
+        Gets the replica information from the watch fed cache of the cluster
+        Returns None if the cache is not synced yet or the workload is not found
+        """
+        picked_cluster = self.resolve_cluster(cluster_name)
+        if picked_cluster is None:
+            return None
+        clients = cluster_client_registry.clients(self.kube_config, picked_cluster)
+        return replica_cache.get(self.kube_config, picked_cluster, clients, workload, namespace, name)
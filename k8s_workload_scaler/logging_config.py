@@ -0,0 +1,47 @@
+from datetime import datetime
+
+import json
+import logging
+
+__author__ = "Emin AKTAS <eminaktas34@gmail.com>"
+
+LOG_FORMAT = '%(asctime)s.%(msecs)03d %(levelname)s %(module)s - %(funcName)s: %(message)s'
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+DEFAULT_LOG_LEVEL = 'INFO'
+LOG_LEVELS = ['DEBUG', 'INFO', 'WARNING', 'ERROR', 'CRITICAL']
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Formats the records as one JSON object per line
+    The message is only built and serialized for the records which pass the level
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            'time': datetime.fromtimestamp(record.created).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'module': record.module,
+            'function': record.funcName,
+            'message': record.getMessage(),
+        }
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def configure_logging(level: str = DEFAULT_LOG_LEVEL, json_format: bool = False):
+    """
+    Sets up the root logger of the process once, the classes only get their named loggers
+    """
+    handler = logging.StreamHandler()
+    handler.setFormatter(JsonFormatter() if json_format else logging.Formatter(LOG_FORMAT, DATE_FORMAT))
+    root = logging.getLogger()
+    for old_handler in list(root.handlers):
+        root.removeHandler(old_handler)
+    root.addHandler(handler)
+    root.setLevel(level.upper() if isinstance(level, str) else level)
+    # Client libraries log every request at DEBUG
+    for name in ('urllib3', 'kubernetes'):
+        logging.getLogger(name).setLevel(max(root.level, logging.INFO))
@@ -0,0 +1,159 @@
+from collections import deque
+
+import numpy as np
+
+__author__ = "Emin AKTAS <eminaktas34@gmail.com>"
+
+
+def series_key(labels: dict) -> tuple:
+    """
+    Returns a hashable key of the full label set of a series
+    """
+    return tuple(sorted(labels.items()))
+
+
+class MetricAggregator:
+    """
+    MetricAggregator calculates per-cluster rates of a Prometheus vector with grouped reductions
+
+    Every series gets a stable slot and every cluster name a code, a vector response becomes
+    columnar arrays of slots, values and timestamps. Retained samples are kept as arrays, so
+    matching a series to its first value and summing by cluster are NumPy operations instead of
+    Python loops over the series. The label sets and slots of the last vector are kept, Prometheus
+    returns the same series in the same order between ticks, so only the new series build a key.
+    """
+
+    def __init__(self, rate_time: float):
+        self.rate_time = rate_time
+        # {series labels: slot}
+        self.series_slots = {}
+        # Cluster code of every slot
+        self.slot_clusters = np.zeros(0, dtype=np.int64)
+        # {cluster name: code}, cluster name is None for the series without cluster_name label
+        self.cluster_codes = {}
+        self.cluster_names = []
+        # Label sets and slots of the last vector
+        self.last_labels = []
+        self.last_slots = np.zeros(0, dtype=np.int64)
+        # Retained (time, slots, values) samples, the oldest one is the first value of the rate
+        self.history = deque()
+
+    def to_columns(self, metrics: list) -> tuple:
+        """
+        Converts a Prometheus vector into (slots, values, timestamps) arrays
+        """
+        labels_list = [metric['metric'] for metric in metrics]
+        if labels_list == self.last_labels:
+            slots = self.last_slots
+        else:
+            slots = self.slots_of(labels_list)
+            self.last_labels = labels_list
+            self.last_slots = slots
+
+        count = len(metrics)
+        values = np.fromiter((metric['value'][1] for metric in metrics), dtype=np.float64, count=count)
+        timestamps = np.fromiter((metric['value'][0] for metric in metrics), dtype=np.float64, count=count)
+        return slots, values, timestamps
+
+    def slots_of(self, labels_list: list) -> np.ndarray:
+        """
+        Returns the slots of the label sets, the series at the same position as in the last vector reuse its slot
+        """
+        last_labels = self.last_labels
+        slots = np.empty(len(labels_list), dtype=np.int64)
+        new_clusters = []
+        for i, labels in enumerate(labels_list):
+            if i < len(last_labels) and labels == last_labels[i]:
+                slots[i] = self.last_slots[i]
+                continue
+            key = series_key(labels)
+            slot = self.series_slots.get(key)
+            if slot is None:
+                slot = self.series_slots[key] = len(self.series_slots)
+                cluster_name = labels.get('cluster_name')
+                code = self.cluster_codes.get(cluster_name)
+                if code is None:
+                    code = self.cluster_codes[cluster_name] = len(self.cluster_names)
+                    self.cluster_names.append(cluster_name)
+                new_clusters.append(code)
+            slots[i] = slot
+        if new_clusters:
+            self.slot_clusters = np.concatenate([self.slot_clusters, np.array(new_clusters, dtype=np.int64)])
+        return slots
+
+    def group_totals(self, slots: np.ndarray, values: np.ndarray) -> tuple:
+        """
+        Returns the sums and counts of the values by cluster code
+        """
+        codes = self.slot_clusters[slots]
+        minlength = len(self.cluster_names)
+        sums = np.bincount(codes, weights=values, minlength=minlength)
+        counts = np.bincount(codes, minlength=minlength)
+        return sums, counts
+
+    def averages(self, metrics: list) -> list:
+        """
+        Returns the average value of the metrics by cluster
+        """
+        slots, values, _ = self.to_columns(metrics)
+        sums, counts = self.group_totals(slots, values)
+        return self.by_cluster(counts, sums / np.maximum(counts, 1))
+
+    def rate(self, metrics: list, now: float) -> list:
+        """
+        Retains the sample and calculates the rate of the average value by cluster
+        last value - first value / time(seconds)
+
+        The first value is the newest retained sample which is at least rate_time seconds old, or
+        the oldest retained sample until such a sample exists. Each series is matched to its own first
+        value by its slot, series which are not in both samples are skipped. Returns None on the first call.
+        """
+        slots, values, _ = self.to_columns(metrics)
+        self.history.append((now, slots, values))
+        # Drop the samples which are older than needed for the rate window
+        while len(self.history) > 2 and self.history[1][0] <= now - self.rate_time:
+            self.history.popleft()
+        if len(self.history) < 2:
+            return None
+        first_time, first_slots, first_values = self.history[0]
+        elapsed = now - first_time
+
+        # Dense array of the first values by slot, NaN for the series not in the first sample
+        first_by_slot = np.full(len(self.series_slots), np.nan)
+        first_by_slot[first_slots] = first_values
+        matched_first = first_by_slot[slots]
+        matched = ~np.isnan(matched_first)
+
+        first_sums, counts = self.group_totals(slots[matched], matched_first[matched])
+        last_sums, _ = self.group_totals(slots[matched], values[matched])
+        rates = (last_sums - first_sums) / np.maximum(counts, 1) / elapsed
+        self.compact()
+        return self.by_cluster(counts, rates) or None
+
+    def by_cluster(self, counts: np.ndarray, values: np.ndarray) -> list:
+        """
+        Returns [{'value': value, 'cluster_name': cluster_name}] for the clusters which have series
+        """
+        result = []
+        for code in np.flatnonzero(counts):
+            item = {'value': float(values[code])}
+            if self.cluster_names[code] is not None:
+                item['cluster_name'] = self.cluster_names[code]
+            result.append(item)
+        return result
+
+    def compact(self):
+        """
+        Drops the slots of the series which are not in the retained samples anymore
+        """
+        live = np.unique(np.concatenate([slots for _, slots, _ in self.history]))
+        if len(self.series_slots) <= 2 * len(live) + 64:
+            return
+        remap = np.full(len(self.series_slots), -1, dtype=np.int64)
+        remap[live] = np.arange(len(live))
+        self.series_slots = {key: int(remap[slot]) for key, slot in self.series_slots.items() if remap[slot] >= 0}
+        self.slot_clusters = self.slot_clusters[live]
+        self.history = deque((time, remap[slots], values) for time, slots, values in self.history)
+        # The slots of the last vector may be dropped, its series build their keys again
+        self.last_labels = []
+        self.last_slots = np.zeros(0, dtype=np.int64)
@@ -1,10 +1,14 @@
-from k8s_workload_scaler.workload_scaler import WorkloadScaler
+from k8s_workload_scaler.prometheus_session import PrometheusSession
+from k8s_workload_scaler.scaling_behavior import ScalingBehavior
+from k8s_workload_scaler.workload_scaler import DEFAULT_TOLERANCE, WorkloadScaler
 
-import requests
+import asyncio
 import logging
 
 __author__ = "Emin AKTAS <eminaktas34@gmail.com>"
 
+ALERTS_PATH = ('data', 'alerts')
+
 
 class PrometheusAlertAPI(WorkloadScaler):
     """
@@ -17,6 +21,9 @@ class PrometheusAlertAPI(WorkloadScaler):
     Sample query for alert rule
     $ sum(container_memory_usage_bytes{container="php-apache", namespace="default"}) /
      (count(container_memory_usage_bytes{container="php-apache", namespace="default"}))
+
+    With target_value, the value of the firing alert (the value of its expression) is the metric
+    value, and the workload is scaled to track the target in the direction of the alert
     """
 
     def __init__(
@@ -32,40 +39,193 @@ class PrometheusAlertAPI(WorkloadScaler):
             port: str = None,
             scaling_out_name: str = None,
             scaling_in_name: str = None,
+            watch_replicas: bool = False,
+            target_value: float = None,
+            tolerance: float = DEFAULT_TOLERANCE,
+            behavior: ScalingBehavior = None,
+            session: PrometheusSession = None,
     ):
         self.host = host
         self.port = port
         self.scaling_out_name = scaling_out_name
         self.scaling_in_name = scaling_in_name
-        WorkloadScaler.__init__(self, workload, name, namespace, scaling_range, max_number, min_number, kube_config)
+        # Pooled HTTP session with timeouts and retries for the Prometheus API
+        self.session = session or PrometheusSession()
+        WorkloadScaler.__init__(self, workload, name, namespace, scaling_range, max_number, min_number, kube_config,
+                                watch_replicas, target_value, tolerance, behavior)
 
         # Logging
         self.logger = logging.getLogger("PrometheusAlertAPI")
-        logging.basicConfig(
-            level=logging.NOTSET,
-            format='%(asctime)s.%(msecs)03d %(levelname)s %(module)s - %(funcName)s: %(message)s',
-            datefmt='%Y-%m-%d %H:%M:%S'
-        )
+
+    @property
+    def url(self):
+        return f"http://{self.host}:{self.port}/api/v1/alerts"
 
     def control_alert_and_trigger_scaling(self):
         """
         Finds the alert and controls if alert if firing and triggers the scaling
         """
-        url = f"http://{self.host}:{self.port}/api/v1/alerts"
-        self.logger.info(f"Now, calling the Prometheus API ({url}) to check if alert is firing")
-        result = requests.get(url)
-        if result.status_code > 299:
-            self.logger.error(f"Exception at control_alert_ad_trigger_scaling, "
-                              f"status code: {result.status_code}, reason: {result.reason}")
-            raise requests.RequestException
-        j_result = result.json()
-        if j_result.get('status', None) == 'success' and j_result.get('data', {}).get('alerts', None):
-            alert = next(_alert for _alert in j_result['data']['alerts']
-                         if (_alert['labels']['alertname'] == self.scaling_out_name or
-                             _alert['labels']['alertname'] == self.scaling_in_name))
+        self.logger.info("Now, calling the Prometheus API (%s) to check if alert is firing", self.url)
+        alerts = get_alerts(self.session, self.url, [self.scaling_out_name, self.scaling_in_name])
+        self.trigger_scaling(index_alerts(alerts))
+
+    def trigger_scaling(self, alert_index: dict):
+        """
+        Triggers the scaling for the firing alerts of the workload in the alert index
+        """
+        scaling_out_alerts = alert_index.get(self.scaling_out_name, {})
+        scaling_in_alerts = alert_index.get(self.scaling_in_name, {})
+        if not scaling_out_alerts and not scaling_in_alerts:
+            self.logger.warning("Alerts %s and %s not found in Prometheus", self.scaling_out_name, self.scaling_in_name)
+            return
+
+        # Scaling out wins when both alerts are firing for the same cluster
+        decisions = []
+        for cluster_name in list(scaling_out_alerts) + [c for c in scaling_in_alerts if c not in scaling_out_alerts]:
+            alert = scaling_out_alerts.get(cluster_name)
+            if alert is None or alert['state'] != 'firing':
+                alert = scaling_in_alerts.get(cluster_name, alert)
             if alert['state'] == 'firing':
                 self.logger.info("Prometheus alert is firing, the scaling is triggered")
-                self.scale(f"scaling_{alert['labels']['scaling']}", alert['labels'].get('cluster_name', None))
+                decisions.append((f"scaling_{alert['labels']['scaling']}", cluster_name, self.alert_value(alert)))
             else:
                 self.logger.info("Prometheus alert is not firing, scaling not triggered")
-                self.logger.info(f"Current metric value {alert['value']}")
+                self.logger.info("Current metric value %s", alert['value'])
+        for decision in self.coalesce(decisions):
+            self.scale(*decision)
+
+    def alert_value(self, alert: dict) -> float:
+        """
+        Returns the value of the alert for target tracking, None without target_value
+        """
+        if self.target_value is None:
+            return None
+        try:
+            return float(alert['value'])
+        except (KeyError, TypeError, ValueError):
+            self.logger.warning("Alert %s has no valid value, scaling by scaling_range", alert['labels']['alertname'])
+            return None
+
+
+def get_alerts(session: PrometheusSession, url: str, names: list = None) -> list:
+    """
+    Gets the alert list from Prometheus alert api
+    With names, the response is parsed while it is downloaded and only the alerts of the names are kept
+    """
+    if names is None:
+        return alerts_from_result(session.get_json(url))
+    values, alerts = session.stream_json(url, ALERTS_PATH, keep=alert_filter(names))
+    return alerts if values.get('status', None) == 'success' else []
+
+
+async def get_alerts_async(session: PrometheusSession, url: str, names: list = None) -> list:
+    """
+    Gets the alert list from Prometheus alert api without blocking the event loop
+    """
+    if names is None:
+        return alerts_from_result(await session.get_json_async(url))
+    values, alerts = await session.stream_json_async(url, ALERTS_PATH, keep=alert_filter(names))
+    return alerts if values.get('status', None) == 'success' else []
+
+
+def alert_filter(names: list):
+    """
+    Returns the keep function of the alerts of the names, see JsonArrayStream
+    """
+    names = set(names)
+
+    def keep(alert: dict) -> bool:
+        return (alert.get('labels') or {}).get('alertname') in names
+
+    return keep
+
+
+def alerts_from_result(j_result: dict) -> list:
+    if j_result.get('status', None) == 'success':
+        return j_result.get('data', {}).get('alerts', None) or []
+    return []
+
+
+def index_alerts(alerts: list) -> dict:
+    """
+    Indexes the alerts by alertname and cluster_name
+    {alertname: {cluster_name: alert}}, cluster_name is None if the alert has no cluster_name label
+    """
+    alert_index = {}
+    for alert in alerts:
+        labels = alert['labels']
+        by_cluster = alert_index.setdefault(labels['alertname'], {})
+        cluster_name = labels.get('cluster_name', None)
+        # Keep the firing one if an alert is listed more than once for the same cluster
+        if cluster_name not in by_cluster or alert['state'] == 'firing':
+            by_cluster[cluster_name] = alert
+    return alert_index
+
+
+class PrometheusAlertPoller:
+    """
+    PrometheusAlertPoller fetches the alert list of one Prometheus once per tick and
+    dispatches it to every registered PrometheusAlertAPI
+    """
+
+    def __init__(
+            self,
+            host: str = None,
+            port: str = None,
+            session: PrometheusSession = None,
+    ):
+        self.host = host
+        self.port = port
+        self.managers = []
+        self.session = session or PrometheusSession()
+
+        # Logging
+        self.logger = logging.getLogger("PrometheusAlertPoller")
+
+    @property
+    def url(self):
+        return f"http://{self.host}:{self.port}/api/v1/alerts"
+
+    def register(self, manager: PrometheusAlertAPI):
+        self.managers.append(manager)
+
+    @property
+    def alert_names(self) -> list:
+        """
+        Names of the alerts of the registered workloads, the other alerts are not parsed
+        """
+        names = set()
+        for manager in self.managers:
+            names.update((manager.scaling_out_name, manager.scaling_in_name))
+        return sorted(names)
+
+    def poll(self):
+        """
+        Fetches the alerts once and triggers the scaling for all registered workloads
+        """
+        self.logger.info("Now, calling the Prometheus API (%s) for %s workloads", self.url, len(self.managers))
+        alert_index = index_alerts(get_alerts(self.session, self.url, self.alert_names))
+        for manager in self.managers:
+            self.trigger_scaling(manager, alert_index)
+
+    async def poll_async(self):
+        """
+        Fetches the alerts once with async HTTP and triggers the scaling for all registered
+        workloads concurrently in the default executor of the event loop
+        """
+        self.logger.info("Now, calling the Prometheus API (%s) for %s workloads", self.url, len(self.managers))
+        alert_index = index_alerts(await get_alerts_async(self.session, self.url, self.alert_names))
+        loop = asyncio.get_event_loop()
+        await asyncio.gather(*[
+            loop.run_in_executor(None, self.trigger_scaling, manager, alert_index) for manager in self.managers
+        ])
+
+    async def close(self):
+        await self.session.close_async()
+
+    def trigger_scaling(self, manager: PrometheusAlertAPI, alert_index: dict):
+        try:
+            manager.trigger_scaling(alert_index)
+        except Exception as e:
+            self.logger.error("Exception at trigger_scaling for %s (namespace: %s, workload: %s): %s",
+                              manager.name, manager.namespace, manager.workload, e)
@@ -1,11 +1,78 @@
-from k8s_workload_scaler.workload_scaler import WorkloadScaler
-from prometheus_api_client import PrometheusConnect
-from time import sleep
+from k8s_workload_scaler.forecaster import MetricForecaster
+from k8s_workload_scaler.metric_aggregator import MetricAggregator
+from k8s_workload_scaler.prometheus_session import PrometheusSession
+from k8s_workload_scaler.range_cache import RangeQueryCache
+from k8s_workload_scaler.scaling_behavior import ScalingBehavior
+from k8s_workload_scaler.workload_scaler import DEFAULT_TOLERANCE, WorkloadScaler
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from math import ceil
+from time import monotonic, time
 
+import asyncio
 import logging
+import re
+import threading
 
 __author__ = "Emin AKTAS <eminaktas34@gmail.com>"
 
+DEFAULT_SCALING_WORKERS = 8
+DEFAULT_SCALING_TIMEOUT = 30
+# Scaling of a multi-metric target, the replicas are the highest recommendation of its metrics
+SCALING_BY_METRICS = 'scaling_by_metrics'
+RESULT_PATH = ('data', 'result')
+
+
+class MetricSpec:
+    """
+    MetricSpec is one metric of a multi-metric PrometheusMetricAPI
+
+    A metric recommends a replica number from its rate, either by its threshold values (scaling
+    range more or less than the current replicas) or by its target_value (target tracking).
+    """
+
+    def __init__(
+            self,
+            metric_name: str = None,
+            label_list: dict = None,
+            scaling_out_threshold_value: float = None,
+            scaling_in_threshold_value: float = None,
+            target_value: float = None,
+            tolerance: float = DEFAULT_TOLERANCE,
+            rate_time: int = None,
+    ):
+        if metric_name is None:
+            raise Exception("metric_name of a metric is not defined")
+        if target_value is None and (scaling_out_threshold_value is None or scaling_in_threshold_value is None):
+            raise Exception(f"Metric {metric_name} needs target_value or scaling out and in threshold values")
+        self.metric_name = metric_name
+        self.label_list = label_list
+        self.scaling_out_threshold_value = scaling_out_threshold_value
+        self.scaling_in_threshold_value = scaling_in_threshold_value
+        self.target_value = target_value
+        self.tolerance = DEFAULT_TOLERANCE if tolerance is None else tolerance
+        self.rate_time = rate_time
+        self.aggregator = MetricAggregator(rate_time)
+
+    def __str__(self):
+        return f"{self.metric_name}{self.label_list}"
+
+    def in_band(self, value: float) -> bool:
+        """
+        Returns True if the rate keeps the replicas whatever they are
+        """
+        if self.target_value is not None:
+            return abs(value / self.target_value - 1) <= self.tolerance
+        return self.scaling_in_threshold_value <= value <= self.scaling_out_threshold_value
+
+    def desired_replicas(self, replicas: int, value: float, scaling_range: int) -> int:
+        if self.in_band(value):
+            return replicas
+        if self.target_value is not None:
+            return ceil(max(replicas, 1) * value / self.target_value)
+        if value > self.scaling_out_threshold_value:
+            return replicas + scaling_range
+        return replicas - scaling_range
+
 
 class PrometheusMetricAPI(WorkloadScaler):
     """
@@ -13,7 +80,14 @@ class PrometheusMetricAPI(WorkloadScaler):
 
     This function basically grapes the metrics of specified with label name, label value and metric name.
     It sums metric values and dived by the pod number of target pod which is to be scaled.
-    With the defined threshold values, it controls the violation
+    With the defined threshold values, it controls the violation. With target_value, every cluster
+    whose rate is out of the tolerance of the target is scaled to track the target
+
+    With a forecaster, the rate is forecast from its history and the decisions use the higher of
+    the forecast and the last rate, so the workload is scaled out ahead of the load
+
+    With metrics (a list of MetricSpec parameters), every metric recommends a replica number and
+    the workload is scaled to the highest one. The metric of metric_name, if given, is one of them.
     """
 
     def __init__(
@@ -32,6 +106,16 @@ class PrometheusMetricAPI(WorkloadScaler):
             scaling_out_threshold_value: float = None,
             scaling_in_threshold_value: float = None,
             rate_time: int = None,
+            scaling_workers: int = DEFAULT_SCALING_WORKERS,
+            scaling_timeout: float = DEFAULT_SCALING_TIMEOUT,
+            watch_replicas: bool = False,
+            target_value: float = None,
+            tolerance: float = DEFAULT_TOLERANCE,
+            behavior: ScalingBehavior = None,
+            forecaster: MetricForecaster = None,
+            metrics: list = None,
+            session: PrometheusSession = None,
+            scaling_executor: ThreadPoolExecutor = None,
     ):
         self.host = host
         self.port = port
@@ -40,128 +124,497 @@ class PrometheusMetricAPI(WorkloadScaler):
         self.scaling_out_threshold_value = scaling_out_threshold_value
         self.label_list = label_list
         self.rate_time = rate_time
-        WorkloadScaler.__init__(self, workload, name, namespace, scaling_range, max_number, min_number, kube_config)
+        self.aggregator = MetricAggregator(rate_time)
+        # Predictive scaling from the history of the rate
+        self.forecaster = forecaster
+        # Metrics of a multi-metric target, None for a single metric target
+        self.metric_specs = None
+        if metrics:
+            self.metric_specs = [MetricSpec(**dict({'rate_time': rate_time}, **metric)) for metric in metrics]
+            if metric_name is not None:
+                self.metric_specs.insert(0, MetricSpec(metric_name, label_list, scaling_out_threshold_value,
+                                                       scaling_in_threshold_value, target_value, tolerance,
+                                                       rate_time))
+        # Long-lived pooled session with timeouts and retries for the Prometheus API
+        self.session = session or PrometheusSession()
+        # History of the rate of the forecaster, only the new steps are queried at each tick
+        self.range_cache = None
+        if forecaster is not None:
+            self.range_cache = RangeQueryCache(self.url, self.session, forecaster.step, forecaster.history)
+        # Per-cluster scaling runs in a worker pool shared by the targets of the controller, scaling_workers
+        # clusters of the target at a time. Without a shared pool, one is created on the first use
+        self.scaling_workers = scaling_workers
+        self.scaling_timeout = scaling_timeout
+        self.scaling_executor = scaling_executor
+        # Clusters which are being scaled, a cluster whose scaling timed out stays here until its worker returns
+        self.scaling_clusters = set()
+        self.scaling_lock = threading.Lock()
+        WorkloadScaler.__init__(self, workload, name, namespace, scaling_range, max_number, min_number, kube_config,
+                                watch_replicas, target_value, tolerance, behavior)
 
         # Logging
         self.logger = logging.getLogger("PrometheusMetricAPI")
-        logging.basicConfig(
-            level=logging.NOTSET,
-            format='%(asctime)s.%(msecs)03d %(levelname)s %(module)s - %(funcName)s: %(message)s',
-            datefmt='%Y-%m-%d %H:%M:%S'
-        )
+
+    @property
+    def url(self):
+        return f"http://{self.host}:{self.port}"
 
     def get_one_metric(self):
         """
         Get defined metric from Prometheus API
         """
         try:
-            url = f"http://{self.host}:{self.port}"
-            self.logger.info(f"Getting metrics from Prometheus (url={url})")
-            prom = PrometheusConnect(url=url, disable_ssl=True)
-            metrics = prom.get_current_metric_value(metric_name=self.metric_name, label_config=self.label_list)
-            self.logger.debug(f"{metrics}")
+            self.logger.info("Getting metrics from Prometheus (url=%s)", self.url)
+            metrics = query_vector(self.session, self.url, label_selector(self.metric_name, self.label_list))
+            self.logger.debug("Got %s series of %s", len(metrics), self.metric_name)
+            self.logger.debug("Query latency: %ss", self.session.stats['last_latency_seconds'])
             return metrics
         except Exception as e:
-            self.logger.error(f"Exception at get_metric: {e}")
+            self.logger.error("Exception at get_metric: %s", e)
             return None
 
-    def rate_metrics(self):
+    def rate_metrics(self, metric_values: list = None):
         """
         Calculate the rate of the metrics by cluster
         last value - first value / time(seconds)
+
+        The first value is a sample retained from an earlier call, the newest one which is at least
+        rate_time seconds old. Until such a sample exists the oldest retained sample is used, so the
+        call never waits for the rate window. Returns None on the first call.
+
+        Each series is matched to its own first value by its label set, series which are not in
+        both samples are skipped. Aggregation is done by MetricAggregator on NumPy arrays.
+
+        metric_values are the series of the workload fetched by a PrometheusMetricPoller, they are
+        queried from Prometheus if not given.
         """
-        def get_metrics():
+        if metric_values is None:
             metric_values = self.get_one_metric()
-            if not metric_values:
-                self.logger.warning(f"Metrics not found: {self.metric_name}{self.label_list} in Prometheus")
-                return None
-            cluster_names = []
-            for cluster in metric_values:
-                if cluster['metric'].get('cluster_name'):
-                    cluster_names.append(cluster['metric']['cluster_name'])
-            return metric_values, cluster_names
-
-        first_metrics, first_clusters = get_metrics()
-        # Wait for rate calculation
-        sleep(self.rate_time)
-        last_metrics, last_clusters = get_metrics()
-
-        rate_list_by_cluster = []
-        if first_clusters and last_clusters:
-            if sorted(first_clusters) != sorted(last_clusters):
-                self.logger.warning(f"Cluster list are not equal between first and last query "
-                                    f"first_cluster={first_clusters} != last_cluster={last_clusters}")
-                return None
-
-            metric_list_by_cluster = []
-            for cluster_name in first_clusters:
-                first_total = 0
-                last_total = 0
-                count_1 = 0
-                count_2 = 0
-                for f, l in zip(first_metrics, last_metrics):
-                    if f['metric']['cluster_name'] == cluster_name:
-                        count_1 += 1
-                        first_total += float(f['value'][1])
-                    if l['metric']['cluster_name'] == cluster_name:
-                        count_2 += 1
-                        last_total += float(l['value'][1])
-                if count_1 != count_2:
-                    self.logger.warning(f"{cluster_name} metric counts must match. Skipping...")
-                else:
-                    metric_list_by_cluster.append({
-                        'cluster_name': cluster_name,
-                        'first_total': first_total,
-                        'last_total': last_total,
-                        'count': count_1
-                    })
-
-            for metric in metric_list_by_cluster:
-                first_avg_total = metric['first_total'] / metric['count']
-                last_avg_total = metric['last_total'] / metric['count']
-                rate_list_by_cluster.append({
-                    'value': (last_avg_total - first_avg_total) / self.rate_time,
-                    'cluster_name': metric['cluster_name']
-                })
-        else:
-            first_metric_count = len(first_metrics)
-            last_metric_count = len(last_metrics)
-            first_total = 0
-            last_total = 0
-            for f, l in zip(first_metrics, last_metrics):
-                first_total += float(f['value'][1])
-                last_total += float(l['value'][1])
+        if not metric_values:
+            self.logger.warning("Metrics not found: %s%s in Prometheus", self.metric_name, self.label_list)
+            return None
+        rate_list_by_cluster = self.aggregator.rate(metric_values, monotonic())
+        if rate_list_by_cluster is None and len(self.aggregator.history) < 2:
+            self.logger.info("First sample of %s%s is retained, rate will be calculated at the next call",
+                             self.metric_name, self.label_list)
+        return rate_list_by_cluster
 
-            first_avg_total = first_total / first_metric_count
-            last_avg_total = last_total / last_metric_count
+    @property
+    def rate_query(self) -> str:
+        """
+        PromQL query of the average rate of the series by cluster
+        """
+        selector = label_selector(self.metric_name, self.label_list)
+        return f"avg by (cluster_name) (rate({selector}[{int(self.rate_time)}s]))"
 
-            rate_list_by_cluster.append({
-                'value': (last_avg_total - first_avg_total) / self.rate_time
-            })
+    def forecast_metrics(self):
+        """
+        Forecasts the rate of the metrics by cluster
 
-        return rate_list_by_cluster
+        The history of the rate is fetched through the range query cache which only queries the steps
+        after the last fetched one, so each call only adds the new points to the fitted models.
+        Only the clusters which got new points or whose last point is within one step are forecast,
+        the models of the clusters without points in the range window are dropped.
+        Returns [{'value': max(forecast, last rate), 'cluster_name': cluster_name}], None until
+        a model is initialized.
+        """
+        now = time()
+        try:
+            self.logger.info("Getting the rate history from Prometheus (url=%s)", self.url)
+            result = self.range_cache.fetch(self.rate_query, now)
+        except Exception as e:
+            self.logger.error("Exception at forecast_metrics: %s", e)
+            return None
+        updated = set()
+        for series in result:
+            cluster_name = series['metric'].get('cluster_name')
+            self.forecaster.update(cluster_name, series['values'])
+            updated.add(cluster_name)
+        for cluster_name in self.forecaster.evict(now - self.range_cache.window):
+            self.logger.info("Rate of %s%s has no points in cluster %s anymore, its model is dropped",
+                             self.metric_name, self.label_list, cluster_name or 'In cluster config')
+
+        forecast_list = []
+        for cluster_name in list(self.forecaster.models):
+            last_time = self.forecaster.last_time(cluster_name)
+            if cluster_name not in updated and (last_time is None or now - last_time > self.forecaster.step):
+                self.logger.debug("Rate of %s%s has no new points in cluster %s, it is not forecast",
+                                  self.metric_name, self.label_list, cluster_name or 'In cluster config')
+                continue
+            forecast = self.forecaster.forecast(cluster_name)
+            if forecast is None:
+                continue
+            last_value = self.forecaster.last_value(cluster_name)
+            self.logger.info("Rate of %s%s in %ss is forecast as %s (last rate: %s, cluster: %s)",
+                             self.metric_name, self.label_list, self.forecaster.horizon, forecast, last_value,
+                             cluster_name or 'In cluster config')
+            item = {'value': max(forecast, last_value)}
+            if cluster_name is not None:
+                item['cluster_name'] = cluster_name
+            forecast_list.append(item)
+        return forecast_list or None
+
+    def executor(self) -> ThreadPoolExecutor:
+        """
+        Returns the shared worker pool, or the pool of the target created on the first use
+        """
+        if self.scaling_executor is None:
+            self.scaling_executor = ThreadPoolExecutor(max_workers=self.scaling_workers,
+                                                       thread_name_prefix=f"scaling-{self.name}")
+        return self.scaling_executor
+
+    def get_spec_metric(self, spec: MetricSpec):
+        try:
+            return query_vector(self.session, self.url, label_selector(spec.metric_name, spec.label_list))
+        except Exception as e:
+            self.logger.error("Exception at get_spec_metric (%s): %s", spec, e)
+            return None
+
+    def rate_spec_metrics(self) -> dict:
+        """
+        Queries all metrics concurrently and calculates their rates by cluster
+        {cluster_name: [rate of every metric, None if the metric has no rate]}
+        """
+        self.logger.info("Getting %s metrics from Prometheus (url=%s)", len(self.metric_specs), self.url)
+        metric_values = list(self.executor().map(self.get_spec_metric, self.metric_specs))
+        now = monotonic()
+        rates_by_cluster = {}
+        for index, (spec, metrics) in enumerate(zip(self.metric_specs, metric_values)):
+            if not metrics:
+                self.logger.warning("Metrics not found: %s in Prometheus", spec)
+                continue
+            for rate in spec.aggregator.rate(metrics, now) or []:
+                rates = rates_by_cluster.setdefault(rate.get('cluster_name'), [None] * len(self.metric_specs))
+                rates[index] = rate['value']
+        return rates_by_cluster
+
+    def control_spec_metrics(self):
+        """
+        Controls the scaling of a multi-metric target
+        Returns the results of the clusters which are scaled, see scale_clusters
+        """
+        decisions = []
+        for cluster_name, rates in self.rate_spec_metrics().items():
+            if all(rate is None or spec.in_band(rate) for spec, rate in zip(self.metric_specs, rates)):
+                self.logger.info("Violation not detected in cluster: %s", cluster_name or 'In cluster config')
+                continue
+            self.logger.info("Violation detected, the scaling is triggered for the workload in cluster: %s",
+                             cluster_name or 'In cluster config')
+            decisions.append((SCALING_BY_METRICS, cluster_name, rates))
+        return self.scale_clusters(decisions)
+
+    def recommend_replicas(self, scaling, replicas: int, metric_value=None) -> int:
+        """
+        Returns the recommended replica number, the highest recommendation of the metrics for the
+        scaling by metrics where metric_value is the list of the rates of the metrics
+        """
+        if scaling != SCALING_BY_METRICS:
+            return WorkloadScaler.recommend_replicas(self, scaling, replicas, metric_value)
+        recommendations = [(spec, spec.desired_replicas(replicas, rate, self.scaling_range))
+                           for spec, rate in zip(self.metric_specs, metric_value) if rate is not None]
+        if not recommendations:
+            return None
+        for spec, desired in recommendations:
+            self.logger.info("Metric %s recommends %s replicas", spec, desired)
+        new_replicas = max(self.min_number, min(self.max_number, max(desired for _, desired in recommendations)))
+        if new_replicas == replicas:
+            return None
+        self.logger.info("Scaling %s (namespace: %s, workload: %s) from %s to %s",
+                         self.name, self.namespace, self.workload, replicas, new_replicas)
+        return new_replicas
 
-    def control_and_trigger_scaling(self):
+    def control_and_trigger_scaling(self, metric_values: list = None):
         """
         Controls scaling if there is any violation of threshold
+        Returns the results of the clusters which are scaled, see scale_clusters
         """
-        self.logger.info(f"Controlling for scaling if there is any violation")
-        rate_list = self.rate_metrics()
-        if rate_list is None:
-            self.logger.warning(f"Rate cannot be calculated: {self.metric_name}{self.label_list} not "
-                                f"found in Prometheus")
+        self.logger.info("Controlling for scaling if there is any violation")
+        if self.metric_specs:
+            return self.control_spec_metrics()
+        if self.forecaster is not None:
+            rate_list = self.forecast_metrics()
         else:
-            for rate in rate_list:
-                cluster_name = rate.get('cluster_name', None)
-                if rate['value'] > self.scaling_out_threshold_value:
-                    self.logger.info(f"Violation detected ({rate['value']} > {self.scaling_out_threshold_value})")
-                    self.logger.info(f"The scaling out is triggered for the workload "
-                                     f"in cluster: {cluster_name or 'In cluster config'}")
-                    self.scale(f"scaling_out", cluster_name)
-                elif rate['value'] < self.scaling_in_threshold_value:
-                    self.logger.info(f"Violation detected ({rate['value']} < {self.scaling_in_threshold_value})")
-                    self.logger.info(f"The scaling in is triggered for the workload "
-                                     f"in cluster: {cluster_name or 'In cluster config'}")
-                    self.scale(f"scaling_in", cluster_name)
-                else:
-                    self.logger.info("Violation not detected")
+            rate_list = self.rate_metrics(metric_values)
+        if rate_list is None:
+            self.logger.warning("Rate cannot be calculated: %s%s not found in Prometheus",
+                                self.metric_name, self.label_list)
+            return []
+
+        decisions = []
+        for rate in rate_list:
+            cluster_name = rate.get('cluster_name', None)
+            if self.target_value is not None:
+                ratio = rate['value'] / self.target_value
+                if abs(ratio - 1) <= self.tolerance:
+                    self.logger.info("Rate %s is within the tolerance of the target %s",
+                                     rate['value'], self.target_value)
+                    continue
+                self.logger.info("Rate %s is off the target %s, the scaling is triggered for the workload in "
+                                 "cluster: %s", rate['value'], self.target_value, cluster_name or 'In cluster config')
+                decisions.append(("scaling_out" if ratio > 1 else "scaling_in", cluster_name, rate['value']))
+            elif rate['value'] > self.scaling_out_threshold_value:
+                self.logger.info("Violation detected (%s > %s)", rate['value'], self.scaling_out_threshold_value)
+                self.logger.info("The scaling out is triggered for the workload in cluster: %s",
+                                 cluster_name or 'In cluster config')
+                decisions.append(("scaling_out", cluster_name))
+            elif rate['value'] < self.scaling_in_threshold_value:
+                self.logger.info("Violation detected (%s < %s)", rate['value'], self.scaling_in_threshold_value)
+                self.logger.info("The scaling in is triggered for the workload in cluster: %s",
+                                 cluster_name or 'In cluster config')
+                decisions.append(("scaling_in", cluster_name))
+            else:
+                self.logger.info("Violation not detected")
+        return self.scale_clusters(decisions)
+
+    def scale_clusters(self, decisions: list) -> list:
+        """
+        Scales the workload in the clusters of the (scaling, cluster_name[, metric_value]) decisions in parallel
+        The decisions are coalesced into one decision per cluster first, see coalesce
+
+        The clusters are scaled in the worker pool, at most scaling_workers at a time. A cluster which is not scaled
+        in scaling_timeout seconds after its scaling started is reported as timed out and its
+        result is discarded. A cluster which is still being scaled, e.g. by the timed out worker of an earlier
+        tick, is skipped. Returns [{'cluster_name', 'scaling', 'result', 'error'}] in the order
+        of the decisions.
+        """
+        decisions = self.coalesce(decisions)
+        results = [{'cluster_name': decision[1], 'scaling': decision[0], 'result': None, 'error': None}
+                   for decision in decisions]
+        claimed = []
+        for index, decision in enumerate(decisions):
+            if self.claim(decision[1]):
+                claimed.append(index)
+                continue
+            self.logger.warning("Scaling %s (namespace: %s, workload: %s) in cluster %s is skipped, "
+                                "the previous scaling is still running",
+                                self.name, self.namespace, self.workload, decision[1])
+            results[index]['error'] = Exception(f"{decision[1]} is still being scaled")
+        if len(claimed) == 1:
+            decision = decisions[claimed[0]]
+            try:
+                results[claimed[0]]['result'] = self.scale(*decision)
+            finally:
+                self.release(decision[1])
+            return results
+
+        started = {}
+
+        def scale(index, decision):
+            started[index] = monotonic()
+            try:
+                return self.scale(*decision)
+            finally:
+                self.release(decision[1])
+
+        waiting = [(index, decisions[index]) for index in claimed]
+        futures = {}
+
+        def submit(pending: set):
+            # The decisions are submitted as the earlier ones finish, so a target never holds more than
+            # scaling_workers threads of the shared pool
+            while waiting and len(pending) < self.scaling_workers:
+                index, decision = waiting[0]
+                future = self.executor().submit(scale, index, decision)
+                waiting.pop(0)
+                futures[future] = index
+                pending.add(future)
+
+        pending = set()
+        try:
+            submit(pending)
+            while pending:
+                # Wake up at the earliest timeout of the started clusters
+                deadlines = [started[futures[f]] + self.scaling_timeout for f in pending if futures[f] in started]
+                timeout = max(min(deadlines) - monotonic(), 0) if deadlines else self.scaling_timeout
+                done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+                for future in done:
+                    try:
+                        results[futures[future]]['result'] = future.result()
+                    except Exception as e:
+                        results[futures[future]]['error'] = e
+                now = monotonic()
+                for future in list(pending):
+                    index = futures[future]
+                    # A cluster which could not start in time means all workers are stuck
+                    stuck = not deadlines and not done and future.cancel()
+                    if stuck:
+                        self.release(decisions[index][1])
+                    if stuck or (index in started and now - started[index] >= self.scaling_timeout):
+                        self.logger.error("Scaling %s (namespace: %s, workload: %s) in cluster %s timed out after %ss",
+                                          self.name, self.namespace, self.workload, decisions[index][1],
+                                          self.scaling_timeout)
+                        results[index]['error'] = TimeoutError(f"timed out after {self.scaling_timeout}s")
+                        pending.discard(future)
+                submit(pending)
+        finally:
+            # The clusters which were not submitted are not being scaled
+            for _, decision in waiting:
+                self.release(decision[1])
+        return results
+
+    def claim(self, cluster_name: str) -> bool:
+        """
+        Marks the cluster as being scaled, returns False if it is already being scaled
+        """
+        with self.scaling_lock:
+            if cluster_name in self.scaling_clusters:
+                return False
+            self.scaling_clusters.add(cluster_name)
+            return True
+
+    def release(self, cluster_name: str):
+        with self.scaling_lock:
+            self.scaling_clusters.discard(cluster_name)
+
+
+def query_vector(session: PrometheusSession, url: str, query: str, keep=None) -> list:
+    """
+    Queries the instant vector of the query [{'metric': labels, 'value': [time, value]}]
+    The response is parsed while it is downloaded, only the series kept by keep are retained
+    """
+    values, series = session.stream_json(f"{url}/api/v1/query", RESULT_PATH, {'query': query}, keep)
+    return vector_of(query, values, series)
+
+
+async def query_vector_async(session: PrometheusSession, url: str, query: str, keep=None) -> list:
+    """
+    Queries the instant vector of the query without blocking the event loop, see query_vector
+    """
+    values, series = await session.stream_json_async(f"{url}/api/v1/query", RESULT_PATH, {'query': query}, keep)
+    return vector_of(query, values, series)
+
+
+def vector_of(query: str, values: dict, series: list) -> list:
+    if values.get('status', None) != 'success':
+        raise Exception(f"Query {query} failed: {values.get('error', None)}")
+    return series
+
+
+def label_selector(metric_name: str, label_list: dict) -> str:
+    """
+    Returns the selector of the series of the metric with the label values
+    metric_name{label_1="value_1",label_2="value_2"}
+    """
+    if not label_list:
+        return metric_name
+    matchers = [f'{name}="{escape_label_value(value)}"' for name, value in sorted(label_list.items())]
+    return metric_name + '{' + ','.join(matchers) + '}'
+
+
+def escape_label_value(value) -> str:
+    """
+    Escapes the label value for a double quoted PromQL string
+    """
+    return str(value).replace('\\', '\\\\').replace('"', '\\"')
+
+
+def label_matcher(values: list) -> str:
+    """
+    Returns a PromQL regex matcher value which matches any of the label values exactly
+    """
+    return escape_label_value('|'.join(re.escape(str(value)) for value in sorted(set(values), key=str)))
+
+
+def build_batch_query(metric_name: str, label_lists: list) -> str:
+    """
+    Merges the label lists of many targets of the same metric into one selector
+    metric_name{label_1=~"value_1|value_2",label_2=~"value_3"}
+    The selector matches a superset of the series of every target, see PrometheusMetricPoller.split
+    """
+    label_names = sorted({name for label_list in label_lists for name in label_list})
+    if not label_names:
+        return metric_name
+    matchers = [f'{name}=~"{label_matcher([label_list[name] for label_list in label_lists])}"'
+                for name in label_names]
+    return metric_name + '{' + ','.join(matchers) + '}'
+
+
+class PrometheusMetricPoller:
+    """
+    PrometheusMetricPoller queries one metric once per tick for all registered PrometheusMetricAPI
+    with the same label names, and splits the series back to each workload
+
+    The targets must watch the same metric with the same label names, only the label values differ.
+    """
+
+    def __init__(
+            self,
+            url: str = None,
+            session: PrometheusSession = None,
+            metric_name: str = None,
+            label_names: tuple = (),
+    ):
+        self.url = url
+        self.session = session
+        self.metric_name = metric_name
+        self.label_names = tuple(sorted(label_names))
+        self.managers = []
+        self.query = metric_name
+        # Label values of the registered workloads, see split
+        self.registered_label_values = set()
+
+        # Logging
+        self.logger = logging.getLogger("PrometheusMetricPoller")
+
+    def register(self, manager: PrometheusMetricAPI):
+        self.managers.append(manager)
+        self.query = build_batch_query(self.metric_name, [manager.label_list or {} for manager in self.managers])
+        self.registered_label_values = {self.label_values(manager.label_list or {}) for manager in self.managers}
+
+    def label_values(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(name)) for name in self.label_names)
+
+    def get_metrics(self) -> list:
+        self.logger.info("Getting metrics from Prometheus (url=%s) for %s workloads",
+                         self.url, len(self.managers))
+        return query_vector(self.session, self.url, self.query, self.is_registered)
+
+    async def get_metrics_async(self) -> list:
+        self.logger.info("Getting metrics from Prometheus (url=%s) for %s workloads",
+                         self.url, len(self.managers))
+        return await query_vector_async(self.session, self.url, self.query, self.is_registered)
+
+    def is_registered(self, series: dict) -> bool:
+        """
+        Returns if the series belongs to a registered workload, the superset of the batch query is dropped
+        """
+        return self.label_values(series['metric']) in self.registered_label_values
+
+    def split(self, metrics: list) -> dict:
+        """
+        Splits the series by the values of the label names
+        {(label_1 value, label_2 value): [series]}
+        """
+        series_by_labels = {}
+        for metric in metrics:
+            series_by_labels.setdefault(self.label_values(metric['metric']), []).append(metric)
+        return series_by_labels
+
+    def series_of(self, manager: PrometheusMetricAPI, series_by_labels: dict) -> list:
+        return series_by_labels.get(self.label_values(manager.label_list or {}), [])
+
+    def control(self, manager: PrometheusMetricAPI, series_by_labels: dict):
+        try:
+            manager.control_and_trigger_scaling(self.series_of(manager, series_by_labels))
+        except Exception as e:
+            self.logger.error("Exception at control for %s (namespace: %s, workload: %s): %s",
+                              manager.name, manager.namespace, manager.workload, e)
+
+    def poll(self):
+        """
+        Queries the metric once and controls the scaling of all registered workloads
+        """
+        series_by_labels = self.split(self.get_metrics())
+        for manager in self.managers:
+            self.control(manager, series_by_labels)
+
+    async def poll_async(self):
+        """
+        Queries the metric once with async HTTP and controls the scaling of all registered workloads
+        concurrently in the default executor of the event loop
+        """
+        series_by_labels = self.split(await self.get_metrics_async())
+        loop = asyncio.get_event_loop()
+        await asyncio.gather(*[
+            loop.run_in_executor(None, self.control, manager, series_by_labels) for manager in self.managers
+        ])
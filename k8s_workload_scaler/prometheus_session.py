@@ -0,0 +1,234 @@
+from k8s_workload_scaler.exporter import PROMETHEUS_QUERY_SECONDS
+from k8s_workload_scaler.json_stream import STREAM_CHUNK_SIZE, JsonArrayStream
+from requests.adapters import HTTPAdapter
+from time import monotonic, sleep
+
+import aiohttp
+import asyncio
+import logging
+import random
+import requests
+
+__author__ = "Emin AKTAS <eminaktas34@gmail.com>"
+
+DEFAULT_CONNECT_TIMEOUT = 3.05
+DEFAULT_READ_TIMEOUT = 30
+DEFAULT_RETRIES = 2
+DEFAULT_BACKOFF = 0.5
+DEFAULT_POOL_SIZE = 10
+
+
+class ServerError(requests.RequestException):
+    """
+    Raised for 5xx responses, which are retried
+    """
+
+
+# Errors of the requests sent with requests and aiohttp which are retried, see PrometheusSession.retry_delay
+RETRYABLE_ERRORS = (requests.ConnectionError, requests.Timeout, ServerError, aiohttp.ClientConnectionError,
+                    asyncio.TimeoutError)
+
+
+class TimeoutHTTPAdapter(HTTPAdapter):
+    """
+    HTTPAdapter which applies the default timeout to the requests sent without a timeout
+    """
+
+    def __init__(self, timeout: tuple = None, **kwargs):
+        self.timeout = timeout
+        HTTPAdapter.__init__(self, **kwargs)
+
+    def send(self, request, **kwargs):
+        if kwargs.get('timeout') is None:
+            kwargs['timeout'] = self.timeout
+        return HTTPAdapter.send(self, request, **kwargs)
+
+
+class PrometheusSession:
+    """
+    PrometheusSession is a long-lived HTTP session for the Prometheus API
+
+    Connections are pooled and kept alive between polls, requests have connect and read timeouts and
+    ask for gzip responses. Connection errors, timeouts and 5xx responses are retried with exponential
+    backoff and full jitter, other error responses raise at once. Request latency and failure counts
+    are kept in stats. The requests session can be given to other clients, their calls get the same
+    timeouts, retries and stats through call. Large responses can be parsed
+    while they are downloaded with stream_json, keeping only the elements that are needed.
+    """
+
+    def __init__(
+            self,
+            connect_timeout: float = DEFAULT_CONNECT_TIMEOUT,
+            read_timeout: float = DEFAULT_READ_TIMEOUT,
+            retries: int = DEFAULT_RETRIES,
+            backoff: float = DEFAULT_BACKOFF,
+            pool_size: int = DEFAULT_POOL_SIZE,
+    ):
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.pool_size = pool_size
+        self.headers = {'Accept-Encoding': 'gzip', 'Accept': 'application/json'}
+
+        self.session = requests.Session()
+        adapter = TimeoutHTTPAdapter(timeout=(connect_timeout, read_timeout), pool_connections=1,
+                                     pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers.update(self.headers)
+        # aiohttp session of get_json_async, created in the running event loop
+        self.async_session = None
+
+        self.stats = {
+            'requests': 0,
+            'failures': 0,
+            'retries': 0,
+            'latency_seconds_total': 0.0,
+            'last_latency_seconds': None,
+        }
+
+        # Logging
+        self.logger = logging.getLogger("PrometheusSession")
+
+    def backoff_delay(self, attempt: int) -> float:
+        """
+        Returns the delay before the retry, exponential backoff with full jitter
+        """
+        return random.uniform(0, self.backoff * 2 ** attempt)
+
+    def record(self, started: float, failed: bool):
+        latency = monotonic() - started
+        self.stats['requests'] += 1
+        self.stats['latency_seconds_total'] += latency
+        self.stats['last_latency_seconds'] = latency
+        if failed:
+            self.stats['failures'] += 1
+        PROMETHEUS_QUERY_SECONDS.observe(latency, outcome='failure' if failed else 'success')
+
+    def retry_delay(self, started: float, attempt: int, error: Exception) -> float:
+        """
+        Records the failed attempt and returns the delay before its retry, raises the error if it is not retried
+        Connection errors, timeouts and 5xx responses are retried up to retries times
+        """
+        self.record(started, True)
+        if not isinstance(error, RETRYABLE_ERRORS) or attempt >= self.retries:
+            raise error
+        self.logger.warning("Request to Prometheus failed, retrying: %s", error)
+        self.stats['retries'] += 1
+        return self.backoff_delay(attempt)
+
+    def check_status(self, url: str, status: int, reason: str):
+        """
+        Raises ServerError for 5xx responses and RequestException for the other error responses
+        """
+        if status > 299:
+            self.logger.error("Exception at get (%s), status code: %s, reason: %s", url, status, reason)
+            error = ServerError if status >= 500 else requests.RequestException
+            raise error(f"status code: {status}, reason: {reason}")
+
+    def call(self, func, *args, **kwargs):
+        """
+        Calls the function which sends a request with this session, retries it as given by retry_delay
+        and records its latency
+        """
+        attempt = 0
+        while True:
+            started = monotonic()
+            try:
+                result = func(*args, **kwargs)
+            except Exception as e:
+                sleep(self.retry_delay(started, attempt, e))
+                attempt += 1
+                continue
+            self.record(started, False)
+            return result
+
+    def get(self, url: str, params: dict = None, read=None, stream: bool = False):
+        """
+        Gets the url and returns the response read by the read function
+        """
+        def get():
+            result = self.session.get(url, params=params, stream=stream)
+            try:
+                self.check_status(url, result.status_code, result.reason)
+                return read(result)
+            finally:
+                if stream:
+                    result.close()
+
+        return self.call(get)
+
+    def get_json(self, url: str, params: dict = None) -> dict:
+        """
+        Gets the url and returns the decoded JSON body
+        """
+        return self.get(url, params, lambda result: result.json())
+
+    def stream_json(self, url: str, path: tuple, params: dict = None, keep=None) -> tuple:
+        """
+        Gets the url and parses the JSON body while it is downloaded, see JsonArrayStream
+        Returns the string values of the top level keys and the kept elements of the array at path
+        """
+        def read(result):
+            stream = JsonArrayStream(path, keep)
+            items = []
+            for chunk in result.iter_content(STREAM_CHUNK_SIZE):
+                items.extend(stream.feed(chunk))
+            items.extend(stream.close())
+            return stream.values, items
+
+        return self.get(url, params, read, stream=True)
+
+    async def get_async(self, url: str, params: dict = None, read=None):
+        """
+        Gets the url without blocking the event loop and returns the response read by the read coroutine
+        """
+        if self.async_session is None:
+            self.async_session = aiohttp.ClientSession(
+                headers=self.headers,
+                timeout=aiohttp.ClientTimeout(connect=self.connect_timeout, sock_read=self.read_timeout),
+                connector=aiohttp.TCPConnector(limit=self.pool_size),
+            )
+        attempt = 0
+        while True:
+            started = monotonic()
+            try:
+                async with self.async_session.get(url, params=params) as result:
+                    self.check_status(url, result.status, result.reason)
+                    read_result = await read(result)
+            except Exception as e:
+                await asyncio.sleep(self.retry_delay(started, attempt, e))
+                attempt += 1
+                continue
+            self.record(started, False)
+            return read_result
+
+    async def get_json_async(self, url: str, params: dict = None) -> dict:
+        """
+        Gets the url without blocking the event loop and returns the decoded JSON body
+        """
+        return await self.get_async(url, params, lambda result: result.json())
+
+    async def stream_json_async(self, url: str, path: tuple, params: dict = None, keep=None) -> tuple:
+        """
+        Gets the url without blocking the event loop and parses the JSON body while it is downloaded
+        Returns the string values of the top level keys and the kept elements of the array at path
+        """
+        async def read(result):
+            stream = JsonArrayStream(path, keep)
+            items = []
+            async for chunk in result.content.iter_chunked(STREAM_CHUNK_SIZE):
+                items.extend(stream.feed(chunk))
+            items.extend(stream.close())
+            return stream.values, items
+
+        return await self.get_async(url, params, read)
+
+    async def close_async(self):
+        if self.async_session is not None:
+            await self.async_session.close()
+            self.async_session = None
+
+    def close(self):
+        self.session.close()
@@ -0,0 +1,88 @@
+from k8s_workload_scaler.prometheus_session import PrometheusSession
+from math import ceil, floor
+from time import time
+
+import logging
+import threading
+
+import numpy as np
+
+__author__ = "Emin AKTAS <eminaktas34@gmail.com>"
+
+DEFAULT_STEP = 60
+DEFAULT_WINDOW = 3600
+
+
+class RangeQueryCache:
+    """
+    RangeQueryCache keeps the end of the last fetched range of every range query
+
+    The query times are aligned to the step, and every fetch only queries the steps after the last
+    fetched one, so the points fetched per tick depend on the interval of the tick and not on the window.
+    The samples are not kept, the readers (e.g. MetricForecaster) keep what they need from the new ones.
+    """
+
+    def __init__(
+            self,
+            url: str = None,
+            session: PrometheusSession = None,
+            step: float = DEFAULT_STEP,
+            window: float = DEFAULT_WINDOW,
+    ):
+        self.url = url
+        self.session = session
+        self.step = step
+        self.window = window
+        # {query: end of the last fetched range}
+        self.ends = {}
+        self.lock = threading.Lock()
+        self.stats = {
+            'queries': 0,
+            'points': 0,
+        }
+
+        # Logging
+        self.logger = logging.getLogger("RangeQueryCache")
+
+    def range_of(self, query: str, now: float) -> tuple:
+        """
+        Returns the (start, end) of the next range query on the step grid
+        """
+        end = floor(now / self.step) * self.step
+        start = ceil((now - self.window) / self.step) * self.step
+        with self.lock:
+            last_end = self.ends.get(query)
+        if last_end is not None:
+            start = max(start, last_end + self.step)
+        return start, end
+
+    def fetch(self, query: str, now: float = None) -> list:
+        """
+        Queries the steps after the last fetched one
+        Returns the new samples as a range query result [{'metric': labels, 'values': [[time, value]]}]
+        """
+        now = time() if now is None else now
+        start, end = self.range_of(query, now)
+        if start > end:
+            return []
+        result = query_range(self.session, self.url, query, start, end, self.step)
+        new_samples = [{'metric': item['metric'],
+                        'values': np.array(item['values'], dtype=np.float64).reshape(-1, 2)} for item in result]
+        points = sum(len(item['values']) for item in new_samples)
+        with self.lock:
+            self.ends[query] = end
+            self.stats['queries'] += 1
+            self.stats['points'] += points
+        self.logger.debug("Fetched %s points of %s from %s to %s", points, query, start, end)
+        return new_samples
+
+
+def query_range(session: PrometheusSession, url: str, query: str, start: float, end: float, step: float) -> list:
+    """
+    Queries the range vector of the query [{'metric': labels, 'values': [[time, value]]}]
+    """
+    j_result = session.get_json(f"{url}/api/v1/query_range",
+                                {'query': query, 'start': start, 'end': end, 'step': f"{int(step)}s"})
+    if j_result.get('status', None) != 'success':
+        raise Exception(f"Query {query} failed: {j_result.get('error', None)}")
+    return j_result.get('data', {}).get('result', None) or []
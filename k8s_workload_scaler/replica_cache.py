@@ -0,0 +1,148 @@
+from kubernetes import watch
+from kubernetes.client.rest import ApiException
+from time import sleep
+
+import logging
+import threading
+
+__author__ = "Emin AKTAS <eminaktas34@gmail.com>"
+
+# Client and list function of every workload
+LIST_FUNCTIONS = {
+    'Deployment': ('apps_v1', 'list_namespaced_deployment'),
+    'StatefulSet': ('apps_v1', 'list_namespaced_stateful_set'),
+    'ReplicaSet': ('apps_v1', 'list_namespaced_replica_set'),
+    'ReplicationController': ('core_v1', 'list_namespaced_replication_controller'),
+}
+WATCH_TIMEOUT = 300
+RETRY_DELAY = 5
+
+
+def replica_entry(item) -> dict:
+    return {
+        'replicas': item.status.replicas,
+        'spec_replicas': item.spec.replicas,
+    }
+
+
+class ReplicaInformer:
+    """
+    ReplicaInformer keeps the replica numbers of the workloads of one kind in one namespace of one cluster
+
+    It lists the workloads once and then follows the watch API from the listed resource version. On
+    any watch error the informer is marked as not synced, so readers fall back to a GET, and lists again.
+    """
+
+    def __init__(self, clients: dict, workload: str, namespace: str):
+        client_name, function_name = LIST_FUNCTIONS[workload]
+        self.list_function = getattr(clients[client_name], function_name)
+        self.workload = workload
+        self.namespace = namespace
+        # {name: {'replicas': status.replicas, 'spec_replicas': spec.replicas}}
+        self.items = {}
+        self.lock = threading.Lock()
+        self.synced = threading.Event()
+        self.stopped = threading.Event()
+        self.thread = None
+
+        # Logging
+        self.logger = logging.getLogger("ReplicaInformer")
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, daemon=True,
+                                       name=f"informer-{self.workload}-{self.namespace}")
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+
+    def get(self, name: str) -> dict:
+        """
+        Returns the replica numbers of the workload, None if the informer is not synced or
+        the workload is not found
+        """
+        if not self.synced.is_set():
+            return None
+        with self.lock:
+            return self.items.get(name)
+
+    def list(self) -> str:
+        """
+        Lists the workloads and returns the resource version to watch from
+        """
+        result = self.list_function(self.namespace)
+        with self.lock:
+            self.items = {item.metadata.name: replica_entry(item) for item in result.items}
+        self.synced.set()
+        self.logger.info("Listed %s %s in %s", len(result.items), self.workload, self.namespace)
+        return result.metadata.resource_version
+
+    def watch(self, resource_version: str):
+        """
+        Applies the watch events until the watch ends or fails
+        """
+        stream = watch.Watch().stream(self.list_function, self.namespace, resource_version=resource_version,
+                                      timeout_seconds=WATCH_TIMEOUT)
+        for event in stream:
+            if self.stopped.is_set():
+                return
+            if event['type'] == 'ERROR':
+                raise ApiException(reason=f"Watch error: {event['raw_object']}")
+            item = event['object']
+            with self.lock:
+                if event['type'] == 'DELETED':
+                    self.items.pop(item.metadata.name, None)
+                else:
+                    self.items[item.metadata.name] = replica_entry(item)
+
+    def run(self):
+        while not self.stopped.is_set():
+            try:
+                self.watch(self.list())
+            except Exception as e:
+                self.synced.clear()
+                self.logger.warning("Watch of %s in %s failed, listing again: %s", self.workload, self.namespace, e)
+                sleep(RETRY_DELAY)
+
+
+class ReplicaCache:
+    """
+    ReplicaCache keeps one ReplicaInformer per (kube-config, cluster context, workload, namespace)
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.informers = {}
+
+    def get(self, kube_config: str, context: str, clients: dict, workload: str, namespace: str,
+            name: str) -> dict:
+        """
+        Returns the cached replica numbers of the workload, the informer is started on the first call
+        """
+        if workload not in LIST_FUNCTIONS:
+            return None
+        key = (kube_config, context, workload, namespace)
+        with self.lock:
+            informer = self.informers.get(key)
+            if informer is None:
+                informer = self.informers[key] = ReplicaInformer(clients, workload, namespace)
+                informer.start()
+        return informer.get(name)
+
+    def drop(self, kube_config: str):
+        """
+        Stops the informers of the kube-config, called when its clients are replaced
+        The informers are started again with the new clients on the next call
+        """
+        with self.lock:
+            for key in [key for key in self.informers if key[0] == kube_config]:
+                self.informers.pop(key).stop()
+
+    def clear(self):
+        with self.lock:
+            for informer in self.informers.values():
+                informer.stop()
+            self.informers.clear()
+
+
+replica_cache = ReplicaCache()
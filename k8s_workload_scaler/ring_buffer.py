@@ -0,0 +1,87 @@
+import numpy as np
+
+__author__ = "Emin AKTAS <eminaktas34@gmail.com>"
+
+RING_BUFFER_CAPACITY = 16
+
+
+class RingBuffer:
+    """
+    RingBuffer keeps (time, value) entries in fixed NumPy arrays
+
+    Entries older than the horizon of append are dropped from the head, the arrays are only
+    doubled when the buffer is full of entries which are still in the horizon.
+    """
+
+    def __init__(self, capacity: int = RING_BUFFER_CAPACITY):
+        self.times = np.zeros(capacity, dtype=np.float64)
+        self.values = np.zeros(capacity, dtype=np.float64)
+        self.start = 0
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def indices(self) -> np.ndarray:
+        return (self.start + np.arange(self.size)) % len(self.times)
+
+    def expire(self, time: float):
+        """
+        Drops the entries which are older than time
+        """
+        expired = int(np.count_nonzero(self.times[self.indices()] < time))
+        self.start = (self.start + expired) % len(self.times)
+        self.size -= expired
+
+    def reserve(self, size: int):
+        """
+        Grows the arrays to hold size more entries
+        """
+        capacity = len(self.times)
+        if self.size + size <= capacity:
+            return
+        while capacity < self.size + size:
+            capacity *= 2
+        indices = self.indices()
+        self.times = np.concatenate([self.times[indices], np.zeros(capacity - self.size)])
+        self.values = np.concatenate([self.values[indices], np.zeros(capacity - self.size)])
+        self.start = 0
+
+    def append(self, time: float, value: float, horizon: float):
+        self.extend(np.array([time], dtype=np.float64), np.array([value], dtype=np.float64), horizon)
+
+    def extend(self, times: np.ndarray, values: np.ndarray, horizon: float):
+        """
+        Appends the entries in time order and drops the ones older than horizon before the last one
+        """
+        if not len(times):
+            return
+        self.expire(times[-1] - horizon)
+        # Entries of the batch which are already out of the horizon are not kept
+        keep = times >= times[-1] - horizon
+        times, values = times[keep], values[keep]
+        self.reserve(len(times))
+        indices = (self.start + self.size + np.arange(len(times))) % len(self.times)
+        self.times[indices] = times
+        self.values[indices] = values
+        self.size += len(times)
+
+    def last_time(self) -> float:
+        return float(self.times[(self.start + self.size - 1) % len(self.times)]) if self.size else None
+
+    def entries(self, time: float = None) -> tuple:
+        """
+        Returns the (times, values) arrays of the entries which are not older than time
+        """
+        indices = self.indices()
+        times, values = self.times[indices], self.values[indices]
+        if time is None:
+            return times, values
+        recent = times >= time
+        return times[recent], values[recent]
+
+    def since(self, time: float) -> np.ndarray:
+        """
+        Returns the values of the entries which are not older than time
+        """
+        return self.entries(time)[1]
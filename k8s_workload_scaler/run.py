@@ -1,8 +1,8 @@
 import logging
 import argparse
-from time import sleep
-from k8s_workload_scaler.prometheus_alert_api import PrometheusAlertAPI
-from k8s_workload_scaler.prometheus_metric_api import PrometheusMetricAPI
+from k8s_workload_scaler.alertmanager_webhook import DEFAULT_WEBHOOK_PORT
+from k8s_workload_scaler.controller import Controller, DEFAULT_CONCURRENCY, load_targets
+from k8s_workload_scaler.logging_config import DEFAULT_LOG_LEVEL, LOG_LEVELS, configure_logging
 
 __author__ = "Emin AKTAS <eminaktas34@gmail.com>"
 
@@ -16,6 +16,33 @@ MIN_NUMBER = 'min_number'
 TIME_INTERVAL = 'delay'
 MANAGEMENT_TYPE = 'management_type'
 KUBE_CONFIG = 'kube_config'
+TARGETS_FILE = 'targets_file'
+CONCURRENCY = 'concurrency'
+METRICS_PORT = 'metrics_port'
+WEBHOOK_PORT = 'webhook_port'
+LOG_LEVEL = 'log_level'
+LOG_JSON = 'log_json'
+WATCH_REPLICAS = 'watch_replicas'
+TARGET_VALUE = 'target_value'
+TOLERANCE = 'tolerance'
+
+# SCALING BEHAVIOR INFORMATION
+SCALE_UP_STABILIZATION = 'scale_up_stabilization'
+SCALE_DOWN_STABILIZATION = 'scale_down_stabilization'
+MAX_SCALE_UP_PODS = 'max_scale_up_pods'
+MAX_SCALE_UP_PERCENT = 'max_scale_up_percent'
+MAX_SCALE_DOWN_PODS = 'max_scale_down_pods'
+MAX_SCALE_DOWN_PERCENT = 'max_scale_down_percent'
+POLICY_PERIOD = 'period'
+BEHAVIOR_PARAMETERS = [
+    SCALE_UP_STABILIZATION,
+    SCALE_DOWN_STABILIZATION,
+    MAX_SCALE_UP_PODS,
+    MAX_SCALE_UP_PERCENT,
+    MAX_SCALE_DOWN_PODS,
+    MAX_SCALE_DOWN_PERCENT,
+    POLICY_PERIOD,
+]
 
 # PROMETHEUS HOST INFORMATION
 HOST = 'host'
@@ -31,6 +58,23 @@ LABEL_LIST = 'label_list'
 SCALING_OUT_THRESHOLD_VALUE = 'scaling_out_threshold_value'
 SCALING_IN_THRESHOLD_VALUE = 'scaling_in_threshold_value'
 RATE_VALUE = 'rate_value'
+SCALING_WORKERS = 'scaling_workers'
+SCALING_TIMEOUT = 'scaling_timeout'
+FORECAST_HORIZON = 'horizon'
+FORECAST_STEP = 'step'
+FORECAST_HISTORY = 'history'
+FORECAST_SEASON = 'season'
+FORECAST_PARAMETERS = [
+    FORECAST_HORIZON,
+    FORECAST_STEP,
+    FORECAST_HISTORY,
+    FORECAST_SEASON,
+]
+
+# PROMETHEUS SESSION INFORMATION
+PROMETHEUS_CONNECT_TIMEOUT = 'prometheus_connect_timeout'
+PROMETHEUS_READ_TIMEOUT = 'prometheus_read_timeout'
+PROMETHEUS_RETRIES = 'prometheus_retries'
 
 SUPPORTED_WORKLOAD = [
     'Deployment',
@@ -41,23 +85,27 @@ SUPPORTED_WORKLOAD = [
 SUPPORTED_MANAGEMENT_TYPE = [
     'prometheus_alert_api',
     'prometheus_metric_api',
+    'alertmanager_webhook',
 ]
 
 
 def parse_args():
     # BASE PARSER
     argument_parser = argparse.ArgumentParser(description="This program is a controller for scaling the K8s workloads")
-    argument_parser.add_argument('-w', '--workload', dest=WORKLOAD, required=True, type=str,
+    argument_parser.add_argument('-tf', '--targets-file', dest=TARGETS_FILE, required=False, type=str,
+                                 help="Enter a file of scaling targets to scale many workloads from one process. "
+                                      "Workload, name, namespace, max and min numbers are read from the file")
+    argument_parser.add_argument('-w', '--workload', dest=WORKLOAD, required=False, type=str,
                                  help=f"Enter workload name. Supported workloads: {SUPPORTED_WORKLOAD}")
-    argument_parser.add_argument('-n', '--name', dest=NAME, required=True, type=str,
+    argument_parser.add_argument('-n', '--name', dest=NAME, required=False, type=str,
                                  help="Enter name of the workload")
-    argument_parser.add_argument('-ns', '--namespace', dest=NAMESCAPE, required=True, type=str,
+    argument_parser.add_argument('-ns', '--namespace', dest=NAMESCAPE, required=False, type=str,
                                  help="Enter namespace of the workload")
     argument_parser.add_argument('-s', '--scaling-range', dest=SCALING_RANGE, required=False, type=int,
                                  default=1, help="Enter scaling range. Adds or removes an amount of Pods")
-    argument_parser.add_argument('-max', '--max-number', dest=MAX_NUMBER, required=True, type=int,
+    argument_parser.add_argument('-max', '--max-number', dest=MAX_NUMBER, required=False, type=int,
                                  help="Enter maximum number of Pods")
-    argument_parser.add_argument('-min', '--min-number', dest=MIN_NUMBER, required=True, type=int,
+    argument_parser.add_argument('-min', '--min-number', dest=MIN_NUMBER, required=False, type=int,
                                  help="Enter minimum number of Pods")
     argument_parser.add_argument('-kc', '--kube-config', dest=KUBE_CONFIG, required=True,
                                  default='/etc/kube/config', type=str,
@@ -65,6 +113,49 @@ def parse_args():
     argument_parser.add_argument('-ti', '--time-interval', dest=TIME_INTERVAL, required=False, default=60,
                                  type=float, help="Enter a time for alert control interval. "
                                                   "Default value is 60 seconds")
+    argument_parser.add_argument('-c', '--concurrency', dest=CONCURRENCY, required=False,
+                                 default=DEFAULT_CONCURRENCY, type=int,
+                                 help="Enter the number of blocking calls (metric queries, Kubernetes API calls) "
+                                      f"run concurrently. Default value is {DEFAULT_CONCURRENCY}")
+
+    argument_parser.add_argument('-mp', '--metrics-port', dest=METRICS_PORT, required=False, type=int,
+                                 help="Enter a port to serve the metrics of the scaler at /metrics. "
+                                      "Metrics are not served by default")
+    argument_parser.add_argument('-whp', '--webhook-port', dest=WEBHOOK_PORT, required=False,
+                                 default=DEFAULT_WEBHOOK_PORT, type=int,
+                                 help="Enter the port of the Alertmanager webhook of the alertmanager_webhook targets. "
+                                      f"Default value is {DEFAULT_WEBHOOK_PORT}")
+
+    argument_parser.add_argument('--log-level', dest=LOG_LEVEL, required=False, default=DEFAULT_LOG_LEVEL,
+                                 type=str.upper, choices=LOG_LEVELS,
+                                 help=f"Enter the log level. Default value is {DEFAULT_LOG_LEVEL}")
+    argument_parser.add_argument('--log-json', dest=LOG_JSON, required=False, action='store_true',
+                                 help="Write the logs as one JSON object per line")
+
+    argument_parser.add_argument('-wr', '--watch-replicas', dest=WATCH_REPLICAS, required=False,
+                                 action='store_true',
+                                 help="Keep the replica numbers of the workloads in a cache fed by the Kubernetes "
+                                      "watch API instead of reading the workload before every scaling decision")
+
+    # SCALING BEHAVIOR ARGUMENTS
+    argument_parser.add_argument('-sus', '--scale-up-stabilization', dest=SCALE_UP_STABILIZATION, required=False,
+                                 type=float, help="Enter the window in seconds whose lowest recommendation is used "
+                                                  "for scaling up")
+    argument_parser.add_argument('-sds', '--scale-down-stabilization', dest=SCALE_DOWN_STABILIZATION,
+                                 required=False, type=float,
+                                 help="Enter the window in seconds whose highest recommendation is used for "
+                                      "scaling down")
+    argument_parser.add_argument('-mup', '--max-scale-up-pods', dest=MAX_SCALE_UP_PODS, required=False, type=int,
+                                 help="Enter the maximum number of Pods added in a policy period")
+    argument_parser.add_argument('-mupc', '--max-scale-up-percent', dest=MAX_SCALE_UP_PERCENT, required=False,
+                                 type=float, help="Enter the maximum percent of Pods added in a policy period")
+    argument_parser.add_argument('-mdp', '--max-scale-down-pods', dest=MAX_SCALE_DOWN_PODS, required=False,
+                                 type=int, help="Enter the maximum number of Pods removed in a policy period")
+    argument_parser.add_argument('-mdpc', '--max-scale-down-percent', dest=MAX_SCALE_DOWN_PERCENT, required=False,
+                                 type=float, help="Enter the maximum percent of Pods removed in a policy period")
+    argument_parser.add_argument('-pperiod', '--policy-period', dest=POLICY_PERIOD, required=False, type=float,
+                                 help="Enter the period in seconds of the scaling policies. Default value is 60 "
+                                      "seconds")
 
     # SUB PARSER
     sub_argument_parsers = argument_parser.add_subparsers(
@@ -96,16 +187,74 @@ def parse_args():
                                                    "as label and value by repeating the label value"
                                                     "Example: label_name=label_value")
     prometheus_metric_api_parser.add_argument('-sotv', '--scaling-out-threshold-value',
-                                              dest=SCALING_OUT_THRESHOLD_VALUE, required=True, type=float,
-                                              help="Enter scaling out threshold value for scaling decision")
+                                              dest=SCALING_OUT_THRESHOLD_VALUE, required=False, type=float,
+                                              help="Enter scaling out threshold value for scaling decision. "
+                                                   "Not needed with --target-value")
     prometheus_metric_api_parser.add_argument('-sitv', '--scaling-in-threshold-value', dest=SCALING_IN_THRESHOLD_VALUE,
-                                              required=True, type=float,
-                                              help="Enter scaling in threshold value for scaling decision")
+                                              required=False, type=float,
+                                              help="Enter scaling in threshold value for scaling decision. "
+                                                   "Not needed with --target-value")
     prometheus_metric_api_parser.add_argument('-r', '--rate-value', dest=RATE_VALUE, required=True, type=int,
                                               help="Enter rate value to calculate the ratio of the metric"
                                                    " for scaling decision")
+    prometheus_metric_api_parser.add_argument('-sw', '--scaling-workers', dest=SCALING_WORKERS, required=False,
+                                              default=None, type=int,
+                                              help="Enter the number of clusters scaled in parallel when metrics "
+                                                   "have cluster_name label. The scalings of all targets share "
+                                                   "a pool of --concurrency threads")
+    prometheus_metric_api_parser.add_argument('-st', '--scaling-timeout', dest=SCALING_TIMEOUT, required=False,
+                                              default=None, type=float,
+                                              help="Enter the timeout in seconds of scaling in one cluster")
+    prometheus_metric_api_parser.add_argument('-fh', '--forecast-horizon', dest=FORECAST_HORIZON, required=False,
+                                              type=float,
+                                              help="Enter the time in seconds to forecast the rate ahead. Enables "
+                                                   "predictive scaling from the rate history")
+    prometheus_metric_api_parser.add_argument('-fs', '--forecast-step', dest=FORECAST_STEP, required=False,
+                                              type=float,
+                                              help="Enter the step in seconds of the rate history. "
+                                                   "Default value is 60 seconds")
+    prometheus_metric_api_parser.add_argument('-fhi', '--forecast-history', dest=FORECAST_HISTORY, required=False,
+                                              type=float,
+                                              help="Enter the time in seconds of the rate history fetched at start")
+    prometheus_metric_api_parser.add_argument('-fse', '--forecast-season', dest=FORECAST_SEASON, required=False,
+                                              type=float,
+                                              help="Enter the season length in seconds of the rate, e.g. 86400 "
+                                                   "for daily traffic")
+
+    # ALERTMANAGER WEBHOOK PARSER
+    alertmanager_webhook_parser = sub_argument_parsers.add_parser('alertmanager_webhook')
+    alertmanager_webhook_parser.add_argument('-son', '--scaling-out-alert-name', dest=SCALING_OUT_NAME, required=True,
+                                             type=str, help="Enter alert name for scaling out")
+    alertmanager_webhook_parser.add_argument('-sin', '--scaling-in-alert-name', dest=SCALING_IN_NAME, required=True,
+                                             type=str, help="Enter alert name for scaling in")
+
+    # TARGET TRACKING ARGUMENTS
+    for parser in [prometheus_alert_api_parser, prometheus_metric_api_parser, alertmanager_webhook_parser]:
+        parser.add_argument('-tv', '--target-value', dest=TARGET_VALUE, required=False, type=float,
+                            help="Enter the target value of the metric. The replicas are set to "
+                                 "ceil(replicas * metric value / target value) instead of adding or removing "
+                                 "the scaling range")
+        parser.add_argument('-tol', '--tolerance', dest=TOLERANCE, required=False, type=float,
+                            help="Enter the tolerance of the metric value / target value ratio around 1 which "
+                                 "does not change the replicas. Default value is 0.1")
+
+    # PROMETHEUS SESSION ARGUMENTS
+    for parser in [prometheus_alert_api_parser, prometheus_metric_api_parser]:
+        parser.add_argument('-pct', '--prometheus-connect-timeout', dest=PROMETHEUS_CONNECT_TIMEOUT, required=False,
+                            type=float, help="Enter connect timeout in seconds of Prometheus requests")
+        parser.add_argument('-prt', '--prometheus-read-timeout', dest=PROMETHEUS_READ_TIMEOUT, required=False,
+                            type=float, help="Enter read timeout in seconds of Prometheus requests")
+        parser.add_argument('-pr', '--prometheus-retries', dest=PROMETHEUS_RETRIES, required=False, type=int,
+                            help="Enter the number of retries of failed Prometheus requests")
 
     args = vars(argument_parser.parse_args())
+    if args[TARGETS_FILE] is None:
+        # Single target mode
+        missing = [key for key in [WORKLOAD, NAME, NAMESCAPE, MAX_NUMBER, MIN_NUMBER] if args[key] is None]
+        if args[MANAGEMENT_TYPE] == 'prometheus_metric_api' and args[TARGET_VALUE] is None:
+            missing += [key for key in [SCALING_OUT_THRESHOLD_VALUE, SCALING_IN_THRESHOLD_VALUE] if args[key] is None]
+        if missing:
+            argument_parser.error(f"the following arguments are required without --targets-file: {missing}")
     return args
 
 
@@ -114,6 +263,7 @@ class Run:
             self,
             parameters
     ):
+        self.targets_file = parameters.get(TARGETS_FILE)
         self.management_type = parameters[MANAGEMENT_TYPE]
         self.workload = parameters[WORKLOAD]
         self.name = parameters[NAME]
@@ -123,11 +273,25 @@ class Run:
         self.min_number = parameters[MIN_NUMBER]
         self.time_interval = parameters[TIME_INTERVAL]
         self.kube_config = parameters[KUBE_CONFIG]
+        self.concurrency = parameters.get(CONCURRENCY) or DEFAULT_CONCURRENCY
+        self.metrics_port = parameters.get(METRICS_PORT)
+        self.webhook_port = parameters.get(WEBHOOK_PORT) or DEFAULT_WEBHOOK_PORT
+        self.watch_replicas = parameters.get(WATCH_REPLICAS, False)
+        self.prometheus_connect_timeout = parameters.get(PROMETHEUS_CONNECT_TIMEOUT)
+        self.prometheus_read_timeout = parameters.get(PROMETHEUS_READ_TIMEOUT)
+        self.prometheus_retries = parameters.get(PROMETHEUS_RETRIES)
+        self.target_value = parameters.get(TARGET_VALUE)
+        self.tolerance = parameters.get(TOLERANCE)
+        behavior = {key: parameters[key] for key in BEHAVIOR_PARAMETERS if parameters.get(key) is not None}
+        self.behavior = behavior or None
         if self.management_type == 'prometheus_alert_api':
             self.host = parameters[HOST]
             self.port = parameters[PORT]
             self.scaling_out_name = parameters[SCALING_OUT_NAME]
             self.scaling_in_name = parameters[SCALING_IN_NAME]
+        elif self.management_type == 'alertmanager_webhook':
+            self.scaling_out_name = parameters[SCALING_OUT_NAME]
+            self.scaling_in_name = parameters[SCALING_IN_NAME]
         elif self.management_type == 'prometheus_metric_api':
             self.host = parameters[HOST]
             self.port = parameters[PORT]
@@ -136,6 +300,10 @@ class Run:
             self.scaling_out_threshold_value = parameters[SCALING_OUT_THRESHOLD_VALUE]
             self.scaling_in_threshold_value = parameters[SCALING_IN_THRESHOLD_VALUE]
             self.rate_value = parameters[RATE_VALUE]
+            self.scaling_workers = parameters.get(SCALING_WORKERS)
+            self.scaling_timeout = parameters.get(SCALING_TIMEOUT)
+            forecaster = {key: parameters[key] for key in FORECAST_PARAMETERS if parameters.get(key) is not None}
+            self.forecaster = forecaster if FORECAST_HORIZON in forecaster else None
 
         self.common_log = f"Scaling workload for {self.name} (namespace: {self.namespace}, " \
                           f"workload: {self.workload}) is started. Management type is "\
@@ -146,11 +314,6 @@ class Run:
 
         # Logging
         self.logger = logging.getLogger('Run')
-        logging.basicConfig(
-            level=logging.NOTSET,
-            format='%(asctime)s.%(msecs)03d %(levelname)s %(module)s - %(funcName)s: %(message)s',
-            datefmt='%Y-%m-%d %H:%M:%S'
-        )
 
     def run(self):
         """
@@ -159,7 +322,22 @@ class Run:
 
         self.logger.info("Workload Scaler is running")
 
-        if self.management_type == 'prometheus_alert_api':
+        if self.targets_file:
+
+            """
+            python3 run.py -kc /etc/kube/config -ti 60 -tf targets.yaml
+            """
+
+            self.logger.info("Scaling targets in %s. kube-config file location: %s",
+                             self.targets_file, self.kube_config)
+            targets = load_targets(self.targets_file, {
+                'kube_config': self.kube_config,
+                'time_interval': self.time_interval,
+                'watch_replicas': self.watch_replicas,
+                'behavior': self.behavior,
+            })
+            Controller(targets, self.concurrency, metrics_port=self.metrics_port, webhook_port=self.webhook_port).run()
+        elif self.management_type == 'prometheus_alert_api':
 
             """
             python3 run.py
@@ -168,28 +346,31 @@ class Run:
             -son php-apache-scaling-out -sin php-apache-scaling-in
             """
 
-            self.logger.info(self.common_log + f"(host: {self.host}, port: {self.port}, "
-                                               f"scaling_out_name: {self.scaling_out_name}, "
-                                               f"scaling_in_name: {self.scaling_in_name})")
-
-            manager = PrometheusAlertAPI(
-                self.workload,
-                self.name,
-                self.namespace,
-                self.scaling_range,
-                self.max_number,
-                self.min_number,
-                self.kube_config,
-                self.host,
-                self.port,
-                self.scaling_out_name,
-                self.scaling_in_name,
-            )
-
-            while True:
-                manager.control_alert_and_trigger_scaling()
-                self.logger.info(f"Waiting {self.time_interval} seconds for the next query if alarm is firing")
-                sleep(self.time_interval)
+            self.logger.info("%s(host: %s, port: %s, scaling_out_name: %s, scaling_in_name: %s)",
+                             self.common_log, self.host, self.port, self.scaling_out_name, self.scaling_in_name)
+
+            Controller([{
+                'management_type': self.management_type,
+                'workload': self.workload,
+                'name': self.name,
+                'namespace': self.namespace,
+                'scaling_range': self.scaling_range,
+                'max_number': self.max_number,
+                'min_number': self.min_number,
+                'kube_config': self.kube_config,
+                'time_interval': self.time_interval,
+                'watch_replicas': self.watch_replicas,
+                'host': self.host,
+                'port': self.port,
+                'scaling_out_name': self.scaling_out_name,
+                'scaling_in_name': self.scaling_in_name,
+                'prometheus_connect_timeout': self.prometheus_connect_timeout,
+                'prometheus_read_timeout': self.prometheus_read_timeout,
+                'prometheus_retries': self.prometheus_retries,
+                'target_value': self.target_value,
+                'tolerance': self.tolerance,
+                'behavior': self.behavior,
+            }], self.concurrency, metrics_port=self.metrics_port, webhook_port=self.webhook_port).run()
         elif self.management_type == 'prometheus_metric_api':
 
             """
@@ -200,38 +381,73 @@ class Run:
             -sotv 0.8 -sitv 0.2 -r 300
             """
 
-            self.logger.info(self.common_log + f"(host: {self.host}, port: {self.port}, "
-                                               f"metric_name: {self.metric_name}, labels: {self.label_list}, "
-                                               f"scaling_out_threshold_value: {self.scaling_out_threshold_value}, "
-                                               f"scaling_in_threshold_value: {self.scaling_in_threshold_value}, "
-                                               f"range_value:{self.rate_value})")
-            manager = PrometheusMetricAPI(
-                self.workload,
-                self.name,
-                self.namespace,
-                self.scaling_range,
-                self.max_number,
-                self.min_number,
-                self.kube_config,
-                self.host,
-                self.port,
-                self.metric_name,
-                self.label_list,
-                self.scaling_out_threshold_value,
-                self.scaling_in_threshold_value,
-                self.rate_value
-            )
-            while True:
-                manager.control_and_trigger_scaling()
-                self.logger.info(f"Waiting {self.time_interval} seconds for the next query if there is any"
-                                 f" violation")
-                sleep(self.time_interval)
+            self.logger.info("%s(host: %s, port: %s, metric_name: %s, labels: %s, scaling_out_threshold_value: %s, "
+                             "scaling_in_threshold_value: %s, range_value:%s)",
+                             self.common_log, self.host, self.port, self.metric_name, self.label_list,
+                             self.scaling_out_threshold_value, self.scaling_in_threshold_value, self.rate_value)
+            Controller([{
+                'management_type': self.management_type,
+                'workload': self.workload,
+                'name': self.name,
+                'namespace': self.namespace,
+                'scaling_range': self.scaling_range,
+                'max_number': self.max_number,
+                'min_number': self.min_number,
+                'kube_config': self.kube_config,
+                'time_interval': self.time_interval,
+                'watch_replicas': self.watch_replicas,
+                'host': self.host,
+                'port': self.port,
+                'metric_name': self.metric_name,
+                'label_list': self.label_list,
+                'scaling_out_threshold_value': self.scaling_out_threshold_value,
+                'scaling_in_threshold_value': self.scaling_in_threshold_value,
+                'rate_time': self.rate_value,
+                'scaling_workers': self.scaling_workers,
+                'scaling_timeout': self.scaling_timeout,
+                'forecaster': self.forecaster,
+                'prometheus_connect_timeout': self.prometheus_connect_timeout,
+                'prometheus_read_timeout': self.prometheus_read_timeout,
+                'prometheus_retries': self.prometheus_retries,
+                'target_value': self.target_value,
+                'tolerance': self.tolerance,
+                'behavior': self.behavior,
+            }], self.concurrency, metrics_port=self.metrics_port, webhook_port=self.webhook_port).run()
+        elif self.management_type == 'alertmanager_webhook':
+
+            """
+            python3 run.py
+            -w Deployment -n php-apache -ns default -s 1 -max 10 -min 2 -whp 9095
+            -mt alertmanager_webhook -son php-apache-scaling-out -sin php-apache-scaling-in
+            """
+
+            self.logger.info("%s(webhook_port: %s, scaling_out_name: %s, scaling_in_name: %s)",
+                             self.common_log, self.webhook_port, self.scaling_out_name, self.scaling_in_name)
+
+            Controller([{
+                'management_type': self.management_type,
+                'workload': self.workload,
+                'name': self.name,
+                'namespace': self.namespace,
+                'scaling_range': self.scaling_range,
+                'max_number': self.max_number,
+                'min_number': self.min_number,
+                'kube_config': self.kube_config,
+                'time_interval': self.time_interval,
+                'watch_replicas': self.watch_replicas,
+                'scaling_out_name': self.scaling_out_name,
+                'scaling_in_name': self.scaling_in_name,
+                'target_value': self.target_value,
+                'tolerance': self.tolerance,
+                'behavior': self.behavior,
+            }], self.concurrency, metrics_port=self.metrics_port, webhook_port=self.webhook_port).run()
         else:
-            self.logger.error(f"Not valid management_type: {self.management_type}")
+            self.logger.error("Not valid management_type: %s", self.management_type)
             raise Exception("Not valid management_type")
 
 
 if __name__ == '__main__':
     parameter = parse_args()
+    configure_logging(parameter[LOG_LEVEL], parameter[LOG_JSON])
     run = Run(parameter)
     run.run()
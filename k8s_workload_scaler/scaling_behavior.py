@@ -0,0 +1,121 @@
+from k8s_workload_scaler.ring_buffer import RingBuffer
+from math import ceil, floor
+from time import monotonic
+
+import logging
+import threading
+
+import numpy as np
+
+__author__ = "Emin AKTAS <eminaktas34@gmail.com>"
+
+DEFAULT_POLICY_PERIOD = 60
+
+
+class ScalingBehavior:
+    """
+    ScalingBehavior stabilizes the replica recommendations and limits the scaling rate, like the
+    behavior field of a HorizontalPodAutoscaler
+
+    Every recommendation is kept in a ring buffer per cluster. The replicas are scaled down to the
+    highest recommendation of the last scale_down_stabilization seconds and scaled up to the lowest
+    recommendation of the last scale_up_stabilization seconds, so a single noisy violation does not
+    flap the workload. Scaling up is limited to max_scale_up_pods or max_scale_up_percent of the
+    replicas per period, scaling down to max_scale_down_pods or max_scale_down_percent; when both
+    limits of a direction are given the one which allows the bigger change is used.
+    """
+
+    def __init__(
+            self,
+            scale_up_stabilization: float = 0,
+            scale_down_stabilization: float = 0,
+            max_scale_up_pods: int = None,
+            max_scale_up_percent: float = None,
+            max_scale_down_pods: int = None,
+            max_scale_down_percent: float = None,
+            period: float = DEFAULT_POLICY_PERIOD,
+    ):
+        self.scale_up_stabilization = scale_up_stabilization or 0
+        self.scale_down_stabilization = scale_down_stabilization or 0
+        self.max_scale_up_pods = max_scale_up_pods
+        self.max_scale_up_percent = max_scale_up_percent
+        self.max_scale_down_pods = max_scale_down_pods
+        self.max_scale_down_percent = max_scale_down_percent
+        self.period = period or DEFAULT_POLICY_PERIOD
+        # {cluster name: RingBuffer of recommendations}
+        self.recommendations = {}
+        # {cluster name: RingBuffer of replica changes}
+        self.scale_events = {}
+        self.lock = threading.Lock()
+
+        # Logging
+        self.logger = logging.getLogger("ScalingBehavior")
+
+    def stabilize(self, cluster_name: str, replicas: int, recommendation: int, now: float = None) -> int:
+        """
+        Retains the recommendation and returns the stabilized replica number
+        """
+        now = monotonic() if now is None else now
+        horizon = max(self.scale_up_stabilization, self.scale_down_stabilization)
+        with self.lock:
+            history = self.recommendations.setdefault(cluster_name, RingBuffer())
+            history.append(now, recommendation, horizon)
+            up_recommendation = int(history.since(now - self.scale_up_stabilization).min())
+            down_recommendation = int(history.since(now - self.scale_down_stabilization).max())
+        desired = replicas
+        if desired < up_recommendation:
+            desired = up_recommendation
+        if desired > down_recommendation:
+            desired = down_recommendation
+        if desired != recommendation:
+            self.logger.info("Recommendation %s is stabilized to %s (cluster: %s)",
+                             recommendation, desired, cluster_name or 'In cluster config')
+        return desired
+
+    def limit(self, cluster_name: str, replicas: int, desired: int, now: float = None) -> int:
+        """
+        Limits the change of the replicas by the scaling policies of the period
+        """
+        now = monotonic() if now is None else now
+        with self.lock:
+            events = self.scale_events.get(cluster_name)
+            changes = events.since(now - self.period) if events is not None else np.zeros(0)
+        if desired > replicas:
+            # Replicas at the start of the period, before its scale ups
+            base = replicas - int(changes[changes > 0].sum())
+            limits = []
+            if self.max_scale_up_pods is not None:
+                limits.append(base + self.max_scale_up_pods)
+            if self.max_scale_up_percent is not None:
+                limits.append(ceil(base * (1 + self.max_scale_up_percent / 100)))
+            if limits and desired > max(limits):
+                self.logger.info("Scaling up to %s is limited to %s in %ss", desired, max(limits), self.period)
+                desired = max(max(limits), replicas)
+        elif desired < replicas:
+            # Replicas at the start of the period, before its scale downs
+            base = replicas - int(changes[changes < 0].sum())
+            limits = []
+            if self.max_scale_down_pods is not None:
+                limits.append(base - self.max_scale_down_pods)
+            if self.max_scale_down_percent is not None:
+                limits.append(floor(base * (1 - self.max_scale_down_percent / 100)))
+            if limits and desired < min(limits):
+                self.logger.info("Scaling down to %s is limited to %s in %ss", desired, min(limits), self.period)
+                desired = min(min(limits), replicas)
+        return desired
+
+    def apply(self, cluster_name: str, replicas: int, recommendation: int, now: float = None) -> int:
+        """
+        Returns the replica number to scale to for the recommendation
+        """
+        now = monotonic() if now is None else now
+        return self.limit(cluster_name, replicas, self.stabilize(cluster_name, replicas, recommendation, now), now)
+
+    def record(self, cluster_name: str, old_replicas: int, new_replicas: int, now: float = None):
+        """
+        Records a scaling for the rate limits
+        """
+        now = monotonic() if now is None else now
+        with self.lock:
+            events = self.scale_events.setdefault(cluster_name, RingBuffer())
+            events.append(now, new_replicas - old_replicas, self.period)
@@ -0,0 +1,49 @@
+from time import monotonic
+
+__author__ = "Emin AKTAS <eminaktas34@gmail.com>"
+
+
+class TickScheduler:
+    """
+    TickScheduler gives fixed tick deadlines on the monotonic clock
+
+    The deadlines are start + phase + n * interval, so the period does not drift with the time spent
+    in a tick. When a tick ran longer than the interval, the missed deadlines are coalesced into one
+    tick which starts at once, the others are skipped. The lag between a deadline and the time the
+    tick really started is kept in stats.
+    """
+
+    def __init__(self, interval: float, phase: float = 0.0, start: float = None):
+        self.interval = interval
+        self.start = (monotonic() if start is None else start) + phase
+        self.tick = 0
+        self.stats = {
+            'ticks': 0,
+            'skipped_ticks': 0,
+            'last_lag_seconds': 0.0,
+            'max_lag_seconds': 0.0,
+        }
+
+    def deadline(self) -> float:
+        return self.start + self.tick * self.interval
+
+    def next_deadline(self, now: float) -> float:
+        """
+        Returns the deadline of the next tick, only the latest of the missed deadlines is kept
+        """
+        if self.interval > 0 and now > self.deadline() + self.interval:
+            missed = int((now - self.deadline()) // self.interval)
+            self.tick += missed
+            self.stats['skipped_ticks'] += missed
+        return self.deadline()
+
+    def started(self, now: float):
+        """
+        Records the start of the current tick and moves to the next one
+        """
+        lag = max(now - self.deadline(), 0.0)
+        self.stats['ticks'] += 1
+        self.stats['last_lag_seconds'] = lag
+        self.stats['max_lag_seconds'] = max(self.stats['max_lag_seconds'], lag)
+        self.tick += 1
+        return lag
@@ -1,12 +1,23 @@
+from k8s_workload_scaler.exporter import CURRENT_REPLICAS, DESIRED_REPLICAS, SCALE_ACTIONS_TOTAL
 from k8s_workload_scaler.kubectl import Kubectl
+from k8s_workload_scaler.scaling_behavior import ScalingBehavior
+from math import ceil
 import logging
 
 __author__ = "Emin AKTAS <eminaktas34@gmail.com>"
 
+# Metric/target ratios within 1 +- tolerance do not change the replicas
+DEFAULT_TOLERANCE = 0.1
+
 
 class WorkloadScaler(Kubectl):
     """
     WorkloadScaler class
+
+    By default a scaling adds or removes scaling_range replicas. When target_value is set and the
+    scaling has a metric value, the replicas track the target instead:
+    desired replicas = ceil(current replicas * metric value / target_value), clamped to min/max
+    A ScalingBehavior can stabilize the recommendations and limit the scaling rate
     """
 
     def __init__(
@@ -18,6 +29,10 @@ class WorkloadScaler(Kubectl):
             max_number: int = None,
             min_number: int = None,
             kube_config: str = None,
+            watch_replicas: bool = False,
+            target_value: float = None,
+            tolerance: float = DEFAULT_TOLERANCE,
+            behavior: ScalingBehavior = None,
     ):
         self.workload = workload
         self.name = name
@@ -25,86 +40,186 @@ class WorkloadScaler(Kubectl):
         self.scaling_range = scaling_range
         self.max_number = max_number
         self.min_number = min_number
+        self.target_value = target_value
+        self.tolerance = tolerance
+        # Stabilization windows and rate limits of the scaling, per cluster
+        self.behavior = behavior
+        # {cluster name: replica information read by the last control_replicas}
+        self.replica_infos = {}
 
         # Parent class
-        Kubectl.__init__(self, kube_config)
+        Kubectl.__init__(self, kube_config, watch_replicas)
 
         # Logging
         self.logger = logging.getLogger("WorkloadScaler")
-        logging.basicConfig(
-            level=logging.NOTSET,
-            format='%(asctime)s.%(msecs)03d %(levelname)s %(module)s - %(funcName)s: %(message)s',
-            datefmt='%Y-%m-%d %H:%M:%S'
-        )
 
-    def control_replicas(self, scaling, cluster_name: str = None):
+    def desired_replicas(self, replicas: int, metric_value: float) -> int:
+        """
+        Returns the replica number which brings the metric value to target_value
+        ceil(current replicas * metric value / target_value), clamped to min/max
+
+        The replicas are kept when the ratio is within the tolerance
+        """
+        ratio = metric_value / self.target_value
+        if abs(ratio - 1) <= self.tolerance:
+            new_replicas = replicas
+        else:
+            # A workload scaled to zero is treated as one replica, so it can grow again
+            new_replicas = ceil(max(replicas, 1) * ratio)
+        return max(self.min_number, min(self.max_number, new_replicas))
+
+    def recommend_replicas(self, scaling, replicas: int, metric_value: float = None) -> int:
+        """
+        Returns the recommended replica number for the scaling, None if the replicas are kept
+        """
+        if scaling == 'scaling_out':
+            new_replicas = replicas + self.scaling_range
+        elif scaling == 'scaling_in':
+            new_replicas = replicas - self.scaling_range
+        else:
+            self.logger.error("Scaling direction must be defined (scaling_out or scaling_in)")
+            raise Exception
+
+        if self.target_value is not None and metric_value is not None:
+            new_replicas = self.desired_replicas(replicas, metric_value)
+            # Replicas out of min/max are clamped whatever the direction is
+            if self.min_number <= replicas <= self.max_number and \
+                    ((scaling == 'scaling_out' and new_replicas <= replicas) or
+                     (scaling == 'scaling_in' and new_replicas >= replicas)):
+                self.logger.info("current replicas: %s already track the target (metric value: %s, target value: %s)",
+                                 replicas, metric_value, self.target_value)
+                return None
+            self.logger.info("Scaling %s (namespace: %s, workload: %s) from %s to %s "
+                             "(metric value: %s, target value: %s)", self.name, self.namespace, self.workload,
+                             replicas, new_replicas, metric_value, self.target_value)
+            return new_replicas
+
+        # Control if scaling is already met
+        if (replicas == self.max_number or replicas == self.min_number)\
+                and not self.min_number < new_replicas < self.max_number:
+            self.logger.info("current replica number is already at max:%s/min:%s current replicas: %s",
+                             self.max_number, self.min_number, replicas)
+            return None
+        if replicas > self.max_number:
+            self.logger.warning("current replica number is more than max_number scaling to max_number: %s",
+                                self.max_number)
+            return self.max_number
+        elif replicas < self.min_number:
+            self.logger.warning("current replica number is less than min_number scaling to min_number: %s",
+                                self.min_number)
+            return self.min_number
+        else:
+            self.logger.info("Scaling %s (namespace: %s, workload: %s) from %s to %s",
+                             self.name, self.namespace, self.workload, replicas, new_replicas)
+            return new_replicas
+
+    def control_replicas(self, scaling, cluster_name: str = None, metric_value: float = None):
         """
         Controls the replica information from the workload
+
+        With target_value and a metric value, the new replica number is given by desired_replicas
+        and never goes against the scaling direction. With a behavior, the recommendation is
+        stabilized and rate limited per cluster
         """
         try:
-            self.logger.info(f"Getting information for {self.name} (namespace: {self.namespace}, "
-                             f"workload: {self.workload})")
+            self.logger.info("Getting information for %s (namespace: %s, workload: %s)",
+                             self.name, self.namespace, self.workload)
             # Get the replica information from the workload
             replica_info = self.get_replica_info(self.workload, self.name, self.namespace, cluster_name)
 
             if replica_info:
-                # Replica number of the workload
-                replicas = replica_info['replicas'] or 0
-
-                if scaling == 'scaling_out':
-                    new_replicas = replicas + self.scaling_range
-                elif scaling == 'scaling_in':
-                    new_replicas = replicas - self.scaling_range
-                else:
-                    self.logger.error("Scaling direction must be defined (scaling_out or scaling_in)")
-                    raise Exception
-
-                # Control if scaling is already met
-                if (replicas == self.max_number or replicas == self.min_number)\
-                        and not self.min_number < new_replicas < self.max_number:
-                    self.logger.info(f"current replica number is already at "
-                                     f"max:{self.max_number}/min:{self.min_number}"
-                                     f" current replicas: {replicas}")
+                self.replica_infos[cluster_name] = replica_info
+                # Desired replica number of the workload, status lags behind it during rollouts
+                replicas = replica_info.get('spec_replicas')
+                if replicas is None:
+                    replicas = replica_info['replicas'] or 0
+                new_replicas = self.recommend_replicas(scaling, replicas, metric_value)
+                if self.behavior is not None:
+                    new_replicas = self.behavior.apply(cluster_name, replicas,
+                                                       replicas if new_replicas is None else new_replicas)
+                labels = {'name': self.name, 'namespace': self.namespace, 'cluster': cluster_name}
+                CURRENT_REPLICAS.set(replicas, **labels)
+                DESIRED_REPLICAS.set(replicas if new_replicas is None else new_replicas, **labels)
+                if self.behavior is not None and new_replicas == replicas:
+                    return None
+                # The patch would not change the desired replicas of the workload
+                if new_replicas is not None and new_replicas == replica_info.get('spec_replicas'):
+                    self.logger.info("%s (namespace: %s, workload: %s) already has %s desired replicas, scaling is "
+                                     "skipped", self.name, self.namespace, self.workload, new_replicas)
                     return None
-                if replicas > self.max_number:
-                    self.logger.warning(f"current replica number is more than max_number"
-                                        f" scaling to max_number: {self.max_number}")
-                    return self.max_number
-                elif replicas < self.min_number:
-                    self.logger.warning(f"current replica number is less than min_number"
-                                        f" scaling to min_number: {self.min_number}")
-                    return self.min_number
-                else:
-                    self.logger.info(f"Scaling {self.name} (namespace: {self.namespace}, workload: {self.workload}) "
-                                     f"from {replicas} to {new_replicas}")
-                    return new_replicas
+                return new_replicas
             else:
-                self.logger.error(f"{self.name} (namespace: {self.namespace}, workload: {self.workload}) not found")
+                self.logger.error("%s (namespace: %s, workload: %s) not found",
+                                  self.name, self.namespace, self.workload)
                 raise Exception("replica_info not found")
         except Exception as e:
-            self.logger.error(f"Exception at control_replicas: {e}")
+            self.logger.error("Exception at control_replicas: %s", e)
             return None
 
-    def scale(self, scaling, cluster_name: str = None):
+    def coalesce(self, decisions: list) -> list:
+        """
+        Coalesces the (scaling, cluster_name[, metric_value]) decisions of one tick into one decision
+        per cluster, so the workload is patched once per cluster. Decisions of cluster names which
+        resolve to the same context are merged, scaling out wins over scaling in, otherwise the later
+        decision wins.
+        """
+        coalesced = {}
+        for decision in decisions:
+            try:
+                key = self.resolve_cluster(decision[1]) or decision[1]
+            except Exception:
+                key = decision[1]
+            pending = coalesced.get(key)
+            if pending is not None:
+                self.logger.info("Scaling decisions %s and %s of %s in cluster %s are coalesced",
+                                 pending[0], decision[0], self.name, key or 'In cluster config')
+                if pending[0] == 'scaling_out' and decision[0] == 'scaling_in':
+                    continue
+            coalesced[key] = decision
+        return list(coalesced.values())
+
+    def scale(self, scaling, cluster_name: str = None, metric_value: float = None):
         """
-        Scales the target workload
+        Scales the target workload in the cluster
+        The cluster name is resolved to its kube-config context once, the replica information is
+        read from and the patch is sent to that context with its cached clients
         """
         result = None
-        self.logger.info(f"Scaling {self.name} (namespace: {self.namespace}, workload: {self.workload})")
+        self.logger.info("Scaling %s (namespace: %s, workload: %s)", self.name, self.namespace, self.workload)
+
+        # The cluster is resolved once, the read and the write go to the same context
+        try:
+            context = self.resolve_cluster(cluster_name)
+        except Exception as e:
+            self.logger.error("Exception at scale: %s", e)
+            context = None
+        if context is None:
+            self.logger.error("Cluster %s cannot be resolved, scaling %s (namespace: %s, workload: %s) is aborted.",
+                              cluster_name or 'In cluster config', self.name, self.namespace, self.workload)
+            return
 
-        new_replica_number = self.control_replicas(scaling, cluster_name)
+        new_replica_number = self.control_replicas(scaling, context, metric_value)
 
         if new_replica_number is None:
-            self.logger.warning(f"Scaling {self.name} (namespace: {self.namespace}, "
-                                f"workload: {self.workload}) is aborted.")
+            self.logger.warning("Scaling %s (namespace: %s, workload: %s) is aborted.",
+                                self.name, self.namespace, self.workload)
             return
         try:
-            result = self.scale_workload(self.workload, self.name, self.namespace, new_replica_number)
+            # The desired replicas before the scaling are the old replicas, status lags during rollouts
+            old_replicas = (self.replica_infos.get(context) or {}).get('spec_replicas')
+            result = self.scale_workload(self.workload, self.name, self.namespace, new_replica_number, context,
+                                         old_replicas)
 
             if result:
-                self.logger.info(f"{self.name} (namespace: {self.namespace}, workload: {self.workload}) is scaled from "
-                                 f"{result['old_replicas']} to {result['new_replicas']}")
+                self.logger.info("%s (namespace: %s, workload: %s) is scaled from %s to %s",
+                                 self.name, self.namespace, self.workload, result['old_replicas'],
+                                 result['new_replicas'])
+                if self.behavior is not None:
+                    self.behavior.record(context, result['old_replicas'] or 0, result['new_replicas'])
+                SCALE_ACTIONS_TOTAL.inc(name=self.name, namespace=self.namespace, cluster=context,
+                                        direction='up' if result['new_replicas'] > (result['old_replicas'] or 0)
+                                        else 'down')
         except Exception as e:
-            self.logger.error(f"Exception at scale: {e}")
+            self.logger.error("Exception at scale: %s", e)
         finally:
             return result
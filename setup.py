@@ -20,6 +20,8 @@ setup(
         'setuptools~=54.2.0',
         'kubernetes~=12.0.1',
         'requests~=2.25.1',
-        'prometheus-api-client~=0.4.2',
+        'PyYAML>=5.4',
+        'numpy>=1.19',
+        'aiohttp>=3.7',
     ]
 )
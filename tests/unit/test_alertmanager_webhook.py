@@ -0,0 +1,116 @@
+import asyncio
+import json
+import threading
+from unittest import TestCase, mock
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+from k8s_workload_scaler.alertmanager_webhook import AlertmanagerWebhookReceiver, alerts_from_payload
+
+PAYLOAD = {
+    'version': '4',
+    'status': 'firing',
+    'alerts': [{
+        'status': 'firing',
+        'labels': {'alertname': 'scaling-out-name', 'scaling': 'out', 'cluster_name': 'cluster-1'},
+        'annotations': {'value': '0.9'},
+    }, {
+        'status': 'resolved',
+        'labels': {'alertname': 'scaling-in-name', 'scaling': 'in', 'cluster_name': 'cluster-2'},
+    }, {
+        'status': 'firing',
+        'labels': {'alertname': 'other-name', 'scaling': 'out'},
+    }],
+}
+
+
+def build_manager():
+    manager = mock.Mock(scaling_out_name='scaling-out-name', scaling_in_name='scaling-in-name', namespace='default',
+                        workload='Deployment')
+    manager.name = 'scale-name'
+    return manager
+
+
+class AlertsFromPayloadTest(TestCase):
+    def test_alerts_from_payload(self):
+        alerts = alerts_from_payload(PAYLOAD)
+        self.assertEqual(len(alerts), 3)
+        self.assertEqual(alerts[0]['state'], 'firing')
+        self.assertEqual(alerts[0]['value'], '0.9')
+        self.assertEqual(alerts[1]['state'], 'inactive')
+        self.assertIsNone(alerts[2]['value'])
+        self.assertEqual(alerts_from_payload({'alerts': [{'labels': {}}]}), [])
+
+
+class AlertmanagerWebhookReceiverTest(TestCase):
+    def setUp(self):
+        self.receiver = AlertmanagerWebhookReceiver(0, '127.0.0.1')
+        self.manager = build_manager()
+        self.receiver.register(self.manager)
+        self.receiver.loop = mock.Mock()
+        self.receiver.queue = mock.Mock()
+
+    def test_receive(self):
+        self.assertEqual(self.receiver.receive(PAYLOAD), 1)
+        self.receiver.loop.call_soon_threadsafe.assert_called_once()
+        self.assertEqual(set(self.receiver.pending[0]), {'scaling-out-name', 'scaling-in-name'})
+
+    def test_receive_merges_pending_alerts(self):
+        self.receiver.receive(PAYLOAD)
+        resolved = {'alerts': [dict(PAYLOAD['alerts'][0], status='resolved')]}
+        self.assertEqual(self.receiver.receive(resolved), 0)
+        self.receiver.loop.call_soon_threadsafe.assert_called_once()
+        self.assertEqual(self.receiver.pending[0]['scaling-out-name']['cluster-1']['state'], 'inactive')
+
+    def test_receive_without_workloads(self):
+        self.assertEqual(self.receiver.receive({'alerts': [PAYLOAD['alerts'][2]]}), 0)
+        self.assertEqual(self.receiver.pending, {})
+
+    def test_trigger_scaling(self):
+        self.receiver.receive(PAYLOAD)
+        self.receiver.trigger_scaling(0)
+        alert_index = self.manager.trigger_scaling.call_args[0][0]
+        self.assertEqual(alert_index['scaling-out-name']['cluster-1']['labels']['scaling'], 'out')
+        self.assertEqual(self.receiver.pending, {})
+        self.assertEqual(self.receiver.scheduled, set())
+
+    def test_trigger_scaling_queues_again(self):
+        self.receiver.receive(PAYLOAD)
+        # A notification arrives while the workload is being scaled
+        self.manager.trigger_scaling.side_effect = lambda alert_index: self.receiver.receive(PAYLOAD)
+        self.receiver.trigger_scaling(0)
+        self.assertEqual(self.receiver.loop.call_soon_threadsafe.call_count, 2)
+        self.assertEqual(self.receiver.scheduled, {0})
+
+    def test_trigger_scaling_exception(self):
+        self.receiver.receive(PAYLOAD)
+        self.manager.trigger_scaling.side_effect = Exception("Not valid workload")
+        self.receiver.trigger_scaling(0)
+        self.assertEqual(self.receiver.scheduled, set())
+
+    def test_serve_webhook(self):
+        receiver = AlertmanagerWebhookReceiver(0, '127.0.0.1')
+        manager = build_manager()
+        receiver.register(manager)
+        scaled = threading.Event()
+        manager.trigger_scaling.side_effect = lambda alert_index: scaled.set()
+
+        def post(path, body):
+            request = Request(f"http://127.0.0.1:{receiver.server.server_address[1]}{path}", data=body,
+                              headers={'Content-Type': 'application/json'})
+            with urlopen(request) as response:
+                return json.loads(response.read())
+
+        async def run():
+            task = asyncio.ensure_future(receiver.run_async())
+            while receiver.server is None:
+                await asyncio.sleep(0.01)
+            loop = asyncio.get_event_loop()
+            result = await loop.run_in_executor(None, post, '/webhook', json.dumps(PAYLOAD).encode())
+            with self.assertRaises(HTTPError):
+                await loop.run_in_executor(None, post, '/webhook', b'not json')
+            await loop.run_in_executor(None, scaled.wait, 5)
+            task.cancel()
+            return result
+
+        self.assertEqual(asyncio.run(run()), {'status': 'success', 'queued': 1})
+        self.assertTrue(scaled.is_set())
@@ -0,0 +1,192 @@
+import asyncio
+import os
+import tempfile
+import time
+from unittest import TestCase, mock
+from k8s_workload_scaler.controller import Controller, load_targets, validate_targets
+from k8s_workload_scaler.prometheus_alert_api import PrometheusAlertAPI
+from k8s_workload_scaler.prometheus_metric_api import PrometheusMetricAPI
+
+TARGETS = b"""
+defaults:
+  host: prometheus
+  port: "9090"
+targets:
+  - management_type: prometheus_alert_api
+    workload: Deployment
+    name: scale-name
+    namespace: default
+    max_number: 10
+    min_number: 2
+    scaling_out_name: scaling-out-name
+    scaling_in_name: scaling-in-name
+  - management_type: prometheus_metric_api
+    workload: Deployment
+    name: other-name
+    namespace: default
+    max_number: 10
+    min_number: 2
+    time_interval: 5
+    metric_name: metric-name
+    label_list:
+      label: value
+    scaling_out_threshold_value: 0.8
+    scaling_in_threshold_value: 0.2
+    rate_time: 300
+"""
+
+
+class LoadTargetsTest(TestCase):
+    def setUp(self):
+        fd, self.targets_file = tempfile.mkstemp()
+        os.write(fd, TARGETS)
+        os.close(fd)
+
+    def tearDown(self):
+        os.remove(self.targets_file)
+
+    def test_load_targets(self):
+        targets = load_targets(self.targets_file, {'kube_config': 'kube-config', 'time_interval': 60})
+        self.assertEqual(len(targets), 2)
+        self.assertEqual(targets[0]['host'], 'prometheus')
+        self.assertEqual(targets[0]['kube_config'], 'kube-config')
+        self.assertEqual(targets[0]['scaling_range'], 1)
+        self.assertEqual(targets[0]['time_interval'], 60)
+        self.assertEqual(targets[1]['time_interval'], 5)
+        self.assertEqual(targets[1]['label_list'], {'label': 'value'})
+
+    def test_load_targets_missing_parameter(self):
+        with self.assertRaises(Exception):
+            load_targets(self.targets_file)
+
+    def test_validate_duplicate_targets(self):
+        targets = load_targets(self.targets_file, {'kube_config': 'kube-config'})
+        with self.assertRaises(Exception):
+            validate_targets([targets[0], dict(targets[0])])
+
+    def test_validate_target_tracking(self):
+        targets = load_targets(self.targets_file, {'kube_config': 'kube-config'})
+        del targets[1]['scaling_out_threshold_value'], targets[1]['scaling_in_threshold_value']
+        with self.assertRaises(Exception):
+            validate_targets([targets[1]])
+        targets[1]['target_value'] = 0.5
+        self.assertEqual(validate_targets([targets[1]]), [targets[1]])
+
+    def test_validate_metrics_with_forecaster(self):
+        targets = load_targets(self.targets_file, {'kube_config': 'kube-config'})
+        targets[1]['metrics'] = [{'metric_name': 'other-metric', 'target_value': 0.5}]
+        self.assertEqual(validate_targets([targets[1]]), [targets[1]])
+        targets[1]['forecaster'] = {'horizon': 600}
+        with self.assertRaises(Exception):
+            validate_targets([targets[1]])
+
+    def test_validate_management_type(self):
+        with self.assertRaises(Exception):
+            validate_targets([{'management_type': 'random'}])
+
+
+class ControllerTest(TestCase):
+    def setUp(self):
+        fd, self.targets_file = tempfile.mkstemp()
+        os.write(fd, TARGETS)
+        os.close(fd)
+        self.controller = Controller(load_targets(self.targets_file, {'kube_config': 'kube-config'}))
+
+    def tearDown(self):
+        os.remove(self.targets_file)
+
+    def test_build_managers(self):
+        self.assertIsInstance(self.controller.managers[0], PrometheusAlertAPI)
+        self.assertIsInstance(self.controller.managers[1], PrometheusMetricAPI)
+        self.assertEqual(self.controller.managers[1].label_list, {'label': 'value'})
+
+    def test_metric_targets_share_poller(self):
+        targets = load_targets(self.targets_file, {'kube_config': 'kube-config'})
+        other = dict(targets[1], name='another-name', label_list={'label': 'other-value'})
+        controller = Controller([targets[1], other])
+        self.assertEqual(len(controller.jobs), 1)
+        self.assertEqual(controller.pollers[0].query, 'metric-name{label=~"other\\\\-value|value"}')
+
+    def test_forecast_target_has_own_job(self):
+        targets = load_targets(self.targets_file, {'kube_config': 'kube-config'})
+        other = dict(targets[1], name='another-name', forecaster={'horizon': 600, 'season': 3600})
+        controller = Controller([targets[1], other])
+        self.assertEqual(len(controller.jobs), 2)
+        self.assertEqual(controller.managers[1].forecaster.season_length, 60)
+        self.assertEqual(controller.jobs[1][1], controller.managers[1].control_and_trigger_scaling)
+        self.assertEqual(len(controller.pollers[0].managers), 1)
+
+    def test_multi_metric_target(self):
+        targets = load_targets(self.targets_file, {'kube_config': 'kube-config'})
+        for key in ['metric_name', 'label_list', 'scaling_out_threshold_value', 'scaling_in_threshold_value']:
+            del targets[1][key]
+        targets[1]['metrics'] = [
+            {'metric_name': 'cpu', 'label_list': {'label': 'value'}, 'target_value': 0.5},
+            {'metric_name': 'requests', 'scaling_out_threshold_value': 10, 'scaling_in_threshold_value': 2},
+        ]
+        controller = Controller(validate_targets([targets[1]]))
+        self.assertEqual(len(controller.managers[0].metric_specs), 2)
+        self.assertEqual(controller.managers[0].metric_specs[1].rate_time, 300)
+        self.assertEqual(controller.jobs[0][1], controller.managers[0].control_and_trigger_scaling)
+        self.assertEqual(controller.pollers, [])
+
+    def test_targets_share_scaling_pool(self):
+        targets = load_targets(self.targets_file, {'kube_config': 'kube-config'})
+        other = dict(targets[1], name='another-name')
+        controller = Controller([targets[1], other], concurrency=4)
+        self.assertIs(controller.managers[0].executor(), controller.scaling_executor)
+        self.assertIs(controller.managers[1].executor(), controller.scaling_executor)
+        self.assertEqual(controller.scaling_executor._max_workers, 4)
+
+    def test_targets_share_session(self):
+        self.assertIs(self.controller.managers[0].session, self.controller.managers[1].session)
+
+    def test_alert_targets_share_poller(self):
+        targets = load_targets(self.targets_file, {'kube_config': 'kube-config'})
+        other = dict(targets[0], name='another-name')
+        controller = Controller([targets[0], other, targets[1]])
+        self.assertEqual(len(controller.jobs), 2)
+        self.assertEqual(controller.jobs[0][1].__self__.managers, controller.managers[:2])
+
+    def test_webhook_targets(self):
+        targets = load_targets(self.targets_file, {'kube_config': 'kube-config'})
+        webhook = dict(targets[0], management_type='alertmanager_webhook', name='webhook-name')
+        del webhook['host'], webhook['port']
+        controller = Controller(validate_targets([targets[0], webhook]), webhook_port=0)
+        self.assertIsInstance(controller.managers[1], PrometheusAlertAPI)
+        self.assertEqual(len(controller.jobs), 1)
+        self.assertEqual(controller.receiver.managers, [controller.managers[1]])
+        self.assertEqual(controller.receiver.alert_managers['scaling-out-name'], [0])
+
+    def test_alert_targets_with_other_session_settings(self):
+        targets = load_targets(self.targets_file, {'kube_config': 'kube-config'})
+        other = dict(targets[0], name='another-name', prometheus_read_timeout=30)
+        controller = Controller([targets[0], other])
+        self.assertEqual(len(controller.jobs), 2)
+        self.assertIs(controller.pollers[1].session, controller.managers[1].session)
+        self.assertIsNot(controller.pollers[0].session, controller.pollers[1].session)
+
+    def test_control(self):
+        self.controller.jobs = [(60, mock.Mock(), 'job-1'), (5, mock.AsyncMock(), 'job-2')]
+        asyncio.run(self.controller.control(0))
+        asyncio.run(self.controller.control(1))
+        self.controller.jobs[0][1].assert_called_once()
+        self.controller.jobs[1][1].assert_awaited_once()
+
+    def test_control_exception(self):
+        self.controller.jobs = [(60, mock.Mock(side_effect=Exception), 'job-1')]
+        asyncio.run(self.controller.control(0))
+        self.controller.jobs[0][1].assert_called_once()
+
+    def test_control_concurrently(self):
+        def job():
+            time.sleep(0.2)
+
+        self.controller.jobs = [(60, job, f'job-{i}') for i in range(10)]
+        started = time.monotonic()
+
+        async def control_all():
+            await asyncio.gather(*[self.controller.control(i) for i in range(10)])
+
+        asyncio.run(control_all())
+        self.assertLess(time.monotonic() - started, 1)
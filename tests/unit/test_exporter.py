@@ -0,0 +1,46 @@
+from unittest import TestCase
+from urllib.error import HTTPError
+from urllib.request import urlopen
+from k8s_workload_scaler.exporter import Counter, Gauge, Histogram, MetricsRegistry, start_exporter
+
+
+class ExporterTest(TestCase):
+    def test_histogram(self):
+        histogram = Histogram('latency_seconds', "Latency", ('cluster',), buckets=(0.1, 1))
+        histogram.observe(0.05, cluster='cluster-1')
+        histogram.observe(0.5, cluster='cluster-1')
+        histogram.observe(5, cluster='cluster-1')
+        self.assertEqual(histogram.render(), [
+            '# HELP latency_seconds Latency',
+            '# TYPE latency_seconds histogram',
+            'latency_seconds_bucket{cluster="cluster-1",le="0.1"} 1',
+            'latency_seconds_bucket{cluster="cluster-1",le="1.0"} 2',
+            'latency_seconds_bucket{cluster="cluster-1",le="+Inf"} 3',
+            'latency_seconds_sum{cluster="cluster-1"} 5.55',
+            'latency_seconds_count{cluster="cluster-1"} 3',
+        ])
+
+    def test_counter_and_gauge(self):
+        counter = Counter('actions_total', "Actions", ('direction', 'cluster'))
+        counter.inc(direction='up', cluster=None)
+        counter.inc(direction='up', cluster=None)
+        gauge = Gauge('replicas', "Replicas", ('name',))
+        gauge.set(3, name='php-"apache"')
+        self.assertEqual(counter.render()[2], 'actions_total{direction="up",cluster=""} 2.0')
+        self.assertEqual(gauge.render()[2], 'replicas{name="php-\\"apache\\""} 3.0')
+
+    def test_registry(self):
+        registry = MetricsRegistry()
+        registry.register(Gauge('replicas', "Replicas")).set(3)
+        self.assertEqual(registry.render(), '# HELP replicas Replicas\n# TYPE replicas gauge\nreplicas 3.0\n')
+
+    def test_serve_metrics(self):
+        server = start_exporter(0, '127.0.0.1')
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        with urlopen(f"http://127.0.0.1:{server.server_address[1]}/metrics") as response:
+            body = response.read().decode()
+            self.assertTrue(response.headers['Content-Type'].startswith('text/plain'))
+        self.assertIn('# TYPE workload_scaler_decision_seconds histogram', body)
+        with self.assertRaises(HTTPError):
+            urlopen(f"http://127.0.0.1:{server.server_address[1]}/other")
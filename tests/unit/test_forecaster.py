@@ -0,0 +1,55 @@
+import numpy as np
+from unittest import TestCase
+from k8s_workload_scaler.forecaster import HoltWinters, MetricForecaster
+
+
+class HoltWintersTest(TestCase):
+    def test_linear_trend(self):
+        model = HoltWinters()
+        model.update(np.arange(10, dtype=np.float64))
+        self.assertAlmostEqual(model.forecast(5), 14)
+
+    def test_seasonal(self):
+        season = np.array([0.0, 10.0, 0.0, -10.0])
+        model = HoltWinters(season_length=4)
+        model.update(np.tile(season, 3) + 100)
+        self.assertAlmostEqual(model.forecast(2), 110)
+        self.assertAlmostEqual(model.forecast(4), 90)
+
+    def test_incremental_update(self):
+        values = np.sin(np.arange(40)) + np.arange(40)
+        model = HoltWinters(season_length=6)
+        model.update(values)
+        incremental = HoltWinters(season_length=6)
+        for i in range(0, 40, 3):
+            incremental.update(values[i:i + 3])
+        self.assertAlmostEqual(model.forecast(3), incremental.forecast(3))
+
+
+class MetricForecasterTest(TestCase):
+    def setUp(self):
+        self.forecaster = MetricForecaster(horizon=120, step=60)
+
+    def test_update_only_new_points(self):
+        self.forecaster.update(None, [[0, '1'], [60, '2'], [120, '3']])
+        self.forecaster.update(None, [[120, '3'], [180, '4']])
+        self.assertEqual(self.forecaster.models[None].points, 4)
+        self.assertAlmostEqual(self.forecaster.forecast(None), 6)
+
+    def test_fill_gaps(self):
+        self.forecaster.update(None, [[0, '1'], [60, '2']])
+        # The point at 120 is missing
+        self.forecaster.update(None, [[180, '4']])
+        self.assertEqual(self.forecaster.models[None].points, 4)
+        self.assertEqual(self.forecaster.last_points[None], (180, 4))
+
+    def test_forecast_not_ready(self):
+        self.forecaster.update(None, [[0, '1']])
+        self.assertEqual(self.forecaster.forecast(None), None)
+
+    def test_evict(self):
+        self.forecaster.update('cluster-1', [[0, '1'], [60, '2']])
+        self.forecaster.update('cluster-2', [[0, '1'], [600, '2']])
+        self.assertEqual(self.forecaster.evict(300), ['cluster-1'])
+        self.assertEqual(list(self.forecaster.models), ['cluster-2'])
+        self.assertEqual(self.forecaster.last_time('cluster-2'), 600)
@@ -0,0 +1,60 @@
+import json
+from unittest import TestCase
+from k8s_workload_scaler.json_stream import JsonArrayStream
+
+ALERTS = {
+    'status': 'success',
+    'data': {
+        'groups': [{'alerts': ['not', 'these']}],
+        'alerts': [
+            {'labels': {'alertname': 'scaling-out-name', 'note': 'a "quoted" }{ value'}, 'state': 'firing'},
+            {'labels': {'alertname': 'other-name'}, 'state': 'firing'},
+            {'labels': {'alertname': 'scaling-in-name'}, 'state': 'inactive'},
+        ],
+    },
+}
+
+
+def parse(stream, body, chunk_size):
+    items = []
+    for start in range(0, len(body), chunk_size):
+        items.extend(stream.feed(body[start:start + chunk_size]))
+    return items + stream.close()
+
+
+class JsonArrayStreamTest(TestCase):
+    def test_elements_of_path(self):
+        body = json.dumps(ALERTS, indent=2).encode()
+        for chunk_size in (1, 3, 64, len(body)):
+            stream = JsonArrayStream(('data', 'alerts'))
+            self.assertEqual(parse(stream, body, chunk_size), ALERTS['data']['alerts'])
+            self.assertEqual(stream.values, {'status': 'success'})
+
+    def test_keep(self):
+        body = json.dumps(ALERTS).encode()
+        stream = JsonArrayStream(('data', 'alerts'), keep=lambda alert: alert['state'] == 'firing')
+        self.assertEqual(parse(stream, body, 5), ALERTS['data']['alerts'][:2])
+        self.assertEqual(stream.stats['elements'], 3)
+        self.assertEqual(stream.stats['kept'], 2)
+
+    def test_multibyte_characters_split_between_chunks(self):
+        alerts = [{'labels': {'alertname': 'scaling-out-name', 'note': 'ölçek büyüt'}, 'state': 'firing'}]
+        body = json.dumps({'status': 'success', 'data': {'alerts': alerts}}, ensure_ascii=False).encode()
+        self.assertEqual(parse(JsonArrayStream(('data', 'alerts')), body, 1), alerts)
+
+    def test_buffer_is_bounded(self):
+        alerts = [{'labels': {'alertname': f"alert-{index}"}, 'state': 'inactive'} for index in range(1000)]
+        body = json.dumps({'status': 'success', 'data': {'alerts': alerts}}).encode()
+        stream = JsonArrayStream(('data', 'alerts'), keep=lambda alert: False)
+        longest = 0
+        for start in range(0, len(body), 64):
+            stream.feed(body[start:start + 64])
+            longest = max(longest, len(stream.buffer))
+        stream.close()
+        self.assertLess(longest, 200)
+
+    def test_incomplete_document(self):
+        stream = JsonArrayStream(('data', 'alerts'))
+        stream.feed(b'{"status": "success", "data": {"alerts": [{"labels": {}')
+        with self.assertRaises(Exception):
+            stream.close()
@@ -1,5 +1,7 @@
+import os
+import tempfile
 from unittest import TestCase, mock
-from k8s_workload_scaler.kubectl import Kubectl
+from k8s_workload_scaler.kubectl import Kubectl, cluster_client_registry
 from k8s_workload_scaler.utils import Dict
 
 
@@ -54,6 +56,11 @@ fake_scale_return = Dict(
 
 fake_replica_return = Dict(
     {
+        'spec': Dict(
+            {
+                'replicas': 5
+            }
+        ),
         'status': Dict(
             {
                 'replicas': 5
@@ -84,6 +91,15 @@ class ScaleWorkloadTest(KubectlTestCase):
         self.assertEqual(result['old_replicas'], 3)
         self.assertEqual(result['new_replicas'], 6)
 
+    @mock.patch('k8s_workload_scaler.kubectl.Kubectl.pick_cluster')
+    def test_scale_workload_old_replicas(self, mock_pick_cluster):
+        mock_pick_cluster.return_value = {
+            'core_v1': FakeCoreV1Api(),
+            'apps_v1': FakeAppsV1Api(),
+        }
+        result = self.kubectl.scale_workload('Deployment', 'scale-name', 'default', 6, 'cluster-name', old_replicas=5)
+        self.assertEqual(result, {'new_replicas': 6, 'old_replicas': 5})
+
     @mock.patch('k8s_workload_scaler.kubectl.Kubectl.pick_cluster')
     def test_scale_stateful_set_workload(self, mock_pick_cluster):
         # StatefulSet tests
@@ -233,6 +249,98 @@ class GetReplicaInfoTest(KubectlTestCase):
         self.assertEqual(result, None)
 
 
+class GetCachedReplicaInfoTest(KubectlTestCase):
+    def setUp(self):
+        super(GetCachedReplicaInfoTest, self).setUp()
+        self.kubectl.watch_replicas = True
+
+    @mock.patch('k8s_workload_scaler.kubectl.Kubectl.pick_cluster')
+    @mock.patch('k8s_workload_scaler.kubectl.Kubectl.get_cached_replica_info')
+    def test_get_replica_info_from_cache(self, mock_get_cached_replica_info, mock_pick_cluster):
+        mock_get_cached_replica_info.return_value = {'replicas': 7, 'spec_replicas': 8}
+        result = self.kubectl.get_replica_info('Deployment', 'scale-name', 'default', 'cluster-name')
+        self.assertEqual(result, {'replicas': 7, 'spec_replicas': 8})
+        mock_pick_cluster.assert_not_called()
+
+    @mock.patch('k8s_workload_scaler.kubectl.Kubectl.pick_cluster')
+    @mock.patch('k8s_workload_scaler.kubectl.Kubectl.get_cached_replica_info')
+    def test_get_replica_info_cache_not_synced(self, mock_get_cached_replica_info, mock_pick_cluster):
+        mock_get_cached_replica_info.return_value = None
+        mock_pick_cluster.return_value = {
+            'core_v1': FakeCoreV1Api(),
+            'apps_v1': FakeAppsV1Api(),
+        }
+        result = self.kubectl.get_replica_info('Deployment', 'scale-name', 'default', 'cluster-name')
+        self.assertEqual(result, {'replicas': 5, 'spec_replicas': 5})
+
+
 class PickClusterTest(KubectlTestCase):
     def setUp(self):
         super(PickClusterTest, self).setUp()
+        cluster_client_registry.clear()
+        fd, self.kube_config = tempfile.mkstemp()
+        os.write(fd, b'kube-config')
+        os.close(fd)
+        self.kubectl = Kubectl(self.kube_config)
+
+    def tearDown(self):
+        cluster_client_registry.clear()
+        os.remove(self.kube_config)
+
+    @mock.patch('k8s_workload_scaler.kubectl.config.new_client_from_config')
+    @mock.patch('k8s_workload_scaler.kubectl.config.load_incluster_config')
+    @mock.patch('k8s_workload_scaler.kubectl.config.list_kube_config_contexts')
+    def test_pick_cluster_reuses_clients(self, mock_contexts, mock_config, mock_new_client):
+        mock_contexts.return_value = ([{'name': 'cluster-1'}, {'name': 'cluster-2'}], {'name': 'cluster-1'})
+        first = self.kubectl.pick_cluster('cluster-2')
+        second = self.kubectl.pick_cluster('cluster-2')
+        self.assertIs(first, second)
+        self.assertIs(first['core_v1'].api_client, first['apps_v1'].api_client)
+        mock_contexts.assert_called_once()
+        mock_new_client.assert_called_once_with(config_file=self.kube_config, context='cluster-2')
+
+    @mock.patch('k8s_workload_scaler.kubectl.config.load_incluster_config')
+    @mock.patch('k8s_workload_scaler.kubectl.config.list_kube_config_contexts')
+    def test_resolve_cluster_exact_context(self, mock_contexts, mock_config):
+        mock_contexts.return_value = ([{'name': 'cluster-10'}, {'name': 'cluster-1'}], {'name': 'cluster-10'})
+        self.assertEqual(self.kubectl.resolve_cluster('cluster-1'), 'cluster-1')
+        self.assertEqual(self.kubectl.resolve_cluster('cluster-3'), None)
+
+    @mock.patch('k8s_workload_scaler.kubectl.config.new_client_from_config')
+    @mock.patch('k8s_workload_scaler.kubectl.config.load_incluster_config')
+    @mock.patch('k8s_workload_scaler.kubectl.config.list_kube_config_contexts')
+    def test_pick_cluster_active_context(self, mock_contexts, mock_config, mock_new_client):
+        mock_contexts.return_value = ([{'name': 'cluster-1'}, {'name': 'cluster-2'}], {'name': 'cluster-1'})
+        self.kubectl.pick_cluster()
+        mock_new_client.assert_called_once_with(config_file=self.kube_config, context='cluster-1')
+
+    @mock.patch('k8s_workload_scaler.kubectl.replica_cache.drop')
+    @mock.patch('k8s_workload_scaler.kubectl.config.new_client_from_config')
+    @mock.patch('k8s_workload_scaler.kubectl.config.load_incluster_config')
+    @mock.patch('k8s_workload_scaler.kubectl.config.list_kube_config_contexts')
+    def test_pick_cluster_reloads_changed_kube_config(self, mock_contexts, mock_config, mock_new_client, mock_drop):
+        mock_contexts.return_value = ([{'name': 'cluster-1'}], {'name': 'cluster-1'})
+        mock_new_client.side_effect = lambda **kwargs: mock.MagicMock()
+        first = self.kubectl.pick_cluster()
+        with open(self.kube_config, 'wb') as f:
+            f.write(b'changed-kube-config')
+        second = self.kubectl.pick_cluster()
+        self.assertEqual(mock_contexts.call_count, 2)
+        self.assertEqual(mock_new_client.call_count, 2)
+        # The clients of the old kube-config are closed, the new ones are kept open
+        first['core_v1'].api_client.close.assert_called_once()
+        first['core_v1'].api_client.rest_client.pool_manager.clear.assert_called_once()
+        second['core_v1'].api_client.close.assert_not_called()
+        # The informers of the old clients are stopped
+        mock_drop.assert_called_once_with(self.kube_config)
+        cluster_client_registry.clear()
+        second['core_v1'].api_client.close.assert_called_once()
+        second['core_v1'].api_client.rest_client.pool_manager.clear.assert_called_once()
+
+    @mock.patch('k8s_workload_scaler.kubectl.config.new_client_from_config')
+    @mock.patch('k8s_workload_scaler.kubectl.config.load_incluster_config')
+    @mock.patch('k8s_workload_scaler.kubectl.config.list_kube_config_contexts')
+    def test_pick_cluster_not_found(self, mock_contexts, mock_config, mock_new_client):
+        mock_contexts.return_value = ([{'name': 'cluster-1'}], {'name': 'cluster-1'})
+        self.assertIsNone(self.kubectl.pick_cluster('cluster-3'))
+        mock_new_client.assert_not_called()
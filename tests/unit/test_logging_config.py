@@ -0,0 +1,37 @@
+from unittest import TestCase, mock
+from k8s_workload_scaler.logging_config import JsonFormatter, configure_logging
+
+import json
+import logging
+
+
+class LoggingConfigTest(TestCase):
+    def setUp(self):
+        root = logging.getLogger()
+        handlers, level = list(root.handlers), root.level
+
+        def restore():
+            root.handlers[:] = handlers
+            root.setLevel(level)
+        self.addCleanup(restore)
+
+    def test_json_formatter(self):
+        record = logging.LogRecord('Kubectl', logging.INFO, 'kubectl.py', 1, "%s scaled to %s",
+                                   ('php-apache', 5), None)
+        entry = json.loads(JsonFormatter().format(record))
+        self.assertEqual(entry['message'], "php-apache scaled to 5")
+        self.assertEqual(entry['level'], 'INFO')
+        self.assertEqual(entry['logger'], 'Kubectl')
+
+    def test_configure_logging(self):
+        configure_logging('warning', json_format=True)
+        root = logging.getLogger()
+        self.assertEqual(root.level, logging.WARNING)
+        self.assertEqual(len(root.handlers), 1)
+        self.assertIsInstance(root.handlers[0].formatter, JsonFormatter)
+
+    def test_arguments_are_not_formatted_below_level(self):
+        configure_logging('INFO')
+        argument = mock.MagicMock()
+        logging.getLogger('PrometheusMetricAPI').debug("%s", argument)
+        argument.__str__.assert_not_called()
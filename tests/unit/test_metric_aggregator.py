@@ -0,0 +1,65 @@
+from unittest import TestCase, mock
+from k8s_workload_scaler.metric_aggregator import MetricAggregator, series_key
+
+
+def fake_vector(values, cluster_names=None, prefix='pod'):
+    vector = []
+    for i, value in enumerate(values):
+        labels = {'pod': f'{prefix}-{i}'}
+        if cluster_names:
+            labels['cluster_name'] = cluster_names[i % len(cluster_names)]
+        vector.append({'metric': labels, 'value': [1600000000.5, str(value)]})
+    return vector
+
+
+class MetricAggregatorTest(TestCase):
+    def setUp(self):
+        self.aggregator = MetricAggregator(300)
+
+    def test_to_columns(self):
+        slots, values, timestamps = self.aggregator.to_columns(fake_vector([1, 2.5]))
+        self.assertEqual(list(slots), [0, 1])
+        self.assertEqual(list(values), [1.0, 2.5])
+        self.assertEqual(list(timestamps), [1600000000.5, 1600000000.5])
+
+    @mock.patch('k8s_workload_scaler.metric_aggregator.series_key', wraps=series_key)
+    def test_to_columns_reuses_slots(self, mock_series_key):
+        self.aggregator.to_columns(fake_vector([1, 2, 3]))
+        self.assertEqual(mock_series_key.call_count, 3)
+        slots, values, _ = self.aggregator.to_columns(fake_vector([4, 5, 6]))
+        self.assertEqual(mock_series_key.call_count, 3)
+        self.assertEqual(list(slots), [0, 1, 2])
+        self.assertEqual(list(values), [4.0, 5.0, 6.0])
+        # Only the series which moved or are new build a key
+        vector = fake_vector([1, 2, 3, 4])
+        vector[1], vector[2] = vector[2], vector[1]
+        slots, _, _ = self.aggregator.to_columns(vector)
+        self.assertEqual(mock_series_key.call_count, 6)
+        self.assertEqual(list(slots), [0, 2, 1, 3])
+
+    def test_to_columns_empty(self):
+        slots, values, _ = self.aggregator.to_columns([])
+        self.assertEqual(len(slots), 0)
+        self.assertEqual(len(values), 0)
+
+    def test_averages(self):
+        result = self.aggregator.averages(fake_vector([1, 2, 3, 6], cluster_names=['cluster-1', 'cluster-2']))
+        self.assertEqual(result, [
+            {'value': 2.0, 'cluster_name': 'cluster-1'},
+            {'value': 4.0, 'cluster_name': 'cluster-2'},
+        ])
+
+    def test_rate_many_series(self):
+        clusters = [f'cluster-{i}' for i in range(20)]
+        self.assertIsNone(self.aggregator.rate(fake_vector([1.0] * 100000, clusters), 0))
+        result = self.aggregator.rate(fake_vector([11.0] * 100000, clusters), 10)
+        self.assertEqual(len(result), 20)
+        self.assertTrue(all(rate['value'] == 1.0 for rate in result))
+
+    def test_compact_drops_old_series(self):
+        self.aggregator.rate_time = 0
+        self.aggregator.rate(fake_vector([1.0] * 1000, prefix='old'), 0)
+        self.aggregator.rate(fake_vector([1.0] * 100, prefix='new'), 10)
+        result = self.aggregator.rate(fake_vector([2.0] * 100, prefix='new'), 20)
+        self.assertEqual(result, [{'value': 0.1}])
+        self.assertEqual(len(self.aggregator.series_slots), 100)
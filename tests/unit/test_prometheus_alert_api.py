@@ -1,14 +1,32 @@
+import asyncio
+import json
 from unittest import TestCase, mock
-from k8s_workload_scaler.prometheus_alert_api import PrometheusAlertAPI
+from k8s_workload_scaler.prometheus_alert_api import PrometheusAlertAPI, PrometheusAlertPoller, get_alerts, \
+    index_alerts
+from k8s_workload_scaler.prometheus_session import PrometheusSession
 from requests import RequestException
 
 
-class FakeResponse404:
+class FakeResponse:
+    status_code = 200
+    reason = 200
+
+    def iter_content(self, chunk_size):
+        body = json.dumps(self.json()).encode()
+        # Small chunks split the alerts between the chunks
+        for start in range(0, len(body), 7):
+            yield body[start:start + 7]
+
+    def close(self):
+        pass
+
+
+class FakeResponse404(FakeResponse):
     status_code = 404
     reason = 404
 
 
-class FakeResponse200:
+class FakeResponse200(FakeResponse):
     status_code = 200
 
     @staticmethod
@@ -28,7 +46,7 @@ class FakeResponse200:
         }
 
 
-class FakeResponse200Inactive:
+class FakeResponse200Inactive(FakeResponse):
     status_code = 200
 
     @staticmethod
@@ -71,22 +89,121 @@ class ControlAlertandTriggerScalingTest(PrometheusAlertAPITestCase):
     def setUp(self):
         super(ControlAlertandTriggerScalingTest, self).setUp()
 
-    @mock.patch('requests.get')
+    @mock.patch('requests.Session.get')
     def test_request_exception(self, mock_get):
         mock_get.return_value = FakeResponse404()
         with self.assertRaises(RequestException):
             self.prometheus_alert_api.control_alert_and_trigger_scaling()
 
-    @mock.patch('requests.get')
+    @mock.patch('requests.Session.get')
     @mock.patch('k8s_workload_scaler.prometheus_alert_api.WorkloadScaler.scale')
     def test_firing_alarm(self, mock_scale, mock_get):
         mock_get.return_value = FakeResponse200()
         self.prometheus_alert_api.control_alert_and_trigger_scaling()
         mock_scale.assert_called_once()
 
-    @mock.patch('requests.get')
+    @mock.patch('requests.Session.get')
     @mock.patch('k8s_workload_scaler.prometheus_alert_api.WorkloadScaler.scale')
     def test_inactive_alarm(self, mock_scale, mock_get):
         mock_get.return_value = FakeResponse200Inactive()
         self.prometheus_alert_api.control_alert_and_trigger_scaling()
         mock_scale.assert_not_called()
+
+    @mock.patch('requests.Session.get')
+    @mock.patch('k8s_workload_scaler.prometheus_alert_api.WorkloadScaler.scale')
+    def test_alarm_not_found(self, mock_scale, mock_get):
+        mock_get.return_value = FakeResponse200()
+        self.prometheus_alert_api.scaling_out_name = 'random-name'
+        self.prometheus_alert_api.control_alert_and_trigger_scaling()
+        mock_scale.assert_not_called()
+
+
+multi_cluster_alerts = [
+    {'labels': {'alertname': 'scaling-out-name', 'scaling': 'out', 'cluster_name': 'cluster-1'},
+     'state': 'firing', 'value': 10e7},
+    {'labels': {'alertname': 'scaling-in-name', 'scaling': 'in', 'cluster_name': 'cluster-1'},
+     'state': 'firing', 'value': 10e5},
+    {'labels': {'alertname': 'scaling-out-name', 'scaling': 'out', 'cluster_name': 'cluster-2'},
+     'state': 'inactive', 'value': 10e5},
+    {'labels': {'alertname': 'scaling-in-name', 'scaling': 'in', 'cluster_name': 'cluster-2'},
+     'state': 'firing', 'value': 10e5},
+    {'labels': {'alertname': 'other-name', 'scaling': 'out'}, 'state': 'firing', 'value': 10e7},
+]
+
+
+class FakeResponseMultiCluster(FakeResponse):
+    @staticmethod
+    def json():
+        return {'status': 'success', 'data': {'alerts': multi_cluster_alerts}}
+
+
+class GetAlertsTest(TestCase):
+    @mock.patch('requests.Session.get')
+    def test_get_alerts_of_names(self, mock_get):
+        mock_get.return_value = FakeResponseMultiCluster()
+        alerts = get_alerts(PrometheusSession(), 'http://prometheus:9090/api/v1/alerts', ['scaling-in-name'])
+        self.assertEqual(alerts, [multi_cluster_alerts[1], multi_cluster_alerts[3]])
+        self.assertTrue(mock_get.call_args[1]['stream'])
+
+    @mock.patch('requests.Session.get')
+    def test_get_all_alerts(self, mock_get):
+        mock_get.return_value = FakeResponseMultiCluster()
+        self.assertEqual(get_alerts(PrometheusSession(), 'http://prometheus:9090/api/v1/alerts'), multi_cluster_alerts)
+
+
+class IndexAlertsTest(TestCase):
+    def test_index_alerts(self):
+        alert_index = index_alerts(multi_cluster_alerts)
+        self.assertEqual(set(alert_index), {'scaling-out-name', 'scaling-in-name', 'other-name'})
+        self.assertEqual(set(alert_index['scaling-out-name']), {'cluster-1', 'cluster-2'})
+        self.assertEqual(alert_index['other-name'][None]['state'], 'firing')
+
+
+class TriggerScalingTest(PrometheusAlertAPITestCase):
+    def setUp(self):
+        super(TriggerScalingTest, self).setUp()
+
+    @mock.patch('k8s_workload_scaler.prometheus_alert_api.WorkloadScaler.scale')
+    def test_trigger_scaling_by_cluster(self, mock_scale):
+        self.prometheus_alert_api.trigger_scaling(index_alerts(multi_cluster_alerts))
+        mock_scale.assert_has_calls([
+            mock.call('scaling_out', 'cluster-1', None),
+            mock.call('scaling_in', 'cluster-2', None),
+        ])
+        self.assertEqual(mock_scale.call_count, 2)
+
+
+class PrometheusAlertPollerTest(PrometheusAlertAPITestCase):
+    def setUp(self):
+        super(PrometheusAlertPollerTest, self).setUp()
+        self.poller = PrometheusAlertPoller('prometheus', '9090')
+        self.poller.register(self.prometheus_alert_api)
+        self.poller.register(self.prometheus_alert_api)
+
+    @mock.patch('requests.Session.get')
+    @mock.patch('k8s_workload_scaler.prometheus_alert_api.WorkloadScaler.scale')
+    def test_poll_fetches_once(self, mock_scale, mock_get):
+        mock_get.return_value = FakeResponse200()
+        self.poller.poll()
+        mock_get.assert_called_once()
+        self.assertEqual(mock_get.call_args[0][0], 'http://prometheus:9090/api/v1/alerts')
+        self.assertEqual(mock_scale.call_count, 2)
+
+    @mock.patch('requests.Session.get')
+    def test_poll_request_exception(self, mock_get):
+        mock_get.return_value = FakeResponse404()
+        with self.assertRaises(RequestException):
+            self.poller.poll()
+
+    @mock.patch('k8s_workload_scaler.prometheus_alert_api.get_alerts_async')
+    @mock.patch('k8s_workload_scaler.prometheus_alert_api.WorkloadScaler.scale')
+    def test_poll_async(self, mock_scale, mock_get_alerts_async):
+        mock_get_alerts_async.return_value = FakeResponse200.json()['data']['alerts']
+
+        async def poll():
+            await self.poller.poll_async()
+            await self.poller.close()
+
+        asyncio.run(poll())
+        mock_get_alerts_async.assert_awaited_once()
+        self.assertEqual(mock_scale.call_count, 2)
@@ -1,5 +1,14 @@
+import asyncio
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from unittest import TestCase, mock
-from k8s_workload_scaler.prometheus_metric_api import PrometheusMetricAPI
+from k8s_workload_scaler.forecaster import MetricForecaster
+from k8s_workload_scaler.range_cache import RangeQueryCache
+from k8s_workload_scaler.prometheus_metric_api import PrometheusMetricAPI, PrometheusMetricPoller, SCALING_BY_METRICS, \
+    build_batch_query
+from requests import RequestException
 
 
 class PrometheusMeticAPITestCase(TestCase):
@@ -28,7 +37,397 @@ class GetOneMetricTest(PrometheusMeticAPITestCase):
     def setUp(self):
         super(GetOneMetricTest, self).setUp()
 
-    @mock.patch('prometheus_api_client.prometheus_connect.PrometheusConnect.get_current_metric_value')
-    def test_prometheus_connect_exception(self, mock_get_current_metric_value):
-        mock_get_current_metric_value.side_effect = Exception
-        self.assertRaises(Exception, self.prometheus_alert_api.get_one_metric())
+    @mock.patch('requests.Session.get')
+    def test_prometheus_connect_exception(self, mock_get):
+        mock_get.side_effect = RequestException("Connection refused")
+        with self.assertLogs('PrometheusMetricAPI', 'ERROR') as logs:
+            self.assertIsNone(self.prometheus_alert_api.get_one_metric())
+        self.assertIn("Connection refused", logs.output[0])
+        mock_get.assert_called_once()
+
+
+def fake_metrics(*values, cluster_names=None):
+    metrics = []
+    for i, value in enumerate(values):
+        labels = {'__name__': 'metric-name', 'pod': f'pod-{i}'}
+        if cluster_names:
+            labels['cluster_name'] = cluster_names[i]
+        metrics.append({'metric': labels, 'value': [1600000000 + i, str(value)]})
+    return metrics
+
+
+class RateMetricsTest(PrometheusMeticAPITestCase):
+    def setUp(self):
+        super(RateMetricsTest, self).setUp()
+
+    @mock.patch('k8s_workload_scaler.prometheus_metric_api.monotonic')
+    @mock.patch('k8s_workload_scaler.prometheus_metric_api.PrometheusMetricAPI.get_one_metric')
+    def test_rate_first_call(self, mock_get_one_metric, mock_monotonic):
+        mock_get_one_metric.return_value = fake_metrics(10, 20)
+        mock_monotonic.return_value = 1000
+        self.assertIsNone(self.prometheus_alert_api.rate_metrics())
+
+    @mock.patch('k8s_workload_scaler.prometheus_metric_api.monotonic')
+    @mock.patch('k8s_workload_scaler.prometheus_metric_api.PrometheusMetricAPI.get_one_metric')
+    def test_rate_without_cluster(self, mock_get_one_metric, mock_monotonic):
+        mock_get_one_metric.side_effect = [fake_metrics(10, 20), fake_metrics(40, 50)]
+        mock_monotonic.side_effect = [1000, 1060]
+        self.prometheus_alert_api.rate_metrics()
+        result = self.prometheus_alert_api.rate_metrics()
+        self.assertEqual(result, [{'value': 0.5}])
+
+    @mock.patch('k8s_workload_scaler.prometheus_metric_api.monotonic')
+    @mock.patch('k8s_workload_scaler.prometheus_metric_api.PrometheusMetricAPI.get_one_metric')
+    def test_rate_uses_rate_window(self, mock_get_one_metric, mock_monotonic):
+        mock_get_one_metric.side_effect = [fake_metrics(0), fake_metrics(100), fake_metrics(200), fake_metrics(500)]
+        mock_monotonic.side_effect = [0, 200, 400, 600]
+        results = [self.prometheus_alert_api.rate_metrics() for _ in range(4)]
+        # The sample at 200 is the newest one at least 300 seconds old at 600
+        self.assertEqual(results[3], [{'value': 1.0}])
+        self.assertEqual(len(self.prometheus_alert_api.aggregator.history), 3)
+
+    @mock.patch('k8s_workload_scaler.prometheus_metric_api.monotonic')
+    @mock.patch('k8s_workload_scaler.prometheus_metric_api.PrometheusMetricAPI.get_one_metric')
+    def test_rate_by_cluster(self, mock_get_one_metric, mock_monotonic):
+        clusters = ['cluster-1', 'cluster-2']
+        mock_get_one_metric.side_effect = [
+            fake_metrics(10, 20, cluster_names=clusters),
+            fake_metrics(40, 30, cluster_names=clusters),
+        ]
+        mock_monotonic.side_effect = [1000, 1010]
+        self.prometheus_alert_api.rate_metrics()
+        result = self.prometheus_alert_api.rate_metrics()
+        self.assertEqual(result, [
+            {'value': 3.0, 'cluster_name': 'cluster-1'},
+            {'value': 1.0, 'cluster_name': 'cluster-2'},
+        ])
+
+    @mock.patch('k8s_workload_scaler.prometheus_metric_api.PrometheusMetricAPI.get_one_metric')
+    def test_rate_metrics_not_found(self, mock_get_one_metric):
+        mock_get_one_metric.return_value = None
+        self.assertIsNone(self.prometheus_alert_api.rate_metrics())
+
+    @mock.patch('k8s_workload_scaler.prometheus_metric_api.monotonic')
+    @mock.patch('k8s_workload_scaler.prometheus_metric_api.PrometheusMetricAPI.get_one_metric')
+    def test_rate_matches_series_by_labels(self, mock_get_one_metric, mock_monotonic):
+        clusters = ['cluster-1', 'cluster-2', 'cluster-1']
+        first = fake_metrics(10, 20, 30, cluster_names=clusters)
+        last = fake_metrics(20, 40, 50, cluster_names=clusters)
+        # Prometheus does not guarantee the order of series, a new series has no first value
+        last = [last[2], last[1], last[0], {'metric': {'pod': 'pod-new', 'cluster_name': 'cluster-2'},
+                                            'value': [1600000000, '1000']}]
+        mock_get_one_metric.side_effect = [first, last]
+        mock_monotonic.side_effect = [1000, 1010]
+        self.prometheus_alert_api.rate_metrics()
+        result = self.prometheus_alert_api.rate_metrics()
+        self.assertEqual(result, [
+            {'value': 1.5, 'cluster_name': 'cluster-1'},
+            {'value': 2.0, 'cluster_name': 'cluster-2'},
+        ])
+
+
+class ControlAndTriggerScalingTest(PrometheusMeticAPITestCase):
+    def setUp(self):
+        super(ControlAndTriggerScalingTest, self).setUp()
+
+    @mock.patch('k8s_workload_scaler.prometheus_metric_api.PrometheusMetricAPI.scale')
+    @mock.patch('k8s_workload_scaler.prometheus_metric_api.PrometheusMetricAPI.rate_metrics')
+    def test_scale_clusters(self, mock_rate_metrics, mock_scale):
+        mock_rate_metrics.return_value = [
+            {'value': 1.0, 'cluster_name': 'cluster-1'},
+            {'value': 0.1, 'cluster_name': 'cluster-2'},
+            {'value': 0.5, 'cluster_name': 'cluster-3'},
+        ]
+        mock_scale.side_effect = lambda scaling, cluster_name: {'cluster': cluster_name}
+        result = self.prometheus_alert_api.control_and_trigger_scaling()
+        self.assertEqual(result, [
+            {'cluster_name': 'cluster-1', 'scaling': 'scaling_out', 'result': {'cluster': 'cluster-1'}, 'error': None},
+            {'cluster_name': 'cluster-2', 'scaling': 'scaling_in', 'result': {'cluster': 'cluster-2'}, 'error': None},
+        ])
+
+    @mock.patch('k8s_workload_scaler.prometheus_metric_api.PrometheusMetricAPI.scale')
+    def test_scale_clusters_in_parallel(self, mock_scale):
+        mock_scale.side_effect = lambda scaling, cluster_name: time.sleep(0.2)
+        started = time.monotonic()
+        result = self.prometheus_alert_api.scale_clusters([('scaling_out', f'cluster-{i}') for i in range(8)])
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertEqual(len(result), 8)
+
+    @mock.patch('k8s_workload_scaler.prometheus_metric_api.PrometheusMetricAPI.scale')
+    def test_scale_clusters_shared_pool(self, mock_scale):
+        running = {'now': 0, 'max': 0}
+        lock = threading.Lock()
+
+        def scale(scaling, cluster_name):
+            with lock:
+                running['now'] += 1
+                running['max'] = max(running['max'], running['now'])
+            time.sleep(0.05)
+            with lock:
+                running['now'] -= 1
+
+        mock_scale.side_effect = scale
+        executor = ThreadPoolExecutor(max_workers=8)
+        self.addCleanup(executor.shutdown)
+        self.prometheus_alert_api.scaling_executor = executor
+        self.prometheus_alert_api.scaling_workers = 2
+        result = self.prometheus_alert_api.scale_clusters([('scaling_out', f'cluster-{i}') for i in range(6)])
+        self.assertEqual([item['error'] for item in result], [None] * 6)
+        # The target never runs more than scaling_workers clusters at a time in the shared pool
+        self.assertEqual(running['max'], 2)
+        self.assertIs(self.prometheus_alert_api.executor(), executor)
+
+    @mock.patch('k8s_workload_scaler.prometheus_metric_api.PrometheusMetricAPI.scale')
+    def test_scale_clusters_timeout(self, mock_scale):
+        def scale(scaling, cluster_name):
+            if cluster_name == 'cluster-slow':
+                time.sleep(0.5)
+            return cluster_name
+
+        mock_scale.side_effect = scale
+        self.prometheus_alert_api.scaling_timeout = 0.1
+        result = self.prometheus_alert_api.scale_clusters([('scaling_out', 'cluster-1'),
+                                                           ('scaling_out', 'cluster-slow')])
+        self.assertEqual(result[0]['result'], 'cluster-1')
+        self.assertIsInstance(result[1]['error'], TimeoutError)
+
+    @mock.patch('k8s_workload_scaler.prometheus_metric_api.PrometheusMetricAPI.scale')
+    def test_scale_clusters_skips_clusters_being_scaled(self, mock_scale):
+        released = threading.Event()
+
+        def scale(scaling, cluster_name):
+            if cluster_name == 'cluster-slow':
+                released.wait(5)
+            return cluster_name
+
+        mock_scale.side_effect = scale
+        self.prometheus_alert_api.scaling_timeout = 0.1
+        decisions = [('scaling_out', 'cluster-1'), ('scaling_out', 'cluster-slow')]
+        self.prometheus_alert_api.scale_clusters(decisions)
+        # The worker of the timed out cluster is still running, the next tick does not scale it again
+        result = self.prometheus_alert_api.scale_clusters(decisions)
+        self.assertEqual(result[0]['result'], 'cluster-1')
+        self.assertIn('still being scaled', str(result[1]['error']))
+        self.assertEqual(mock_scale.call_count, 3)
+        released.set()
+        self.prometheus_alert_api.executor().shutdown(wait=True)
+        self.assertEqual(self.prometheus_alert_api.scaling_clusters, set())
+
+    @mock.patch('k8s_workload_scaler.prometheus_metric_api.PrometheusMetricAPI.scale')
+    def test_scale_clusters_exception(self, mock_scale):
+        mock_scale.side_effect = Exception('error')
+        result = self.prometheus_alert_api.scale_clusters([('scaling_out', 'cluster-1'),
+                                                           ('scaling_in', 'cluster-2')])
+        self.assertEqual(str(result[1]['error']), 'error')
+
+
+class TargetTrackingTest(PrometheusMeticAPITestCase):
+    def setUp(self):
+        super(TargetTrackingTest, self).setUp()
+        self.prometheus_alert_api.target_value = 0.5
+
+    @mock.patch('k8s_workload_scaler.prometheus_metric_api.PrometheusMetricAPI.scale')
+    @mock.patch('k8s_workload_scaler.prometheus_metric_api.PrometheusMetricAPI.rate_metrics')
+    def test_decisions(self, mock_rate_metrics, mock_scale):
+        mock_rate_metrics.return_value = [
+            {'value': 1.0, 'cluster_name': 'cluster-1'},
+            {'value': 0.1, 'cluster_name': 'cluster-2'},
+            {'value': 0.52, 'cluster_name': 'cluster-3'},
+        ]
+        self.prometheus_alert_api.control_and_trigger_scaling()
+        mock_scale.assert_has_calls([
+            mock.call('scaling_out', 'cluster-1', 1.0),
+            mock.call('scaling_in', 'cluster-2', 0.1),
+        ], any_order=True)
+        self.assertEqual(mock_scale.call_count, 2)
+
+    @mock.patch('k8s_workload_scaler.workload_scaler.Kubectl.get_replica_info')
+    def test_control_replicas(self, mock_get_replica_info):
+        mock_get_replica_info.return_value = {'replicas': 2}
+        # 2 * 4.0 / 0.5 = 16, clamped to max_number
+        self.assertEqual(self.prometheus_alert_api.control_replicas('scaling_out', None, 4.0), 10)
+        mock_get_replica_info.return_value = {'replicas': 6}
+        self.assertEqual(self.prometheus_alert_api.control_replicas('scaling_out', None, 0.6), 8)
+        self.assertEqual(self.prometheus_alert_api.control_replicas('scaling_in', None, 0.25), 3)
+        # Within the tolerance
+        self.assertEqual(self.prometheus_alert_api.control_replicas('scaling_out', None, 0.54), None)
+
+
+class ForecastMetricsTest(PrometheusMeticAPITestCase):
+    def setUp(self):
+        super(ForecastMetricsTest, self).setUp()
+        self.prometheus_alert_api.forecaster = MetricForecaster(horizon=120, step=60)
+        self.prometheus_alert_api.range_cache = RangeQueryCache(self.prometheus_alert_api.url,
+                                                                self.prometheus_alert_api.session)
+
+    def test_rate_query(self):
+        self.assertEqual(self.prometheus_alert_api.rate_query,
+                         'avg by (cluster_name) (rate(metric-name{label="value"}[300s]))')
+
+    @mock.patch('k8s_workload_scaler.prometheus_metric_api.time')
+    @mock.patch('k8s_workload_scaler.prometheus_metric_api.PrometheusMetricAPI.scale')
+    @mock.patch('k8s_workload_scaler.range_cache.query_range')
+    def test_scale_ahead_of_forecast(self, mock_query_range, mock_scale, mock_time):
+        mock_time.return_value = 150
+        mock_query_range.return_value = [
+            {'metric': {'cluster_name': 'cluster-1'}, 'values': [[0, '0.3'], [60, '0.5'], [120, '0.7']]},
+            {'metric': {'cluster_name': 'cluster-2'}, 'values': [[0, '0.1'], [60, '0.1'], [120, '0.1']]},
+        ]
+        self.prometheus_alert_api.control_and_trigger_scaling()
+        # The rate of cluster-1 is under the threshold but its forecast is not
+        mock_scale.assert_has_calls([
+            mock.call('scaling_out', 'cluster-1'),
+            mock.call('scaling_in', 'cluster-2'),
+        ], any_order=True)
+        # No new step is fetched within the step, the last points are still fresh
+        self.assertEqual(self.prometheus_alert_api.forecast_metrics(), [
+            {'value': mock.ANY, 'cluster_name': 'cluster-1'}, {'value': mock.ANY, 'cluster_name': 'cluster-2'},
+        ])
+
+    @mock.patch('k8s_workload_scaler.prometheus_metric_api.time')
+    @mock.patch('k8s_workload_scaler.range_cache.query_range')
+    def test_cluster_drops_out(self, mock_query_range, mock_time):
+        mock_time.return_value = 150
+        mock_query_range.return_value = [
+            {'metric': {'cluster_name': 'cluster-1'}, 'values': [[0, '0.3'], [60, '0.5'], [120, '0.7']]},
+            {'metric': {'cluster_name': 'cluster-2'}, 'values': [[0, '0.1'], [60, '0.1'], [120, '0.1']]},
+        ]
+        self.assertEqual(len(self.prometheus_alert_api.forecast_metrics()), 2)
+        # The series of cluster-2 is not in the range result anymore
+        mock_time.return_value = 210
+        mock_query_range.return_value = [
+            {'metric': {'cluster_name': 'cluster-1'}, 'values': [[180, '0.9']]},
+        ]
+        self.assertEqual(self.prometheus_alert_api.forecast_metrics(),
+                         [{'value': mock.ANY, 'cluster_name': 'cluster-1'}])
+        self.assertIn('cluster-2', self.prometheus_alert_api.forecaster.models)
+        # Its model is dropped after the range window
+        mock_time.return_value = 120 + self.prometheus_alert_api.range_cache.window + 30
+        mock_query_range.return_value = [
+            {'metric': {'cluster_name': 'cluster-1'}, 'values': [[3720, '0.9']]},
+        ]
+        self.prometheus_alert_api.forecast_metrics()
+        self.assertEqual(list(self.prometheus_alert_api.forecaster.models), ['cluster-1'])
+
+
+class MultiMetricTest(TestCase):
+    @mock.patch('k8s_workload_scaler.kubectl.config.load_incluster_config')
+    def setUp(self, mock_config):
+        self.prometheus_metric_api = PrometheusMetricAPI(
+            'Deployment', 'scale-name', 'default', 1, 20, 2, 'kube-config', 'prometheus', '9090',
+            'cpu', {'label': 'value'}, 0.8, 0.2, 300,
+            metrics=[
+                {'metric_name': 'requests', 'target_value': 10},
+                {'metric_name': 'queue', 'scaling_out_threshold_value': 100, 'scaling_in_threshold_value': 10},
+            ],
+        )
+
+    @mock.patch('k8s_workload_scaler.prometheus_metric_api.PrometheusMetricAPI.scale')
+    @mock.patch('k8s_workload_scaler.prometheus_metric_api.PrometheusMetricAPI.rate_spec_metrics')
+    def test_decisions(self, mock_rate_spec_metrics, mock_scale):
+        mock_rate_spec_metrics.return_value = {
+            'cluster-1': [0.5, 10.5, 50],
+            'cluster-2': [0.5, 30, None],
+        }
+        self.prometheus_metric_api.control_and_trigger_scaling()
+        mock_scale.assert_called_once_with(SCALING_BY_METRICS, 'cluster-2', [0.5, 30, None])
+
+    @mock.patch('k8s_workload_scaler.workload_scaler.Kubectl.get_replica_info')
+    def test_highest_recommendation(self, mock_get_replica_info):
+        mock_get_replica_info.return_value = {'replicas': 4}
+        # cpu recommends 5, requests 12 and queue 4
+        self.assertEqual(self.prometheus_metric_api.control_replicas(SCALING_BY_METRICS, None, [0.9, 30, 50]), 12)
+        # cpu recommends 3 and requests 4, none goes below the current replicas
+        self.assertEqual(self.prometheus_metric_api.control_replicas(SCALING_BY_METRICS, None, [0.1, 10, None]), None)
+        self.assertEqual(self.prometheus_metric_api.control_replicas(SCALING_BY_METRICS, None, [0.1, 5, 5]), 3)
+
+    @mock.patch('k8s_workload_scaler.prometheus_metric_api.query_vector')
+    @mock.patch('k8s_workload_scaler.prometheus_metric_api.monotonic')
+    def test_rate_spec_metrics(self, mock_monotonic, mock_query_vector):
+        def metric(session, url, query):
+            return [{'metric': {'__name__': query.split('{')[0], 'cluster_name': 'cluster-1'},
+                     'value': [mock_monotonic.return_value, str(mock_monotonic.return_value)]}]
+
+        mock_query_vector.side_effect = metric
+        mock_monotonic.return_value = 100
+        self.assertEqual(self.prometheus_metric_api.rate_spec_metrics(), {})
+        mock_monotonic.return_value = 110
+        self.assertEqual(self.prometheus_metric_api.rate_spec_metrics(), {'cluster-1': [1.0, 1.0, 1.0]})
+        self.assertEqual(mock_query_vector.call_count, 6)
+
+
+class PrometheusClientTest(PrometheusMeticAPITestCase):
+    def setUp(self):
+        super(PrometheusClientTest, self).setUp()
+
+    @mock.patch('requests.Session.request')
+    def test_prometheus_client_reused(self, mock_request):
+        series = [{'metric': {'label': 'value', 'pod': 'pod-1'}, 'value': [1600000000, '1']}]
+        mock_request.side_effect = lambda *args, **kwargs: FakeQueryResponse(series)
+        self.assertEqual(self.prometheus_alert_api.get_one_metric(), series)
+        self.assertEqual(self.prometheus_alert_api.get_one_metric(), series)
+        self.assertEqual(mock_request.call_args[1]['params'], {'query': 'metric-name{label="value"}'})
+        self.assertEqual(self.prometheus_alert_api.session.stats['requests'], 2)
+
+
+class BuildBatchQueryTest(TestCase):
+    def test_build_batch_query(self):
+        query = build_batch_query('metric-name', [{'job': 'a', 'run': 'x'}, {'job': 'b.c', 'run': 'x'}])
+        self.assertEqual(query, 'metric-name{job=~"a|b\\\\.c",run=~"x"}')
+
+    def test_build_batch_query_without_labels(self):
+        self.assertEqual(build_batch_query('metric-name', [{}]), 'metric-name')
+
+
+class FakeQueryResponse:
+    status_code = 200
+    reason = 200
+
+    def __init__(self, series):
+        self.body = json.dumps({'status': 'success', 'data': {'resultType': 'vector', 'result': series}}).encode()
+
+    def iter_content(self, chunk_size):
+        for start in range(0, len(self.body), 16):
+            yield self.body[start:start + 16]
+
+    def close(self):
+        pass
+
+
+class PrometheusMetricPollerTest(PrometheusMeticAPITestCase):
+    def setUp(self):
+        super(PrometheusMetricPollerTest, self).setUp()
+        self.other = PrometheusMetricAPI('Deployment', 'other-name', 'default', 1, 10, 2, 'kube-config',
+                                         'prometheus', '9090', 'metric-name', {'label': 'other'}, 0.8, 0.2, 300)
+        self.poller = PrometheusMetricPoller(self.prometheus_alert_api.url, self.prometheus_alert_api.session,
+                                             'metric-name', ('label',))
+        self.poller.register(self.prometheus_alert_api)
+        self.poller.register(self.other)
+
+    @mock.patch('k8s_workload_scaler.prometheus_metric_api.PrometheusMetricAPI.control_and_trigger_scaling')
+    @mock.patch('requests.Session.get')
+    def test_poll(self, mock_get, mock_control):
+        series = [
+            {'metric': {'label': 'value', 'pod': 'pod-1'}, 'value': [1600000000, '1']},
+            {'metric': {'label': 'other', 'pod': 'pod-2'}, 'value': [1600000000, '2']},
+            {'metric': {'label': 'unknown', 'pod': 'pod-3'}, 'value': [1600000000, '3']},
+            {'metric': {'label': 'value', 'pod': 'pod-4'}, 'value': [1600000000, '4']},
+        ]
+        mock_get.return_value = FakeQueryResponse(series)
+        self.poller.poll()
+        self.assertEqual(mock_get.call_args[0][0], 'http://prometheus:9090/api/v1/query')
+        self.assertEqual(mock_get.call_args[1]['params'], {'query': 'metric-name{label=~"other|value"}'})
+        mock_control.assert_has_calls([mock.call([series[0], series[3]]), mock.call([series[1]])])
+
+    @mock.patch('k8s_workload_scaler.prometheus_metric_api.PrometheusMetricAPI.control_and_trigger_scaling')
+    @mock.patch('k8s_workload_scaler.prometheus_metric_api.query_vector_async')
+    def test_poll_async(self, mock_query_vector_async, mock_control):
+        series = [
+            {'metric': {'label': 'value', 'pod': 'pod-1'}, 'value': [1600000000, '1']},
+            {'metric': {'label': 'other', 'pod': 'pod-2'}, 'value': [1600000000, '2']},
+        ]
+        mock_query_vector_async.return_value = series
+        asyncio.run(self.poller.poll_async())
+        mock_query_vector_async.assert_awaited_once()
+        self.assertEqual(mock_query_vector_async.call_args[0][2], 'metric-name{label=~"other|value"}')
+        mock_control.assert_has_calls([mock.call([series[0]]), mock.call([series[1]])], any_order=True)
@@ -0,0 +1,109 @@
+import asyncio
+from unittest import TestCase, mock
+from k8s_workload_scaler.prometheus_session import PrometheusSession, TimeoutHTTPAdapter
+from requests import ConnectionError, RequestException
+
+
+class FakeResponse:
+    def __init__(self, status_code, body=None):
+        self.status_code = status_code
+        self.reason = status_code
+        self.body = body
+
+    def json(self):
+        return self.body
+
+
+class FakeAsyncResponse:
+    def __init__(self, status, body=None):
+        self.status = status
+        self.reason = status
+        self.body = body
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        pass
+
+    async def json(self):
+        return self.body
+
+
+class PrometheusSessionTest(TestCase):
+    def setUp(self):
+        self.session = PrometheusSession(connect_timeout=1, read_timeout=2, retries=2, backoff=0)
+
+    @mock.patch('requests.Session.get')
+    def test_get_json(self, mock_get):
+        mock_get.return_value = FakeResponse(200, {'status': 'success'})
+        self.assertEqual(self.session.get_json('http://prometheus:9090/api/v1/alerts'), {'status': 'success'})
+        self.assertEqual(self.session.session.get_adapter('http://prometheus:9090').timeout, (1, 2))
+        self.assertEqual(self.session.stats['requests'], 1)
+        self.assertEqual(self.session.stats['failures'], 0)
+
+    @mock.patch('requests.Session.get')
+    def test_retry_server_error(self, mock_get):
+        mock_get.side_effect = [FakeResponse(503), FakeResponse(200, {'status': 'success'})]
+        self.assertEqual(self.session.get_json('http://prometheus:9090/api/v1/alerts'), {'status': 'success'})
+        self.assertEqual(self.session.stats['retries'], 1)
+        self.assertEqual(self.session.stats['failures'], 1)
+
+    @mock.patch('requests.Session.get')
+    def test_no_retry_client_error(self, mock_get):
+        mock_get.return_value = FakeResponse(404)
+        with self.assertRaises(RequestException):
+            self.session.get_json('http://prometheus:9090/api/v1/alerts')
+        mock_get.assert_called_once()
+
+    @mock.patch('requests.Session.get')
+    def test_retries_exhausted(self, mock_get):
+        mock_get.side_effect = ConnectionError
+        with self.assertRaises(ConnectionError):
+            self.session.get_json('http://prometheus:9090/api/v1/alerts')
+        self.assertEqual(mock_get.call_count, 3)
+        self.assertEqual(self.session.stats['failures'], 3)
+
+    def test_backoff_delay(self):
+        self.session.backoff = 0.5
+        for attempt in range(4):
+            self.assertTrue(0 <= self.session.backoff_delay(attempt) <= 0.5 * 2 ** attempt)
+
+    def test_call(self):
+        func = mock.Mock(side_effect=[ConnectionError, 'result'])
+        self.assertEqual(self.session.call(func, 'query'), 'result')
+        func.assert_called_with('query')
+        self.assertEqual(self.session.stats['retries'], 1)
+
+    def test_call_not_retried(self):
+        func = mock.Mock(side_effect=ValueError)
+        with self.assertRaises(ValueError):
+            self.session.call(func)
+        func.assert_called_once()
+
+    def test_get_json_async_retry_server_error(self):
+        self.session.async_session = mock.Mock()
+        self.session.async_session.get.side_effect = [FakeAsyncResponse(503),
+                                                      FakeAsyncResponse(200, {'status': 'success'})]
+        result = asyncio.run(self.session.get_json_async('http://prometheus:9090/api/v1/alerts'))
+        self.assertEqual(result, {'status': 'success'})
+        self.assertEqual(self.session.stats['retries'], 1)
+        self.assertEqual(self.session.stats['failures'], 1)
+
+    def test_get_json_async_no_retry_client_error(self):
+        self.session.async_session = mock.Mock()
+        self.session.async_session.get.return_value = FakeAsyncResponse(404)
+        with self.assertRaises(RequestException):
+            asyncio.run(self.session.get_json_async('http://prometheus:9090/api/v1/alerts'))
+        self.session.async_session.get.assert_called_once()
+        self.assertEqual(self.session.stats['failures'], 1)
+
+
+class TimeoutHTTPAdapterTest(TestCase):
+    @mock.patch('requests.adapters.HTTPAdapter.send')
+    def test_default_timeout(self, mock_send):
+        adapter = TimeoutHTTPAdapter(timeout=(1, 2))
+        adapter.send('request')
+        self.assertEqual(mock_send.call_args[1]['timeout'], (1, 2))
+        adapter.send('request', timeout=5)
+        self.assertEqual(mock_send.call_args[1]['timeout'], 5)
@@ -0,0 +1,38 @@
+from unittest import TestCase, mock
+from k8s_workload_scaler.prometheus_session import PrometheusSession
+from k8s_workload_scaler.range_cache import RangeQueryCache
+
+
+class RangeQueryCacheTest(TestCase):
+    def setUp(self):
+        self.session = PrometheusSession()
+        self.session.get_json = mock.Mock(side_effect=self.query_range)
+        self.cache = RangeQueryCache('http://prometheus:9090', self.session, step=60, window=600)
+
+    def query_range(self, url, params):
+        start, end = int(params['start']), int(params['end'])
+        return {'status': 'success', 'data': {'resultType': 'matrix', 'result': [{
+            'metric': {'cluster_name': 'cluster-1'},
+            'values': [[t, str(t / 60)] for t in range(start, end + 1, 60)],
+        }]}}
+
+    def test_fetch_only_new_steps(self):
+        new_samples = self.cache.fetch('query', now=6030)
+        # The first fetch covers the window
+        self.assertEqual(len(new_samples[0]['values']), 10)
+        new_samples = self.cache.fetch('query', now=6150)
+        self.assertEqual(list(new_samples[0]['values'][:, 0]), [6060, 6120])
+        url, params = self.session.get_json.call_args[0]
+        self.assertEqual(url, 'http://prometheus:9090/api/v1/query_range')
+        self.assertEqual(params, {'query': 'query', 'start': 6060, 'end': 6120, 'step': '60s'})
+        self.assertEqual(self.cache.stats['points'], 12)
+
+    def test_no_new_step(self):
+        self.cache.fetch('query', now=6030)
+        self.assertEqual(self.cache.fetch('query', now=6050), [])
+        self.assertEqual(self.session.get_json.call_count, 1)
+
+    def test_query_failed(self):
+        self.session.get_json = mock.Mock(return_value={'status': 'error', 'error': 'bad query'})
+        with self.assertRaises(Exception):
+            self.cache.fetch('query', now=6030)
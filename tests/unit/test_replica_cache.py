@@ -0,0 +1,92 @@
+from unittest import TestCase, mock
+from k8s_workload_scaler.replica_cache import ReplicaCache, ReplicaInformer
+from k8s_workload_scaler.utils import Dict
+
+
+def fake_workload(name, replicas, spec_replicas):
+    return Dict({
+        'metadata': Dict({'name': name}),
+        'spec': Dict({'replicas': spec_replicas}),
+        'status': Dict({'replicas': replicas}),
+    })
+
+
+class FakeAppsV1Api:
+    def list_namespaced_deployment(self, namespace, **kwargs):
+        return Dict({
+            'metadata': Dict({'resource_version': '10'}),
+            'items': [fake_workload('scale-name', 3, 3), fake_workload('other-name', 1, 1)],
+        })
+
+
+class FakeWatch:
+    events = []
+
+    def stream(self, func, *args, **kwargs):
+        return iter(self.events)
+
+
+class ReplicaInformerTest(TestCase):
+    def setUp(self):
+        self.informer = ReplicaInformer({'apps_v1': FakeAppsV1Api()}, 'Deployment', 'default')
+
+    def test_not_synced(self):
+        self.assertIsNone(self.informer.get('scale-name'))
+
+    def test_list(self):
+        self.assertEqual(self.informer.list(), '10')
+        self.assertEqual(self.informer.get('scale-name'), {'replicas': 3, 'spec_replicas': 3})
+
+    @mock.patch('k8s_workload_scaler.replica_cache.watch.Watch')
+    def test_watch(self, mock_watch):
+        FakeWatch.events = [
+            {'type': 'MODIFIED', 'object': fake_workload('scale-name', 3, 5)},
+            {'type': 'DELETED', 'object': fake_workload('other-name', 1, 1)},
+            {'type': 'ADDED', 'object': fake_workload('new-name', 0, 2)},
+        ]
+        mock_watch.return_value = FakeWatch()
+        self.informer.watch(self.informer.list())
+        self.assertEqual(self.informer.get('scale-name'), {'replicas': 3, 'spec_replicas': 5})
+        self.assertIsNone(self.informer.get('other-name'))
+        self.assertEqual(self.informer.get('new-name'), {'replicas': 0, 'spec_replicas': 2})
+
+    @mock.patch('k8s_workload_scaler.replica_cache.watch.Watch')
+    def test_watch_error(self, mock_watch):
+        FakeWatch.events = [{'type': 'ERROR', 'object': None, 'raw_object': {'code': 410}}]
+        mock_watch.return_value = FakeWatch()
+        with self.assertRaises(Exception):
+            self.informer.watch(self.informer.list())
+
+
+class ReplicaCacheTest(TestCase):
+    def setUp(self):
+        self.replica_cache = ReplicaCache()
+
+    def tearDown(self):
+        self.replica_cache.clear()
+
+    @mock.patch('k8s_workload_scaler.replica_cache.ReplicaInformer.start')
+    def test_one_informer_per_namespace(self, mock_start):
+        clients = {'apps_v1': FakeAppsV1Api()}
+        self.replica_cache.get('kube-config', 'cluster-1', clients, 'Deployment', 'default', 'scale-name')
+        self.replica_cache.get('kube-config', 'cluster-1', clients, 'Deployment', 'default', 'other-name')
+        self.replica_cache.get('kube-config', 'cluster-2', clients, 'Deployment', 'default', 'scale-name')
+        self.assertEqual(len(self.replica_cache.informers), 2)
+        self.assertEqual(mock_start.call_count, 2)
+
+    @mock.patch('k8s_workload_scaler.replica_cache.ReplicaInformer.start')
+    def test_drop(self, mock_start):
+        clients = {'apps_v1': FakeAppsV1Api()}
+        self.replica_cache.get('kube-config', 'cluster-1', clients, 'Deployment', 'default', 'scale-name')
+        self.replica_cache.get('other-kube-config', 'cluster-1', clients, 'Deployment', 'default', 'scale-name')
+        dropped = self.replica_cache.informers[('kube-config', 'cluster-1', 'Deployment', 'default')]
+        self.replica_cache.drop('kube-config')
+        self.assertTrue(dropped.stopped.is_set())
+        self.assertEqual(list(self.replica_cache.informers), [('other-kube-config', 'cluster-1', 'Deployment',
+                                                               'default')])
+        # The informer is started again with the new clients
+        self.replica_cache.get('kube-config', 'cluster-1', clients, 'Deployment', 'default', 'scale-name')
+        self.assertEqual(mock_start.call_count, 3)
+
+    def test_not_supported_workload(self):
+        self.assertIsNone(self.replica_cache.get('kube-config', 'cluster-1', {}, 'random', 'default', 'scale-name'))
@@ -0,0 +1,28 @@
+import numpy as np
+from unittest import TestCase
+from k8s_workload_scaler.ring_buffer import RingBuffer
+
+
+class RingBufferTest(TestCase):
+    def test_drop_old_entries(self):
+        ring_buffer = RingBuffer(4)
+        for time in range(10):
+            ring_buffer.append(time, time * 10, 3)
+        self.assertEqual(len(ring_buffer), 4)
+        self.assertEqual(list(ring_buffer.since(0)), [60, 70, 80, 90])
+        self.assertEqual(list(ring_buffer.since(8)), [80, 90])
+
+    def test_grow(self):
+        ring_buffer = RingBuffer(2)
+        for time in range(5):
+            ring_buffer.append(time, time, 100)
+        self.assertEqual(list(ring_buffer.since(0)), [0, 1, 2, 3, 4])
+
+    def test_extend(self):
+        ring_buffer = RingBuffer(4)
+        ring_buffer.extend(np.arange(3.0), np.arange(3.0) * 10, 5)
+        ring_buffer.extend(np.arange(3.0, 10.0), np.arange(3.0, 10.0) * 10, 5)
+        times, values = ring_buffer.entries()
+        self.assertEqual(list(times), [4, 5, 6, 7, 8, 9])
+        self.assertEqual(list(values), [40, 50, 60, 70, 80, 90])
+        self.assertEqual(ring_buffer.last_time(), 9)
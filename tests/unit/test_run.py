@@ -0,0 +1,17 @@
+from unittest import TestCase, mock
+from k8s_workload_scaler.run import parse_args
+
+ARGS = ['run.py', '-kc', 'kube-config', '-w', 'Deployment', '-n', 'php-apache', '-ns', 'default', '-max', '10',
+        '-min', '2']
+
+
+class ParseArgsTest(TestCase):
+    def test_metric_labels(self):
+        argv = ARGS + ['--log-level', 'debug', 'prometheus_metric_api', '-ph', 'localhost', '-pp', '9090',
+                       '-mn', 'cpu', '-l', 'pod=php-apache', '-l', 'namespace=default', '-sotv', '0.8',
+                       '-sitv', '0.2', '-r', '300']
+        with mock.patch('sys.argv', argv):
+            args = parse_args()
+        self.assertEqual(args['label_list'], [['pod', 'php-apache'], ['namespace', 'default']])
+        self.assertEqual(args['log_level'], 'DEBUG')
+        self.assertFalse(args['log_json'])
@@ -0,0 +1,34 @@
+from unittest import TestCase
+from k8s_workload_scaler.scaling_behavior import ScalingBehavior
+
+
+class ScalingBehaviorTest(TestCase):
+    def test_scale_down_stabilization(self):
+        behavior = ScalingBehavior(scale_down_stabilization=300)
+        self.assertEqual(behavior.apply('cluster-1', 5, 8, now=0), 8)
+        # The scale out recommendation of 8 replicas is still in the window
+        self.assertEqual(behavior.apply('cluster-1', 8, 4, now=100), 8)
+        self.assertEqual(behavior.apply('cluster-1', 8, 4, now=350), 4)
+        # Clusters have their own history
+        self.assertEqual(behavior.apply('cluster-2', 8, 4, now=100), 4)
+
+    def test_scale_up_stabilization(self):
+        behavior = ScalingBehavior(scale_up_stabilization=60)
+        self.assertEqual(behavior.apply(None, 5, 5, now=0), 5)
+        self.assertEqual(behavior.apply(None, 5, 9, now=30), 5)
+        self.assertEqual(behavior.apply(None, 5, 9, now=70), 9)
+
+    def test_scale_up_limit(self):
+        behavior = ScalingBehavior(max_scale_up_pods=4, max_scale_up_percent=100, period=60)
+        # 100 percent of 2 replicas is less than 4 Pods
+        self.assertEqual(behavior.apply(None, 2, 40, now=0), 6)
+        behavior.record(None, 2, 6, now=0)
+        # 6 replicas were already added in the period
+        self.assertEqual(behavior.apply(None, 6, 40, now=30), 6)
+        self.assertEqual(behavior.apply(None, 6, 40, now=61), 12)
+
+    def test_scale_down_limit(self):
+        behavior = ScalingBehavior(max_scale_down_percent=50, period=60)
+        self.assertEqual(behavior.apply(None, 10, 2, now=0), 5)
+        behavior.record(None, 10, 5, now=0)
+        self.assertEqual(behavior.apply(None, 5, 2, now=30), 5)
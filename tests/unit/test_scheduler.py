@@ -0,0 +1,37 @@
+from unittest import TestCase
+from k8s_workload_scaler.scheduler import TickScheduler
+
+
+class TickSchedulerTest(TestCase):
+    def setUp(self):
+        self.scheduler = TickScheduler(60, phase=5, start=1000)
+
+    def test_fixed_deadlines(self):
+        self.assertEqual(self.scheduler.next_deadline(1000), 1005)
+        self.scheduler.started(1005.5)
+        # The work time of the tick does not move the next deadline
+        self.assertEqual(self.scheduler.next_deadline(1030), 1065)
+        self.scheduler.started(1065)
+        self.assertEqual(self.scheduler.next_deadline(1070), 1125)
+
+    def test_skip_missed_ticks(self):
+        self.scheduler.next_deadline(1000)
+        self.scheduler.started(1005)
+        # The tick ran for 150 seconds, deadlines at 1065 and 1125 are missed and coalesced into one tick
+        self.assertEqual(self.scheduler.next_deadline(1155), 1125)
+        self.assertEqual(self.scheduler.stats['skipped_ticks'], 1)
+        self.assertEqual(self.scheduler.started(1155), 30)
+        self.assertEqual(self.scheduler.next_deadline(1160), 1185)
+
+    def test_late_tick_is_not_skipped(self):
+        self.scheduler.started(1005)
+        self.assertEqual(self.scheduler.next_deadline(1100), 1065)
+
+    def test_lag(self):
+        self.scheduler.next_deadline(1000)
+        self.assertEqual(self.scheduler.started(1007), 2)
+        self.scheduler.next_deadline(1060)
+        self.assertEqual(self.scheduler.started(1065.5), 0.5)
+        self.assertEqual(self.scheduler.stats['max_lag_seconds'], 2)
+        self.assertEqual(self.scheduler.stats['last_lag_seconds'], 0.5)
+        self.assertEqual(self.scheduler.stats['ticks'], 2)
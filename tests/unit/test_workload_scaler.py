@@ -1,4 +1,6 @@
 from unittest import TestCase, mock
+from k8s_workload_scaler.exporter import DESIRED_REPLICAS, SCALE_ACTIONS_TOTAL
+from k8s_workload_scaler.scaling_behavior import ScalingBehavior
 from k8s_workload_scaler.workload_scaler import WorkloadScaler
 
 
@@ -80,9 +82,11 @@ class ScaleTestCase(WorkloadScalerTestCase):
         mock_scale_workload.side_effect = Exception
         self.assertRaises(Exception, self.workload_scaler.scale('scaling_in', 'cluster_name'))
 
+    @mock.patch('k8s_workload_scaler.workload_scaler.WorkloadScaler.resolve_cluster')
     @mock.patch('k8s_workload_scaler.workload_scaler.WorkloadScaler.control_replicas')
     @mock.patch('k8s_workload_scaler.workload_scaler.WorkloadScaler.scale_workload')
-    def test_scale_success(self, mock_scale_workload, mock_control_replicas):
+    def test_scale_success(self, mock_scale_workload, mock_control_replicas, mock_resolve_cluster):
+        mock_resolve_cluster.return_value = 'context-1'
         mock_control_replicas.return_value = 5
         mock_scale_workload.return_value = {
             'old_replicas': 2,
@@ -90,3 +94,106 @@ class ScaleTestCase(WorkloadScalerTestCase):
         }
         result = self.workload_scaler.scale('scale_out')
         self.assertEqual(result, {'old_replicas': 2, 'new_replicas': 5})
+
+    @mock.patch('k8s_workload_scaler.workload_scaler.WorkloadScaler.resolve_cluster')
+    @mock.patch('k8s_workload_scaler.workload_scaler.WorkloadScaler.control_replicas')
+    @mock.patch('k8s_workload_scaler.workload_scaler.WorkloadScaler.scale_workload')
+    def test_scale_routes_to_cluster(self, mock_scale_workload, mock_control_replicas, mock_resolve_cluster):
+        mock_resolve_cluster.return_value = 'context-2'
+        mock_control_replicas.return_value = 5
+        self.workload_scaler.scale('scaling_out', 'cluster-2')
+        mock_control_replicas.assert_called_once_with('scaling_out', 'context-2', None)
+        mock_scale_workload.assert_called_once_with('Deployment', 'scale-name', 'default', 5, 'context-2', None)
+
+    @mock.patch('k8s_workload_scaler.workload_scaler.WorkloadScaler.resolve_cluster')
+    @mock.patch('k8s_workload_scaler.workload_scaler.WorkloadScaler.control_replicas')
+    @mock.patch('k8s_workload_scaler.workload_scaler.WorkloadScaler.scale_workload')
+    def test_scale_unknown_cluster(self, mock_scale_workload, mock_control_replicas, mock_resolve_cluster):
+        mock_resolve_cluster.return_value = None
+        self.assertEqual(self.workload_scaler.scale('scaling_out', 'unknown-cluster'), None)
+        mock_control_replicas.assert_not_called()
+        mock_scale_workload.assert_not_called()
+
+    @mock.patch('k8s_workload_scaler.workload_scaler.WorkloadScaler.resolve_cluster')
+    @mock.patch('k8s_workload_scaler.workload_scaler.Kubectl.get_replica_info')
+    @mock.patch('k8s_workload_scaler.workload_scaler.WorkloadScaler.scale_workload')
+    def test_scale_metrics(self, mock_scale_workload, mock_get_replica_info, mock_resolve_cluster):
+        mock_resolve_cluster.return_value = 'metrics-context'
+        mock_get_replica_info.return_value = {'replicas': 4, 'spec_replicas': 4}
+        mock_scale_workload.return_value = {'old_replicas': 4, 'new_replicas': 5}
+        self.workload_scaler.scale('scaling_out', 'cluster_name')
+        self.assertEqual(DESIRED_REPLICAS.samples[('scale-name', 'default', 'metrics-context')], 5)
+        self.assertEqual(SCALE_ACTIONS_TOTAL.samples[('scale-name', 'default', 'up', 'metrics-context')], 1)
+
+
+class ScalingBehaviorTest(WorkloadScalerTestCase):
+    def setUp(self):
+        super(ScalingBehaviorTest, self).setUp()
+        self.workload_scaler.behavior = ScalingBehavior(scale_down_stabilization=300)
+
+    @mock.patch('k8s_workload_scaler.workload_scaler.Kubectl.get_replica_info')
+    def test_control_replicas_stabilized(self, mock_get_replica_info):
+        mock_get_replica_info.return_value = {'replicas': 5}
+        self.assertEqual(self.workload_scaler.control_replicas('scaling_out', 'cluster_name'), 6)
+        mock_get_replica_info.return_value = {'replicas': 6}
+        # The scale in right after the scale out is held by the stabilization window
+        self.assertEqual(self.workload_scaler.control_replicas('scaling_in', 'cluster_name'), None)
+
+
+class SkipNoOpScalingTest(WorkloadScalerTestCase):
+    def setUp(self):
+        super(SkipNoOpScalingTest, self).setUp()
+
+    @mock.patch('k8s_workload_scaler.workload_scaler.Kubectl.get_replica_info')
+    def test_control_replicas_from_spec(self, mock_get_replica_info):
+        # A rollout to 6 replicas is in progress, the scaling starts from the desired replicas
+        mock_get_replica_info.return_value = {'replicas': 5, 'spec_replicas': 6}
+        self.assertEqual(self.workload_scaler.control_replicas('scaling_out', 'cluster_name'), 7)
+        self.assertEqual(self.workload_scaler.control_replicas('scaling_in', 'cluster_name'), 5)
+        mock_get_replica_info.return_value = {'replicas': 5, 'spec_replicas': None}
+        self.assertEqual(self.workload_scaler.control_replicas('scaling_out', 'cluster_name'), 6)
+
+    @mock.patch('k8s_workload_scaler.workload_scaler.Kubectl.get_replica_info')
+    def test_control_replicas_spec_already_met(self, mock_get_replica_info):
+        # The target is already tracked by the desired replicas of the rollout
+        self.workload_scaler.target_value = 0.5
+        mock_get_replica_info.return_value = {'replicas': 4, 'spec_replicas': 6}
+        self.assertEqual(self.workload_scaler.control_replicas('scaling_out', 'cluster_name', 0.5), None)
+
+    @mock.patch('k8s_workload_scaler.workload_scaler.WorkloadScaler.resolve_cluster')
+    @mock.patch('k8s_workload_scaler.workload_scaler.Kubectl.get_replica_info')
+    @mock.patch('k8s_workload_scaler.workload_scaler.WorkloadScaler.scale_workload')
+    def test_scale_old_replicas_from_spec(self, mock_scale_workload, mock_get_replica_info, mock_resolve_cluster):
+        mock_resolve_cluster.return_value = 'context-1'
+        mock_get_replica_info.return_value = {'replicas': 4, 'spec_replicas': 6}
+        self.workload_scaler.scale('scaling_out', 'cluster_name')
+        mock_scale_workload.assert_called_once_with('Deployment', 'scale-name', 'default', 7, 'context-1', 6)
+
+    @mock.patch('k8s_workload_scaler.workload_scaler.WorkloadScaler.resolve_cluster')
+    @mock.patch('k8s_workload_scaler.workload_scaler.Kubectl.get_replica_info')
+    @mock.patch('k8s_workload_scaler.workload_scaler.WorkloadScaler.scale_workload')
+    def test_scale_out_during_rollout(self, mock_scale_workload, mock_get_replica_info, mock_resolve_cluster):
+        mock_resolve_cluster.return_value = 'rollout-context'
+        mock_get_replica_info.return_value = {'replicas': 3, 'spec_replicas': 5}
+        mock_scale_workload.side_effect = lambda *args: {'old_replicas': args[5], 'new_replicas': args[3]}
+        self.workload_scaler.scale('scaling_out', 'cluster_name')
+        # Scaling out never patches the workload below its desired replicas
+        mock_scale_workload.assert_called_once_with('Deployment', 'scale-name', 'default', 6, 'rollout-context', 5)
+        self.assertEqual(SCALE_ACTIONS_TOTAL.samples[('scale-name', 'default', 'up', 'rollout-context')], 1)
+
+
+class CoalesceTest(WorkloadScalerTestCase):
+    def setUp(self):
+        super(CoalesceTest, self).setUp()
+
+    @mock.patch('k8s_workload_scaler.workload_scaler.Kubectl.resolve_cluster')
+    def test_coalesce(self, mock_resolve_cluster):
+        contexts = {None: 'context-1', 'cluster-1': 'context-1', 'cluster-2': 'context-2'}
+        mock_resolve_cluster.side_effect = lambda cluster_name: contexts[cluster_name]
+        decisions = self.workload_scaler.coalesce([
+            ('scaling_out', None),
+            ('scaling_in', 'cluster-1'),
+            ('scaling_in', 'cluster-2'),
+            ('scaling_out', 'cluster-2', 4.0),
+        ])
+        self.assertEqual(decisions, [('scaling_out', None), ('scaling_out', 'cluster-2', 4.0)])